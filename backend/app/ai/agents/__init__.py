@@ -1 +1,2 @@
-from .qa_agent import QAAgent
\ No newline at end of file
+from .qa_agent import QAAgent
+from .router import ModelRouter, parse_json_output, valid_json, valid_text
\ No newline at end of file
@@ -1,27 +1,58 @@
+import asyncio
+import logging
+import time
 from datetime import datetime
-from typing import AsyncGenerator, List, Optional, Dict
+from functools import partial
+from typing import AsyncGenerator, AsyncIterator, Callable, List, Optional, Dict
+from sqlmodel import select, col
 from sqlmodel.ext.asyncio.session import AsyncSession
 from langchain_openai import AzureChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langgraph.graph.graph import CompiledGraph
 from app.database.main import TenantModel
 from app.database.agent import MessageModel, MessageService
 from app.utils.logging import AppLogger
-from app.utils.langfuse_client import StatefulTraceClient, StatefulSpanClient
+from app.utils.log_queue import LogPayload
+from app.utils.langfuse_client import StatefulTraceClient
 from app.enums import MessageRoleEnum
 from app.config import get_settings
+from .router import ModelRouter, valid_text
+from .context import ConversationContextBuilder, SessionSummaryStore
+from .tools import WRAPPED_TOOL_TAG
+from ..prompts import QAPrompts
 from ..schemas import AgentStreamingEvent
-from ..enums import AgentStreamingEventTypeEnum
+from ..streaming import StreamingEvent, ResponseBuffer, StreamingMessageWriter, LiveStreams, follow_persisted, SingleFlight
+from ..limits import LLMRequestContext, llm_request_context_var, INTERACTIVE
+from ..metrics import MetricsStore, AgentRunMetrics, HISTORY_LOAD
+from ..tables import messages_table
+from ..tracing import TraceBuffer, TraceRecord, generation_details, SPAN_START, SPAN_END, GENERATION_START, GENERATION_END
+from ..enums import AgentStreamingEventTypeEnum, ModelTierEnum
 
 logger = AppLogger().get_logger()
+# per-event logs with tool payloads, sampled / truncated by the queue logging config
+event_logger = logging.getLogger("app.ai.events")
 
 class BaseAgent:
+    
+    # type of saved answers in a session without messages, otherwise the type of the session's last message
+    default_message_type: str = "text"
+    
+    _live_tasks: set = set()
 
     def __init__(
         self,
         tenant: TenantModel,
         db_session: AsyncSession,
         langfuse_trace: Optional[StatefulTraceClient] = None,
+        context_token_budget: int = 8000,
+        summarize_history: bool = False,
+        buffered_tracing: bool = True,
+        trace_buffer: Optional[TraceBuffer] = None,
+        incremental_save: bool = True,
+        persist_interval: float = 1.0,
+        single_flight: bool = True,
+        llm_priority: int = INTERACTIVE,
+        model_tier: ModelTierEnum = ModelTierEnum.SMART,
         **kwargs
     ):
         self.settings = get_settings()
@@ -33,24 +64,51 @@ class BaseAgent:
         # if self.langfuse_trace:
         #     self.langfuse_event = self.langfuse_trace.event(name=self.agent_name) # agent_name must be set on a main agent class
             
-        if self.langfuse_trace:
+        # with buffered tracing, spans and generations go through a background-flushed buffer
+        # instead of inline langfuse calls / the langchain callback handler
+        self.buffered_tracing = buffered_tracing
+        self.trace_buffer = trace_buffer or TraceBuffer.default()
+        if self.langfuse_trace and not self.buffered_tracing:
             self.model_callbacks = [self.langfuse_trace.get_langchain_handler(update_parent=True)]
         else:
             self.model_callbacks = []
             
-        self.model = AzureChatOpenAI(
-            name=self.agent_name,
-            model=self.settings.SMART_LLM_MODEL,
-            azure_endpoint=self.settings.AZURE_OPENAI_ENDPOINT,
-            azure_deployment=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-            openai_api_version=self.settings.AZURE_OPENAI_API_VERSION,
-            callbacks=self.model_callbacks
+        # shared per worker, tracing callbacks are passed per run in __get_run_config__
+        self.model_tier = model_tier
+        self.model: AzureChatOpenAI = ModelRouter.get_model(model_tier, name=getattr(self, "agent_name", None))
+        
+        self.response = ResponseBuffer()
+        # saved answers are written while streaming and the run continues when the client disconnects
+        self.incremental_save = incremental_save
+        self.persist_interval = persist_interval
+        # identical concurrent requests (double submits, retries on other workers) share one agent run
+        self.single_flight = single_flight
+        # admission priority of this agent's LLM calls, interactive chat goes before background reports
+        self.llm_priority = llm_priority
+        self.context_builder = ConversationContextBuilder(
+            token_budget=context_token_budget,
+            model=ModelRouter.model_name(model_tier),
+            content_fn=self.__get_agent_message_content__,
+            summarizer=self.__summarize_history__ if summarize_history else None,
+            summary_store=SessionSummaryStore(db_session=self.db_session)
         )
         
+    def __get_run_config__(self) -> Dict:
+        """
+        Per-request run config for the shared agent graphs.
+        """
+        return {
+            "callbacks": self.model_callbacks,
+            "metadata": {
+                "agent_name": self.agent_name,
+                "tenant_id": str(getattr(self.tenant, "uuid", ""))
+            }
+        }
+        
     
     def __get_agent_message_content__(self, message: MessageModel):
         return message.content + (
-            "Files Attached:" + ",".join(message.files) if message.files is not None and len(message.files) > 0 else
+            "\n\nFiles Attached: " + ", ".join(message.files) if message.files is not None and len(message.files) > 0 else
             ""
         )
     
@@ -65,20 +123,197 @@ class BaseAgent:
             for message in messages
         ]
         
+    async def __get_last_messages__(
+        self,
+        session_id: str,
+        number_of_messages: int
+    ) -> List[MessageModel]:
+        """
+        Get the last `number_of_messages` messages of a session in chronological order.
+        
+        ORDER BY / LIMIT run in postgres on the (session_id, created_at) index, so long sessions
+        don't load their whole history for every turn.
+        """
+        statement = (
+            select(MessageModel)
+            .where(MessageModel.session_id == session_id)
+            .order_by(col(MessageModel.created_at).desc())
+            .limit(number_of_messages)
+        )
+        result = await self.db_session.exec(statement)
+        return list(reversed(result.all()))
+        
+    async def __get_message_page__(
+        self,
+        session_id: str,
+        before: Optional[datetime] = None,
+        after: Optional[datetime] = None,
+        limit: int = 10,
+        oldest_first: bool = False
+    ) -> List[MessageModel]:
+        """
+        Get up to `limit` complete messages (no answers still streaming or of failed runs) of a session created between `after` and `before` (exclusive),
+        the oldest or the newest ones, in chronological order.
+        """
+        statement = select(MessageModel).where(
+            MessageModel.session_id == session_id,
+            messages_table.c.streaming.is_(False),
+            messages_table.c.stream_error.is_(None)
+        )
+        if before is not None:
+            statement = statement.where(col(MessageModel.created_at) < before)
+        if after is not None:
+            statement = statement.where(col(MessageModel.created_at) > after)
+        created_at = col(MessageModel.created_at)
+        statement = statement.order_by(created_at.asc() if oldest_first else created_at.desc()).limit(limit)
+        messages = list((await self.db_session.exec(statement)).all())
+        return messages if oldest_first else messages[::-1]
+        
+    async def __get_last_user_message__(self, session_id: str) -> Optional[MessageModel]:
+        statement = (
+            select(MessageModel)
+            .where(MessageModel.session_id == session_id, MessageModel.role == MessageRoleEnum.USER.value)
+            .order_by(col(MessageModel.created_at).desc())
+            .limit(1)
+        )
+        return (await self.db_session.exec(statement)).first()
+        
     async def __get_messages_from_session__(self, session_id: str, number_of_messages: int = -1):
         """
         Get messages for langchain agent from db by session_id
         """
-        messages = await self.message_service.find_by_session_id(
-            session_id=session_id
+        if number_of_messages == -1:
+            messages = await self.message_service.find_by_session_id(
+                session_id=session_id
+            )
+        else:
+            messages = await self.__get_last_messages__(
+                session_id=session_id,
+                number_of_messages=number_of_messages
+            )
+        
+        return self.__get_agent_messages__(messages=messages)
+    
+    async def __save_response__(self, session_id: str, content: str) -> MessageModel:
+        """
+        Save the agent answer as an assistant message, with the message type of the session's last message.
+        """
+        last_messages = await self.__get_last_messages__(session_id=session_id, number_of_messages=1)
+        message = MessageModel(
+            session_id=session_id,
+            role=MessageRoleEnum.ASSISTANT.value,
+            content=content,
+            type=last_messages[0].type if last_messages else self.default_message_type
         )
+        self.db_session.add(message)
+        await self.db_session.commit()
+        await self.db_session.refresh(message)
+        return message
+    
+    async def __summarize_history__(self, summary: str, contents: List[str]) -> str:
+        """
+        Fold older messages into the rolling conversation summary.
+        """
+        response = await ModelRouter.ainvoke(
+            "conversation-summary",
+            await QAPrompts.aconversation_summary_prompt(
+                summary=summary,
+                messages="\n\n".join(contents)
+            ),
+            validate=valid_text,
+            config={"callbacks": self.model_callbacks}
+        )
+        return response.content
+    
+    async def __get_context_messages__(self, session_id: str, number_of_messages: int):
+        """
+        Get messages for langchain agent that fit in the context token budget.
         
-        if number_of_messages == -1:
-            return self.__get_agent_messages__(messages=messages)
+        Parameters:
+        
+            session_id (str): session id
+            
+            number_of_messages (int): number of messages loaded from db per query while filling the budget.
+        """
+        start = time.perf_counter()
+        summary, messages = await self.context_builder.build(
+            session_id=session_id,
+            load_messages=partial(self.__get_message_page__, session_id),
+            page_size=number_of_messages
+        )
+        agent_messages = self.__get_agent_messages__(messages=messages)
+        MetricsStore.observe(
+            HISTORY_LOAD,
+            time.perf_counter() - start,
+            **AgentRunMetrics.labels_for(
+                tenant=str(self.tenant.uuid),
+                agent=getattr(self, "agent_name", type(self).__name__)
+            )
+        )
+        
+        if summary:
+            return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + agent_messages
+        return agent_messages
+    
+    def __trace_event__(self, event: Dict):
+        """
+        Record tool spans (and model generations with buffered tracing) of an agent event on the langfuse trace.
+        """
+        if not self.langfuse_trace:
+            return
+        
+        kind = event["event"]
+        if kind == "on_tool_start":
+            record_kind = SPAN_START
+        elif kind == "on_tool_end":
+            record_kind = SPAN_END
+        elif kind == "on_chat_model_start" and self.buffered_tracing:
+            record_kind = GENERATION_START
+        elif kind == "on_chat_model_end" and self.buffered_tracing:
+            record_kind = GENERATION_END
         else:
-            return self.__get_agent_messages__(messages=messages[-number_of_messages:])
+            return
+        
+        model, usage = generation_details(event) if record_kind == GENERATION_END else (None, None)
+        self.trace_buffer.emit(TraceRecord(
+            kind=record_kind,
+            trace=self.langfuse_trace,
+            run_id=event['run_id'],
+            name=event['name'],
+            input=event['data'].get('input'),
+            output=event['data'].get('output'),
+            model=model,
+            usage=usage
+        ))
+    
+    def __set_llm_request_context__(self):
+        """
+        Tenant and priority for LLM admission control, for the rest of the current task. Not reset, the
+        agent loops are async generators and can be resumed in another context.
+        """
+        llm_request_context_var.set(LLMRequestContext(tenant=str(self.tenant.uuid), priority=self.llm_priority))
+    
+    @staticmethod
+    def __is_wrapped_tool_event__(event: Dict) -> bool:
+        """
+        Start / end of a tool run inside a timeout or cache wrapper, the wrapper's own events already report it.
+        """
+        return event["event"] in ("on_tool_start", "on_tool_end") and WRAPPED_TOOL_TAG in event.get("tags", [])
+    
+    def __new_run_metrics__(self, agent_name: str) -> AgentRunMetrics:
+        return AgentRunMetrics(
+            tenant=str(self.tenant.uuid),
+            agent=agent_name,
+            encoding=self.context_builder.encoding
+        )
     
-    async def __execute_agent_streaming__(self, agent_name: str, agent_executor: CompiledGraph, messages: List) -> AsyncGenerator[AgentStreamingEvent, None]:
+    async def __execute_agent_streaming__(
+        self,
+        agent_name: str,
+        agent_executor: CompiledGraph,
+        messages: List,
+        save_to_session_id: Optional[str] = None
+    ) -> AsyncGenerator[AgentStreamingEvent, None]:
         """  
         Execute agent streaming.  
         
@@ -92,6 +327,8 @@ class BaseAgent:
             agent_executor (CompiledGraph): The executor handling the agent's compiled graph.  
             
             messages (List): A list of messages to be processed by the agent.  
+            
+            save_to_session_id (Optional[str]): Save the final answer as an assistant message of this session.  
 
         Yields:
             
@@ -131,112 +368,316 @@ class BaseAgent:
                     - `type`: TOOL_END  
                     - `name`: The name of the tool.  
                     - `output`: The output data from the tool.    
+                    - `started_at`: Seconds from agent start to tool start.  
+                    - `duration`: Tool wall time in seconds, overlapping tools run concurrently.  
         """
-        agent_span = None
-        events: Dict[str, StatefulSpanClient] = {}
-        final_response = ""
-        
-        async for event in agent_executor.astream_events(
-            {"messages": messages}, version="v1"
+        async for event in self.__stream_agent_events__(
+            agent_name=agent_name,
+            agent_executor=agent_executor,
+            messages=messages,
+            save_to_session_id=save_to_session_id
         ):
-            kind = event["event"]
-            if kind == "on_chain_start":
-                if (
-                    event["name"] == agent_name
-                ):
-                    logger.info(f"Starting agent: {event['name']} ")
+            yield event.to_model()
+    
+    async def __stream_agent_events__(
+        self,
+        agent_name: str,
+        agent_executor: CompiledGraph,
+        messages: List,
+        save_to_session_id: Optional[str] = None
+    ) -> AsyncGenerator[StreamingEvent, None]:
+        """
+        Same events as __execute_agent_streaming__() as lightweight StreamingEvent objects, for the token hot path.
+        
+        The streamed answer is collected in `self.response`. With `save_to_session_id` it is also saved as the
+        assistant message of that session before the CHAIN_END event is sent.
+        """
+        if save_to_session_id is not None and self.incremental_save:
+            async for event in self.__stream_live_agent_events__(
+                agent_name=agent_name,
+                agent_executor=agent_executor,
+                messages=messages,
+                session_id=save_to_session_id
+            ):
+                yield event
+            return
+        
+        tool_start_times: Dict[str, float] = {}
+        final_response = ResponseBuffer()
+        self.response = final_response
+        agent_start_time = time.perf_counter()
+        run_metrics = self.__new_run_metrics__(agent_name)
+        self.__set_llm_request_context__()
+        
+        status = "error"
+        try:
+            async for event in agent_executor.astream_events(
+                {"messages": messages}, config=self.__get_run_config__(), version="v1"
+            ):
+                if self.__is_wrapped_tool_event__(event):
+                    continue
+                self.__trace_event__(event)
+                run_metrics.on_event(event)
+                kind = event["event"]
+                if kind == "on_chain_start":
+                    if (
+                        event["name"] == agent_name
+                    ):
+                        logger.info(f"Starting agent: {event['name']} ")
                         
-                    # logger.info(event)
-                    yield AgentStreamingEvent(
-                        type=AgentStreamingEventTypeEnum.CHAIN_START,
-                        name=event['name']
-                    )
+                        # logger.info(event)
+                        yield StreamingEvent(
+                            type=AgentStreamingEventTypeEnum.CHAIN_START,
+                            name=event['name']
+                        )
                     
-            elif kind == "on_chain_end":
-                if (
-                    event["name"] == agent_name
-                ):
+                elif kind == "on_chain_end":
+                    if (
+                        event["name"] == agent_name
+                    ):
+                    
+                        event_logger.info("Done agent: %s with output: %s", event['name'], LogPayload(event['data'].get('output')))
+                        run_metrics.finish()
                     
-                    logger.info(f"Done agent: {event['name']} with output: {event['data'].get('output')}")
+                        if save_to_session_id is not None:
+                            await self.__save_response__(session_id=save_to_session_id, content=final_response.text)
 
-                    yield AgentStreamingEvent(
-                        type=AgentStreamingEventTypeEnum.CAHIN_END,
-                        name=event['name'],
-                        output=final_response
-                        # output=event['data'].get('output').get('agent').get('messages')[0].content
-                    )
+                        yield StreamingEvent(
+                            type=AgentStreamingEventTypeEnum.CAHIN_END,
+                            name=event['name'],
+                            output=final_response.text
+                            # output=event['data'].get('output').get('agent').get('messages')[0].content
+                        )
                     
-            if kind == "on_chat_model_stream":
-                content = event["data"]["chunk"].content
-                if content:
-                    final_response = final_response + content
-                    yield AgentStreamingEvent(
-                        type=AgentStreamingEventTypeEnum.MESSAGE,
-                        content=content
-                    )
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        final_response.append(content)
+                        yield StreamingEvent(
+                            type=AgentStreamingEventTypeEnum.MESSAGE,
+                            content=content
+                        )
                     
-            elif kind == "on_tool_start":
-                logger.info(f"Starting tool: {event['name']} with inputs: {event['data'].get('input')}")
-
-                if self.langfuse_trace:
-                    events[event['run_id']] = self.langfuse_trace.span(
+                elif kind == "on_tool_start":
+                    event_logger.info("Starting tool: %s with inputs: %s", event['name'], LogPayload(event['data'].get('input')))
+                    tool_start_times[event['run_id']] = time.perf_counter()
+                    
+                    yield StreamingEvent(
+                        type=AgentStreamingEventTypeEnum.TOOL_START,
                         name=event['name'],
-                        input=event['data'].get('input'),
-                        start_time=datetime.now()
+                        input=event['data'].get('input')
                     )
-                    
-                yield AgentStreamingEvent(
-                    type=AgentStreamingEventTypeEnum.TOOL_START,
-                    name=event['name'],
-                    input=event['data'].get('input')
-                )
-                
-            elif kind == "on_tool_end":
-                logger.info(f"Done tool: {event['name']}")
-                logger.info(f"Tool output was: {event['data'].get('output')}")
                 
-                if event['run_id'] in events:
-                    events[event['run_id']].update(
-                        end_time=datetime.now(),
-                        output=event['data'].get('output')
-                    )
+                elif kind == "on_tool_end":
+                    tool_end_time = time.perf_counter()
+                    tool_start_time = tool_start_times.pop(event['run_id'], tool_end_time)
+                    logger.info(f"Done tool: {event['name']} in {tool_end_time - tool_start_time:.2f}s")
+                    event_logger.info("Tool output was: %s", LogPayload(event['data'].get('output')))
                     
-                yield AgentStreamingEvent(
-                    type=AgentStreamingEventTypeEnum.TOOL_END,
-                    name=event['name'],
-                    output=event['data'].get('output')
-                )
+                    yield StreamingEvent(
+                        type=AgentStreamingEventTypeEnum.TOOL_END,
+                        name=event['name'],
+                        output=event['data'].get('output'),
+                        started_at=tool_start_time - agent_start_time,
+                        duration=tool_end_time - tool_start_time
+                    )
+            status = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            # failed and cancelled runs are timed too, a finished run is recorded once
+            run_metrics.finish(status=status)
+    
+    async def __stream_live_agent_events__(
+        self,
+        agent_name: str,
+        agent_executor: CompiledGraph,
+        messages: List,
+        session_id: str
+    ) -> AsyncGenerator[StreamingEvent, None]:
+        """
+        Run the agent in a background task that persists the answer as it streams and publishes its events
+        to LiveStreams, and subscribe to them.
+        
+        The assistant message is created up front and its uuid is sent on CHAIN_START / CHAIN_END, a client
+        that disconnects can resume with it while the run continues. A failed or cancelled run ends the
+        stream with an ERROR event and its message is saved as failed.
+        """
+        last_messages = await self.__get_last_messages__(session_id=session_id, number_of_messages=1)
+        writer = StreamingMessageWriter(engine=self.db_session.bind, flush_interval=self.persist_interval)
+        message_id = str(await writer.start(
+            session_id=session_id,
+            type=last_messages[0].type if last_messages else self.default_message_type
+        ))
+        stream = LiveStreams.open(message_id)
+        
+        async def run():
+            finished = False
+            error = None
+            try:
+                async for event in self.__stream_agent_events__(
+                    agent_name=agent_name,
+                    agent_executor=agent_executor,
+                    messages=messages
+                ):
+                    if event.type == AgentStreamingEventTypeEnum.MESSAGE:
+                        writer.append(event.content)
+                    elif event.type == AgentStreamingEventTypeEnum.CHAIN_START:
+                        event.message_id = message_id
+                    elif event.type == AgentStreamingEventTypeEnum.CAHIN_END:
+                        event.message_id = message_id
+                        await writer.finish(self.response.text)
+                        finished = True
+                    stream.publish(event)
+            except asyncio.CancelledError:
+                error = "Agent run was cancelled"
+                raise
+            except Exception as e:
+                logger.error(f"Agent run for message {message_id} failed: {e}")
+                error = f"Agent run failed: {e}"
+                raise
+            finally:
+                if not finished:
+                    # keep what was generated so far, marked as failed so it is not taken for a complete answer
+                    try:
+                        await writer.finish(self.response.text, error=error)
+                    except Exception as e:
+                        logger.error(f"Failed to save the end of streamed message {message_id}: {e}")
+                    if error is not None:
+                        stream.publish(StreamingEvent(type=AgentStreamingEventTypeEnum.ERROR, content=error, message_id=message_id))
+                LiveStreams.close(stream)
+        
+        task = asyncio.create_task(run())
+        # the run outlives this generator when the client disconnects, it is not cancelled with it
+        BaseAgent._live_tasks.add(task)
+        task.add_done_callback(BaseAgent.__live_task_done__)
+        async for event in stream.subscribe():
+            yield event
+        # the stream is closed at the end of the run, raises its failure
+        await asyncio.shield(task)
+    
+    @staticmethod
+    def __live_task_done__(task: asyncio.Task):
+        BaseAgent._live_tasks.discard(task)
+        # retrieved also when no subscriber is left to raise it, run() logged it
+        if not task.cancelled():
+            task.exception()
+    
+    def __flight_fingerprint__(self) -> str:
+        """
+        Agent configuration that changes the answer (tools, their config, uploaded files), part of the
+        single-flight key. Agents with such configuration override it.
+        """
+        return ""
+    
+    async def __single_flight__(
+        self,
+        agent_name: str,
+        session_id: str,
+        mode: str,
+        producer: Callable[[], AsyncIterator[StreamingEvent]],
+        number_of_messages: int,
+        save_response: bool = False
+    ) -> AsyncGenerator[StreamingEvent, None]:
+        """
+        Events of `producer`, shared with identical in-flight requests of this or other workers.
+        
+        Requests are identical for the same agent, model tier, agent configuration (`__flight_fingerprint__`),
+        tenant, session, last user message, `mode`, `number_of_messages` and `save_response`. The streamed
+        answer is collected in `self.response` also when another request ran the agent. A run whose answer is
+        not saved is cancelled when no request listens to it any more.
+        """
+        if not self.single_flight:
+            async for event in producer():
+                yield event
+            return
+        
+        # the assistant row of a saved run is created up front, so a duplicate submit keys on the question
+        last_user_message = await self.__get_last_user_message__(session_id=session_id)
+        key = ":".join([
+            agent_name,
+            self.model_tier.value,
+            self.__flight_fingerprint__(),
+            str(self.tenant.uuid),
+            session_id,
+            str(last_user_message.uuid) if last_user_message else "",
+            mode,
+            str(number_of_messages),
+            "save" if save_response else "nosave"
+        ])
+        response = ResponseBuffer()
+        async for event in SingleFlight.run(
+            engine=self.db_session.bind,
+            key=key,
+            producer=producer,
+            cancel_when_unwatched=not save_response
+        ):
+            if event.type == AgentStreamingEventTypeEnum.MESSAGE:
+                response.append(event.content)
+            yield event
+        self.response = response
+    
+    async def __resume_stream__(self, message_id: str) -> AsyncGenerator[StreamingEvent, None]:
+        """
+        Events of a streamed assistant message: everything so far and then live events if it is still
+        running in this worker, otherwise its persisted content, followed until the worker streaming it completes it.
+        """
+        stream = LiveStreams.get(message_id)
+        if stream is not None:
+            async for event in stream.subscribe():
+                yield event
+            return
+        
+        async for event in follow_persisted(engine=self.db_session.bind, message_id=message_id):
+            yield event
     
     async def __execute_agent__(self, agent_name: str, agent_executor: CompiledGraph, messages: List):
         """
         Execute agent.
         """
-        async for event in agent_executor.astream_events(
-            {"messages": messages}, version="v1"
-        ):
-            kind = event["event"]
-            if kind == "on_chain_start":
-                if (
-                    event["name"] == agent_name
-                ):
-                    logger.info(f"Starting agent: {event['name']}.")
+        run_metrics = self.__new_run_metrics__(agent_name)
+        self.__set_llm_request_context__()
+        status = "error"
+        try:
+            async for event in agent_executor.astream_events(
+                {"messages": messages}, config=self.__get_run_config__(), version="v1"
+            ):
+                if self.__is_wrapped_tool_event__(event):
+                    continue
+                self.__trace_event__(event)
+                run_metrics.on_event(event)
+                kind = event["event"]
+                if kind == "on_chain_start":
+                    if (
+                        event["name"] == agent_name
+                    ):
+                        logger.info(f"Starting agent: {event['name']}.")
                     
-            elif kind == "on_chain_end":
-                if (
-                    event["name"] == agent_name
-                ):
-                    logger.info(f"Done agent: {event['name']} with output: {event['data'].get('output')}")
-                    return event['data'].get('output').get('agent').get('messages')[0].content
+                elif kind == "on_chain_end":
+                    if (
+                        event["name"] == agent_name
+                    ):
+                        event_logger.info("Done agent: %s with output: %s", event['name'], LogPayload(event['data'].get('output')))
+                        run_metrics.finish()
+                        return event['data'].get('output').get('agent').get('messages')[0].content
                     
-            if kind == "on_chat_model_stream":
-                content = event["data"]["chunk"].content
-                if content:
-                    pass
-                    # print(content, end="|")
-            elif kind == "on_tool_start":
-                logger.info(f"Starting tool: {event['name']} with inputs: {event['data'].get('input')}")
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        pass
+                        # print(content, end="|")
+                elif kind == "on_tool_start":
+                    event_logger.info("Starting tool: %s with inputs: %s", event['name'], LogPayload(event['data'].get('input')))
                 
-            elif kind == "on_tool_end":
-                logger.info(f"Done tool: {event['name']}")
-                logger.info(f"Tool output was: {event['data'].get('output')}")
+                elif kind == "on_tool_end":
+                    logger.info(f"Done tool: {event['name']}")
+                    event_logger.info("Tool output was: %s", LogPayload(event['data'].get('output')))
+            status = "ok"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            # failed and cancelled runs are timed too, a finished run is recorded once
+            run_metrics.finish(status=status)
                 
\ No newline at end of file
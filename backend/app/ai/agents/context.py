@@ -0,0 +1,217 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import sqlalchemy as sa
+import tiktoken
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database.agent import MessageModel
+from app.utils.logging import AppLogger
+
+logger = AppLogger().get_logger()
+
+# per message formatting overhead of the chat completion format
+MESSAGE_TOKEN_OVERHEAD = 4
+
+# load_messages(before=, after=, limit=, oldest_first=) -> chronological messages
+MessageLoader = Callable[..., Awaitable[List[MessageModel]]]
+
+class SummaryStore(ABC):
+    """
+    Storage of rolling conversation summaries: (summary, created_at of the last folded message) per session.
+    """
+
+    @abstractmethod
+    async def load(self, session_id: str) -> Tuple[str, Optional[datetime]]:
+        ...
+
+    @abstractmethod
+    async def save(self, session_id: str, summary: str, folded_until: datetime):
+        ...
+
+
+class MemorySummaryStore(SummaryStore):
+
+    def __init__(self):
+        self.summaries: Dict[str, Tuple[str, datetime]] = {}
+
+    async def load(self, session_id: str) -> Tuple[str, Optional[datetime]]:
+        return self.summaries.get(session_id, ("", None))
+
+    async def save(self, session_id: str, summary: str, folded_until: datetime):
+        previous = self.summaries.get(session_id)
+        if previous is None or previous[1] < folded_until:
+            self.summaries[session_id] = (summary, folded_until)
+
+
+class SessionSummaryStore(SummaryStore):
+    """
+    Summaries stored in the `session_summaries` table, shared by all workers and kept across restarts.
+    """
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def load(self, session_id: str) -> Tuple[str, Optional[datetime]]:
+        result = await self.db_session.execute(
+            sa.text("SELECT summary, folded_until FROM session_summaries WHERE session_id = :session_id"),
+            {"session_id": session_id}
+        )
+        row = result.first()
+        return (row.summary, row.folded_until) if row is not None else ("", None)
+
+    async def save(self, session_id: str, summary: str, folded_until: datetime):
+        # a concurrent turn may have folded further already, keep the newer summary
+        await self.db_session.execute(
+            sa.text(
+                "INSERT INTO session_summaries (session_id, summary, folded_until, updated_at) "
+                "VALUES (:session_id, :summary, :folded_until, :updated_at) "
+                "ON CONFLICT (session_id) DO UPDATE SET summary = excluded.summary, "
+                "folded_until = excluded.folded_until, updated_at = excluded.updated_at "
+                "WHERE session_summaries.folded_until < excluded.folded_until"
+            ),
+            {
+                "session_id": session_id,
+                "summary": summary,
+                "folded_until": folded_until,
+                "updated_at": datetime.utcnow()
+            }
+        )
+        await self.db_session.commit()
+
+
+class ConversationContextBuilder:
+    """
+    Select conversation history by token budget instead of a fixed number of messages.
+
+    Messages are loaded page by page, newest-first, until `token_budget` is used up, so the budget and
+    not the page size decides how much history is sent. Token counts are cached per message uuid for
+    the whole worker, so history is not re-tokenized on every turn.
+
+    With a `summarizer`, all messages older than the kept ones are folded into a rolling summary per
+    session, which is kept in the `summary_store` and extended with messages created after the last
+    folded one only.
+    """
+
+    max_cached_counts: int = 50_000
+
+    _token_counts: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+    _lock = Lock()
+
+    def __init__(
+        self,
+        token_budget: int,
+        model: str,
+        content_fn: Callable[[MessageModel], str],
+        summarizer: Optional[Callable[[str, List[str]], Awaitable[str]]] = None,
+        summary_store: Optional[SummaryStore] = None
+    ):
+        """
+        Parameters:
+
+            token_budget (int): max number of history tokens.
+
+            model (str): model name used to pick the tiktoken encoding.
+
+            content_fn (Callable[[MessageModel], str]): message content as sent to the model.
+
+            summarizer (Optional[Callable[[str, List[str]], Awaitable[str]]]): gets the previous summary
+                and the contents of the newly dropped messages and returns the new summary.
+
+            summary_store (Optional[SummaryStore]): where summaries are kept, in memory by default.
+        """
+        self.token_budget = token_budget
+        self.content_fn = content_fn
+        self.summarizer = summarizer
+        self.summary_store = summary_store or MemorySummaryStore()
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(self, message: MessageModel) -> int:
+        """
+        Token count of a message, cached by uuid.
+        """
+        key = str(message.uuid)
+        content = self.content_fn(message)
+        with self._lock:
+            cached = self._token_counts.get(key)
+            # content length guards against messages updated in place
+            if cached is not None and cached[0] == len(content):
+                self._token_counts.move_to_end(key)
+                return cached[1]
+
+        tokens = len(self.encoding.encode(content)) + MESSAGE_TOKEN_OVERHEAD
+
+        with self._lock:
+            self._token_counts[key] = (len(content), tokens)
+            while len(self._token_counts) > self.max_cached_counts:
+                self._token_counts.popitem(last=False)
+        return tokens
+
+    async def load(self, load_messages: "MessageLoader", page_size: int) -> List[MessageModel]:
+        """
+        Newest messages that fit the budget in chronological order, paged back `page_size` rows at a time.
+        The newest message is always kept, even over budget.
+        """
+        kept: List[MessageModel] = []
+        used = 0
+        before = None
+        while True:
+            page = await load_messages(before=before, after=None, limit=page_size, oldest_first=False)
+            for message in reversed(page):
+                tokens = self.count_tokens(message)
+                if used + tokens > self.token_budget and kept:
+                    return kept[::-1]
+                used += tokens
+                kept.append(message)
+            if len(page) < page_size:
+                return kept[::-1]
+            before = page[0].created_at
+
+    async def build(
+        self,
+        session_id: str,
+        load_messages: "MessageLoader",
+        page_size: int = 10
+    ) -> Tuple[Optional[str], List[MessageModel]]:
+        """
+        Select messages for the model.
+
+        Parameters:
+
+            session_id (str): session id
+
+            load_messages (MessageLoader): loads up to `limit` messages created between `after` and `before`
+                (both exclusive, None for no bound) in chronological order, the oldest or the newest ones.
+
+            page_size (int): max number of messages loaded per call of `load_messages`.
+
+        Returns:
+
+            Tuple[Optional[str], List[MessageModel]]: rolling summary of older messages (None without a summarizer) and kept messages.
+        """
+        kept = await self.load(load_messages, page_size)
+        if self.summarizer is None:
+            return None, kept
+
+        summary = ""
+        try:
+            summary, folded_until = await self.summary_store.load(session_id)
+            # everything between the last folded message and the kept ones, oldest page first; the summary is
+            # saved per page, so a failure later on doesn't fold earlier pages again
+            while kept:
+                page = await load_messages(before=kept[0].created_at, after=folded_until, limit=page_size, oldest_first=True)
+                if not page:
+                    break
+                summary = await self.summarizer(summary, [self.content_fn(message) for message in page])
+                folded_until = page[-1].created_at
+                await self.summary_store.save(session_id, summary, folded_until)
+                if len(page) < page_size:
+                    break
+        except Exception as e:
+            logger.warning(f"Failed to summarize history of session {session_id}: {e}")
+
+        return summary or None, kept
@@ -1,17 +1,33 @@
-from typing import AsyncGenerator, Optional
+import hashlib
+import json
+import os
+from typing import AsyncGenerator, List, Optional
 from langgraph.prebuilt import create_react_agent
-from langchain_core.messages import SystemMessage
+from langgraph.graph.graph import CompiledGraph
+from langchain_core.tools import BaseTool
 from app.utils.logging import AppLogger
 from app.utils.langchain.tools import AzureAISearchTool, HighChartTool, TavilySearchTool, FaissVectorSearchTool, ExaSearchTool
-from app.utils.vector_retriever import AzureAISearchVectorRetriever, FaissVectorRetriever
+from app.utils.vector_retriever import FaissVectorRetriever
 from app.utils.exa_client import ExaClient
-from ..prompts import QAPrompts
+from ..cache import SemanticCacheRegistry
+from ..search import SearchClientPool
+from ..enums import AgentStreamingEventTypeEnum, ToolNameEnum
+from ..streaming import StreamingEvent, StreamingEventEncoder, coalesce_messages, SSE
 from ..schemas import AgentStreamingEvent
 from .base import BaseAgent
+from .registry import AgentRegistry
+from .tools import with_timeout, with_semantic_cache, with_search_slot
 
 
 logger = AppLogger().get_logger()
 
+# external search tools whose outputs are shared between near-duplicate questions of a tenant
+SEMANTIC_CACHE_TOOLS = [
+    ToolNameEnum.AZUREAI_SEARCH.value,
+    ToolNameEnum.TAVILY_SEARCH.value,
+    ToolNameEnum.EXA_SEARCH.value,
+]
+
 class QAAgent(BaseAgent):
     """
     Agent for "Ask a Question".
@@ -25,7 +41,7 @@ class QAAgent(BaseAgent):
     Model: Default
         
     """
-    def __init__(self, faiss_vector_store: Optional[FaissVectorRetriever] = None, tool_cfg: dict = {'internal_top': 5, 'web_top': 5, 'file_top': 5,}, **kwargs):
+    def __init__(self, faiss_vector_store: Optional[FaissVectorRetriever] = None, tool_cfg: dict = {'internal_top': 5, 'web_top': 5, 'file_top': 5, 'timeout': 60, 'semantic_cache': True,}, **kwargs):
         """
         Initialize tools and agent executors.
         
@@ -38,54 +54,126 @@ class QAAgent(BaseAgent):
                 {
                     'internal_top': 1, # number of chunks to use from azure ai search
                     'web_top': 1, # number of chunks to use from tavily search
+                    'timeout': 60, # seconds before a single tool call is given up
+                    'timeouts': {'tavily_search_tool': 20}, # per tool name, overrides 'timeout'
+                    'semantic_cache': True, # answer near-duplicate searches from the tenant's semantic cache
                 }
         """
         self.agent_name = "qa-agent"
         
         super().__init__(**kwargs)
         self.tool_cfg = tool_cfg
-        self.azure_ai_search_tool = AzureAISearchTool(
-            retriever=AzureAISearchVectorRetriever(
+        self.faiss_vector_store = faiss_vector_store
+        
+        if faiss_vector_store is not None:
+            # uploaded files are per request, so the graph can't be shared
+            self.tools = self.__build_tools__()
+            self.agent_executor = self.__build_agent_executor__()
+        else:
+            key = (
+                self.agent_name,
+                self.model_tier,
+                str(self.tenant.uuid),
+                self.tenant.ai_search_service_name,
+                self.tenant.ai_search_index_name,
+                json.dumps(self.tool_cfg, sort_keys=True)
+            )
+            self.tools = AgentRegistry.get_tools(key=key, builder=self.__build_tools__)
+            self.agent_executor = AgentRegistry.get_agent(key=key, builder=self.__build_agent_executor__)
+        # the tools the graph runs, wrapped with their timeout (and semantic cache)
+        tools = {tool.name: tool for tool in self.tools}
+        self.azure_ai_search_tool = tools.get(ToolNameEnum.AZUREAI_SEARCH.value)
+        self.tavily_search_tool = tools.get(ToolNameEnum.TAVILY_SEARCH.value)
+        self.highchart_tool = tools.get(ToolNameEnum.HIGHCHART.value)
+        self.exasearch_tool = tools.get(ToolNameEnum.EXA_SEARCH.value)
+        self.faiss_search_tool = tools.get(ToolNameEnum.FAISS_SEARCH.value)
+        self.system_prompt = ""
+    
+    def __build_tools__(self) -> List[BaseTool]:
+        """
+        Build agent tools for the tenant.
+        
+        Tool calls of one agent step run concurrently, each one bounded by its timeout (see __tool_timeout__).
+        External search tools are answered from the tenant's semantic cache when tool_cfg['semantic_cache'] is set.
+        """
+        tools = [
+            # calls hold one of the tenant's search slots of the shared retriever
+            with_search_slot(
+                AzureAISearchTool(
+                    retriever=SearchClientPool.get_retriever(
+                        service_name=self.tenant.ai_search_service_name,
+                        index_name=self.tenant.ai_search_index_name
+                    ),
+                    cfg={
+                        'top': self.tool_cfg['internal_top']
+                    }
+                ),
                 service_name=self.tenant.ai_search_service_name,
-                index_name=self.tenant.ai_search_index_name
+                index_name=self.tenant.ai_search_index_name,
+                tenant_id=str(self.tenant.uuid)
             ),
-            cfg={
-                'top': self.tool_cfg['internal_top']
-            }
-        )
-        
-        self.tavily_search_tool = TavilySearchTool(
-            cfg = {
-                'top': self.tool_cfg['web_top']
-            }
-        )
-        
-        self.highchart_tool = HighChartTool()
-        
-        self.exasearch_tool = ExaSearchTool(
-            exa_client=ExaClient()
-        )
-        
-        self.tools = [
-            self.azure_ai_search_tool,
-            self.tavily_search_tool,
-            self.highchart_tool,
-            self.exasearch_tool
-        ]
-        if faiss_vector_store is not None:
-            self.faiss_search_tool = FaissVectorSearchTool(
-                retriever=faiss_vector_store,
-                cfg={
-                    'top': self.tool_cfg['file_top']
+            TavilySearchTool(
+                cfg = {
+                    'top': self.tool_cfg['web_top']
                 }
+            ),
+            HighChartTool(),
+            ExaSearchTool(
+                exa_client=ExaClient()
             )
-            self.tools.append(self.faiss_search_tool)
-        
+        ]
+        if self.faiss_vector_store is not None:
+            tools.append(
+                FaissVectorSearchTool(
+                    retriever=self.faiss_vector_store,
+                    cfg={
+                        'top': self.tool_cfg['file_top']
+                    }
+                )
+            )
+        if self.tool_cfg.get('semantic_cache', True):
+            cache = SemanticCacheRegistry.get(str(self.tenant.uuid))
+            embeddings = AgentRegistry.get_embeddings(deployment=self.settings.AZURE_EMBEDDING_MODEL)
+            tools = [
+                with_semantic_cache(tool, cache=cache, embeddings=embeddings) if tool.name in SEMANTIC_CACHE_TOOLS else tool
+                for tool in tools
+            ]
         
-        self.agent_executor = create_react_agent(self.model, self.tools).with_config({"run_name": self.agent_name})
-        self.system_prompt = ""
+        return [with_timeout(tool, timeout=self.__tool_timeout__(tool.name)) for tool in tools]
     
-    async def astreaming(self, session_id: str, number_of_messages: int = 10) -> AsyncGenerator[AgentStreamingEvent, None]:
+    def __flight_fingerprint__(self) -> str:
+        """
+        Tool config and uploaded-file store of the agent, for the single-flight key.
+        """
+        # stores of uploaded files are opened per request: requests only share a flight with the same store object
+        faiss = f"{os.getpid()}:{id(self.faiss_vector_store)}" if self.faiss_vector_store is not None else None
+        config = json.dumps({"tool_cfg": self.tool_cfg, "faiss": faiss}, sort_keys=True, default=str)
+        return hashlib.sha256(config.encode()).hexdigest()[:16]
+    
+    def __tool_timeout__(self, tool_name: str) -> float:
+        """
+        Timeout of a tool: tool_cfg['timeouts'][tool_name], else tool_cfg['timeout'].
+        """
+        return self.tool_cfg.get('timeouts', {}).get(tool_name, self.tool_cfg.get('timeout', 60))
+    
+    def __build_agent_executor__(self) -> CompiledGraph:
+        """
+        Compile the react agent graph.
+        """
+        logger.info(f"Compiling {self.agent_name} graph")
+        return create_react_agent(self.model, self.tools).with_config({"run_name": self.agent_name})
+    
+    async def __agent_events__(self, session_id: str, number_of_messages: int, save_response: bool) -> AsyncGenerator[StreamingEvent, None]:
+        messages = [self.system_prompt] + await self.__get_context_messages__(session_id=session_id, number_of_messages=number_of_messages)
+        async for event in self.__stream_agent_events__(
+            agent_name=self.agent_name,
+            agent_executor=self.agent_executor,
+            messages=messages,
+            save_to_session_id=session_id if save_response else None
+        ):
+            yield event
+    
+    async def astreaming(self, session_id: str, number_of_messages: int = 10, save_response: bool = False) -> AsyncGenerator[AgentStreamingEvent, None]:
         """
         Invoke the agent and get streaming response.
         
@@ -93,20 +181,108 @@ class QAAgent(BaseAgent):
             
             session_id (str): session id
             
-            number_of_messages (int): number of messages to use from the top. Default to 10.
+            number_of_messages (int): number of messages loaded from db per query while filling the context token budget. Default to 10.
+            
+            save_response (bool): save the answer as an assistant message of the session. Default to False.
             
         Returns:
         
-            same streaming response as BaseAgent.__execute_agent_streaming__().
+            same streaming response as BaseAgent.__execute_agent_streaming__(), the full answer is in self.response.
         """ 
-        messages = [self.system_prompt] + await self.__get_messages_from_session__(session_id=session_id, number_of_messages=number_of_messages)
         logger.info(f"QA agent async streaming with {session_id} session")
-        async for chunk in self.__execute_agent_streaming__(
+        async for event in self.__single_flight__(
             agent_name=self.agent_name,
-            agent_executor=self.agent_executor,
-            messages=messages
+            session_id=session_id,
+            mode="stream",
+            producer=lambda: self.__agent_events__(
+                session_id=session_id,
+                number_of_messages=number_of_messages,
+                save_response=save_response
+            ),
+            number_of_messages=number_of_messages,
+            save_response=save_response
         ):
-            yield chunk
+            yield event.to_model()
+            
+    async def astreaming_bytes(
+        self,
+        session_id: str,
+        number_of_messages: int = 10,
+        format: str = SSE,
+        flush_interval: float = 0.05,
+        flush_bytes: int = 512,
+        save_response: bool = False
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Invoke the agent and get the streaming response as encoded SSE / NDJSON frames.
+        
+        Skips pydantic validation per token and merges tokens into flush windows.
+        
+        Parameters:
+            
+            session_id (str): session id
+            
+            number_of_messages (int): number of messages loaded from db per query while filling the context token budget. Default to 10.
+            
+            format (str): "sse" or "ndjson". Default to "sse".
+            
+            flush_interval (float): max seconds a token is held back before it is sent. Default to 0.05.
+            
+            flush_bytes (int): max buffered message bytes (UTF-8) before they are sent. Default to 512.
+            
+            save_response (bool): save the answer as an assistant message of the session. Default to False.
+        """
+        encoder = StreamingEventEncoder(format=format)
+        logger.info(f"QA agent async byte streaming with {session_id} session")
+        async for event in coalesce_messages(
+            self.__single_flight__(
+                agent_name=self.agent_name,
+                session_id=session_id,
+                mode="stream",
+                producer=lambda: self.__agent_events__(
+                    session_id=session_id,
+                    number_of_messages=number_of_messages,
+                    save_response=save_response
+                ),
+                number_of_messages=number_of_messages,
+                save_response=save_response
+            ),
+            flush_interval=flush_interval,
+            flush_bytes=flush_bytes
+        ):
+            yield encoder.encode(event)
+            
+    async def aresume_bytes(
+        self,
+        message_id: str,
+        format: str = SSE,
+        flush_interval: float = 0.05,
+        flush_bytes: int = 512
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Resume a stream saved with save_response, e.g. after the client reconnects.
+        
+        Replays the answer so far and follows the live run if it is still running in this worker,
+        otherwise follows the persisted answer until the worker running it completes it.
+        
+        Parameters:
+            
+            message_id (str): assistant message uuid, sent on the CHAIN_START event.
+            
+            format (str): "sse" or "ndjson". Default to "sse".
+            
+            flush_interval (float): max seconds a token is held back before it is sent. Default to 0.05.
+            
+            flush_bytes (int): max buffered message bytes (UTF-8) before they are sent. Default to 512.
+        """
+        encoder = StreamingEventEncoder(format=format)
+        logger.info(f"QA agent resuming stream of message {message_id}")
+        async for event in coalesce_messages(
+            self.__resume_stream__(message_id=message_id),
+            flush_interval=flush_interval,
+            flush_bytes=flush_bytes
+        ):
+            yield encoder.encode(event)
             
     async def ainvoke(self, session_id: str, number_of_messages: int = 10) -> str:
         """
@@ -116,19 +292,32 @@ class QAAgent(BaseAgent):
             
             session_id (str): session id
             
-            number_of_messages (int): number of messages to use from the top. Default to 10.
+            number_of_messages (int): number of messages loaded from db per query while filling the context token budget. Default to 10.
         
         Returns:
         
             str: AI message
         """
-        messages = [self.system_prompt] + await self.__get_messages_from_session__(session_id=session_id, number_of_messages=number_of_messages)
         logger.info(f"QA agent async invoking with {session_id}")
-        result = await self.__execute_agent__(
+        
+        async def invoke():
+            messages = [self.system_prompt] + await self.__get_context_messages__(session_id=session_id, number_of_messages=number_of_messages)
+            result = await self.__execute_agent__(
+                agent_name=self.agent_name,
+                agent_executor=self.agent_executor,
+                messages=messages
+            )
+            yield StreamingEvent(type=AgentStreamingEventTypeEnum.CAHIN_END, name=self.agent_name, output=result)
+        
+        result = None
+        async for event in self.__single_flight__(
             agent_name=self.agent_name,
-            agent_executor=self.agent_executor,
-            messages=messages
-        )
+            session_id=session_id,
+            mode="invoke",
+            producer=invoke,
+            number_of_messages=number_of_messages
+        ):
+            result = event.output
         
         return result
         
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_core.tools import BaseTool
+from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+from ..embeddings import EmbeddingService
+from ..limits import AdmissionController, AdmissionTransport
+from langgraph.graph.graph import CompiledGraph
+from app.utils.logging import AppLogger
+from app.config import get_settings
+
+logger = AppLogger().get_logger()
+
+class AgentRegistry:
+    """
+    Process-wide registry of chat model clients and compiled agent graphs.
+
+    Building an `AzureChatOpenAI` opens a new HTTP client and connection pool, and `create_react_agent`
+    compiles a new graph. Both are safe to share between requests, so every worker keeps one HTTP client
+    (connection pool) per deployment, model clients per (deployment, model, run name) on top of it, and
+    one compiled graph and tool set per agent key.
+
+    Per-request state (langfuse callbacks, run metadata) must not be bound to the shared objects,
+    pass it in the `config` of `astream_events` / `ainvoke` instead.
+    """
+
+    max_agents: int = 256
+
+    _http_clients: Dict[str, httpx.AsyncClient] = {}
+    _models: Dict[Tuple[str, str, Optional[str]], AzureChatOpenAI] = {}
+    _registered: Dict[Tuple[str, str], BaseChatModel] = {}
+    _embeddings: Dict[str, EmbeddingService] = {}
+    _agents: "OrderedDict[Hashable, CompiledGraph]" = OrderedDict()
+    _tools: "OrderedDict[Hashable, List[BaseTool]]" = OrderedDict()
+    _lock = Lock()
+
+    @classmethod
+    def get_model(cls, model: str, deployment: str, name: Optional[str] = None) -> BaseChatModel:
+        """
+        Get the shared chat model client for a deployment.
+
+        Parameters:
+
+            model (str): model name. e.g. settings.SMART_LLM_MODEL
+
+            deployment (str): azure openai deployment name
+
+            name (Optional[str]): run name of the model's calls in events and traces, e.g. the agent name.
+                Clients of all names share the deployment's connection pool.
+        """
+        key = (deployment, model, name)
+        with cls._lock:
+            if (deployment, model) in cls._registered:
+                return cls._registered[(deployment, model)]
+            if key not in cls._models:
+                settings = get_settings()
+                logger.info(f"Creating chat model client for deployment: {deployment}, model: {model}, name: {name}")
+                if deployment not in cls._http_clients:
+                    # every call of the deployment goes through its admission controller
+                    cls._http_clients[deployment] = httpx.AsyncClient(
+                        transport=AdmissionTransport(AdmissionController.for_deployment(deployment))
+                    )
+                cls._models[key] = AzureChatOpenAI(
+                    **({"name": name} if name is not None else {}),
+                    model=model,
+                    azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+                    azure_deployment=deployment,
+                    openai_api_version=settings.AZURE_OPENAI_API_VERSION,
+                    http_async_client=cls._http_clients[deployment],
+                )
+            return cls._models[key]
+
+    @classmethod
+    def register_model(cls, model: str, deployment: str, client: BaseChatModel):
+        """
+        Use `client` as the chat model of a deployment (for every name), e.g. a stand-in model in benchmarks.
+        """
+        with cls._lock:
+            cls._registered[(deployment, model)] = client
+
+    @classmethod
+    def get_embeddings(cls, deployment: str) -> EmbeddingService:
+        """
+        Get the shared, batched and cached embeddings client for a deployment.
+
+        Parameters:
+
+            deployment (str): azure openai embedding deployment name. e.g. settings.AZURE_EMBEDDING_MODEL
+        """
+        with cls._lock:
+            if deployment not in cls._embeddings:
+                settings = get_settings()
+                cls._embeddings[deployment] = EmbeddingService(
+                    embeddings=AzureOpenAIEmbeddings(
+                        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+                        azure_deployment=deployment,
+                        openai_api_version=settings.AZURE_OPENAI_API_VERSION,
+                    ),
+                    namespace=deployment
+                )
+            return cls._embeddings[deployment]
+
+    @classmethod
+    def __get_cached__(cls, cache: "OrderedDict", key: Hashable, builder: Callable):
+        with cls._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+
+        # build outside of the lock, a concurrent miss only costs a duplicate build
+        value = builder()
+
+        with cls._lock:
+            value = cache.setdefault(key, value)
+            cache.move_to_end(key)
+            while len(cache) > cls.max_agents:
+                cache.popitem(last=False)
+            return value
+
+    @classmethod
+    def get_agent(cls, key: Hashable, builder: Callable[[], CompiledGraph]) -> CompiledGraph:
+        """
+        Get a compiled agent graph, building it with `builder` on a miss.
+
+        Parameters:
+
+            key (Hashable): agent name, tenant and tool set the graph was built for.
+
+            builder (Callable[[], CompiledGraph]): builds the graph on a cache miss.
+        """
+        return cls.__get_cached__(cls._agents, key, builder)
+
+    @classmethod
+    def get_tools(cls, key: Hashable, builder: Callable[[], List[BaseTool]]) -> List[BaseTool]:
+        """
+        Get the tools of an agent key, building them with `builder` on a miss.
+
+        Parameters:
+
+            key (Hashable): same key as the agent graph built with the tools.
+
+            builder (Callable[[], List[BaseTool]]): builds the tools on a cache miss.
+        """
+        return cls.__get_cached__(cls._tools, key, builder)
+
+    @classmethod
+    def clear(cls):
+        """
+        Drop all cached model clients, embeddings clients, agent graphs and tools.
+        """
+        with cls._lock:
+            cls._http_clients.clear()
+            cls._models.clear()
+            cls._registered.clear()
+            cls._embeddings.clear()
+            cls._agents.clear()
+            cls._tools.clear()
@@ -0,0 +1,190 @@
+import json
+import os
+import re
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from app.utils.logging import AppLogger
+from app.config import get_settings
+from .registry import AgentRegistry
+from ..enums import ModelTierEnum, ModelRoutingPolicyEnum
+from ..metrics import MetricsStore, LLM_ROUTED_CALLS, LLM_ESCALATIONS
+from ..prompts import PromptRegistry
+
+logger = AppLogger().get_logger()
+
+JSON_FENCE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+def parse_json_output(text: str) -> Any:
+    """
+    Parse a JSON answer, with or without a markdown code fence around it.
+    """
+    match = JSON_FENCE.match(text)
+    return json.loads(match.group(1) if match else text)
+
+
+def valid_json(kind: type = list, min_items: int = 1) -> Callable[[str], bool]:
+    """
+    Validator for answers that must be a JSON `kind` with at least `min_items` items, e.g. query lists.
+    """
+    def validate(text: str) -> bool:
+        try:
+            value = parse_json_output(text)
+        except ValueError:
+            return False
+        return isinstance(value, kind) and len(value) >= min_items
+    return validate
+
+
+def valid_text(text: str) -> bool:
+    return bool(text and text.strip())
+
+
+def routing_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    Model routing setting from the app settings, read per call, or from the environment if Settings doesn't declare it.
+    """
+    return getattr(get_settings(), name, None) or os.getenv(name, default)
+
+
+class ModelRouter:
+    """
+    Picks the chat model of an LLM call from the model tier its prompt declares (PromptRegistry.prompt_tiers).
+
+    Policies (LLM_ROUTING_POLICY, default smart):
+
+    - smart: every call on the smart model.
+    - tiered: every prompt on its declared tier.
+    - cascade: like tiered, and a fast answer that fails the caller's validator is retried on the smart model.
+
+    The fast tier uses the AZURE_OPENAI_FAST_DEPLOYMENT_NAME deployment of FAST_LLM_MODEL, without it every call
+    runs on the smart tier (AZURE_OPENAI_DEPLOYMENT_NAME). A fast call that raises is retried on the smart model.
+    """
+
+    # overrides LLM_ROUTING_POLICY, e.g. in benchmarks
+    policy: Optional[ModelRoutingPolicyEnum] = None
+
+    calls: Dict[ModelTierEnum, int] = {tier: 0 for tier in ModelTierEnum}
+    escalations: int = 0
+
+    @classmethod
+    def current_policy(cls) -> ModelRoutingPolicyEnum:
+        if cls.policy is not None:
+            return cls.policy
+        return ModelRoutingPolicyEnum(routing_setting("LLM_ROUTING_POLICY", ModelRoutingPolicyEnum.SMART.value))
+
+    @classmethod
+    def model_name(cls, tier: ModelTierEnum) -> str:
+        settings = get_settings()
+        return settings.FAST_LLM_MODEL if tier == ModelTierEnum.FAST else settings.SMART_LLM_MODEL
+
+    @classmethod
+    def deployment(cls, tier: ModelTierEnum) -> Optional[str]:
+        """
+        Deployment of a tier, None for the fast tier if no fast deployment is configured.
+        """
+        if tier == ModelTierEnum.FAST:
+            return routing_setting("AZURE_OPENAI_FAST_DEPLOYMENT_NAME")
+        return get_settings().AZURE_OPENAI_DEPLOYMENT_NAME
+
+    @classmethod
+    def get_model(cls, tier: ModelTierEnum, name: Optional[str] = None) -> BaseChatModel:
+        """
+        Shared chat model client of a tier, the smart one for the fast tier without a fast deployment.
+        `name` is the run name of its calls, e.g. the agent name.
+        """
+        if cls.deployment(tier) is None:
+            tier = ModelTierEnum.SMART
+        return AgentRegistry.get_model(model=cls.model_name(tier), deployment=cls.deployment(tier), name=name)
+
+    @classmethod
+    def route(cls, prompt: str) -> ModelTierEnum:
+        """
+        Tier a prompt runs on under the current policy.
+        """
+        if cls.current_policy() == ModelRoutingPolicyEnum.SMART or cls.deployment(ModelTierEnum.FAST) is None:
+            return ModelTierEnum.SMART
+        return PromptRegistry.get_prompt_tier(prompt)
+
+    @classmethod
+    async def ainvoke(
+        cls,
+        prompt: str,
+        input: Any,
+        validate: Optional[Callable[[str], bool]] = None,
+        config: Optional[Dict] = None
+    ) -> BaseMessage:
+        """
+        Run one LLM call on the model its prompt is routed to.
+
+        Parameters:
+
+            prompt (str): prompt name in the prompt registry, decides the tier.
+
+            input (Any): model input, e.g. the formatted prompt or a list of messages.
+
+            validate (Optional[Callable[[str], bool]]): checks the answer text. With the cascade policy a
+                fast answer that fails it (or makes it raise) is retried on the smart model.
+
+            config (Optional[Dict]): run config, e.g. callbacks.
+        """
+        tier = cls.route(prompt)
+        if tier != ModelTierEnum.FAST:
+            return await cls.__complete__(prompt, tier, input, config)
+
+        try:
+            response = await cls.__complete__(prompt, tier, input, config)
+        except Exception as e:
+            return await cls.__escalate__(prompt, input, config, reason=f"failed: {e}")
+        if (
+            cls.current_policy() == ModelRoutingPolicyEnum.CASCADE
+            and validate is not None
+            and not cls.__is_valid__(validate, response.content)
+        ):
+            return await cls.__escalate__(prompt, input, config, reason="failed validation")
+        return response
+
+    @classmethod
+    async def __escalate__(cls, prompt: str, input: Any, config: Optional[Dict], reason: str) -> BaseMessage:
+        cls.escalations += 1
+        MetricsStore.inc(LLM_ESCALATIONS, prompt=prompt)
+        logger.info(f"Fast model call for {prompt} {reason}, retrying on the smart model")
+        return await cls.__complete__(prompt, ModelTierEnum.SMART, input, config)
+
+    @classmethod
+    async def astream(cls, prompt: str, input: Any, config: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Stream the answer text of one LLM call on the model its prompt is routed to, e.g. into an
+        IncrementalJSONParser. Streamed answers can't be validated before they are used, so there is no cascade.
+        """
+        tier = cls.route(prompt)
+        cls.calls[tier] += 1
+        MetricsStore.inc(LLM_ROUTED_CALLS, prompt=prompt, tier=tier.value)
+        async for chunk in cls.get_model(tier).astream(input, config=config):
+            if chunk.content:
+                yield chunk.content
+
+    @classmethod
+    async def __complete__(cls, prompt: str, tier: ModelTierEnum, input: Any, config: Optional[Dict]) -> BaseMessage:
+        cls.calls[tier] += 1
+        MetricsStore.inc(LLM_ROUTED_CALLS, prompt=prompt, tier=tier.value)
+        return await cls.get_model(tier).ainvoke(input, config=config)
+
+    @classmethod
+    def __is_valid__(cls, validate: Callable[[str], bool], text: str) -> bool:
+        try:
+            return bool(validate(text))
+        except Exception:
+            return False
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {
+            **{f"{tier.value}_calls": count for tier, count in cls.calls.items()},
+            "escalations": cls.escalations,
+        }
+
+    @classmethod
+    def reset_stats(cls):
+        cls.calls = {tier: 0 for tier in ModelTierEnum}
+        cls.escalations = 0
@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import json
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from threading import Thread
+from typing import Any, Dict, Tuple
+from langchain_core.callbacks import Callbacks
+from langchain_core.embeddings import Embeddings
+from langchain_core.tools import BaseTool, StructuredTool
+from app.utils.logging import AppLogger
+from ..cache import SemanticCache
+from ..search import SearchClientPool
+
+logger = AppLogger().get_logger()
+
+# tag of the tool runs inside a wrapper, their start / end events repeat the wrapper's
+WRAPPED_TOOL_TAG = "wrapped_tool"
+
+def wrapped_config(callbacks: Callbacks) -> Dict[str, Any]:
+    """
+    Run config of the tool inside a wrapper: a child of the wrapper's run, so tracing and metrics of
+    nested runs are kept.
+    """
+    return {"callbacks": callbacks, "tags": [WRAPPED_TOOL_TAG]}
+
+
+def with_timeout(tool: BaseTool, timeout: float) -> BaseTool:
+    """
+    Wrap a tool so one slow search can't hold up the other tool calls of an agent step.
+
+    The react agent's tool node runs all tool calls of a step concurrently, so the step takes as long as
+    the slowest call. On timeout the tool returns an error message to the model instead of raising.
+
+    Sync calls run the tool in a daemon thread and stop waiting for it after `timeout`; the thread
+    itself can't be interrupted and finishes in the background.
+
+    Parameters:
+
+        tool (BaseTool): tool to wrap.
+
+        timeout (float): timeout in seconds.
+    """
+    def timed_out() -> str:
+        logger.warning(f"Tool {tool.name} timed out after {timeout}s")
+        return f"{tool.name} timed out after {timeout} seconds, no results."
+
+    async def _arun(callbacks: Callbacks = None, **kwargs: Any) -> Any:
+        try:
+            return await asyncio.wait_for(tool.ainvoke(kwargs, config=wrapped_config(callbacks)), timeout=timeout)
+        except asyncio.TimeoutError:
+            return timed_out()
+
+    def _run(callbacks: Callbacks = None, **kwargs: Any) -> Any:
+        future: Future = Future()
+        # the caller's context, so callbacks and request context vars are kept in the thread
+        context = contextvars.copy_context()
+
+        def invoke():
+            try:
+                future.set_result(context.run(tool.invoke, kwargs, config=wrapped_config(callbacks)))
+            except BaseException as e:
+                future.set_exception(e)
+
+        Thread(target=invoke, name=f"tool-{tool.name}", daemon=True).start()
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return timed_out()
+
+    return StructuredTool.from_function(
+        func=_run,
+        coroutine=_arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema or tool.get_input_schema(),
+        return_direct=tool.return_direct
+    )
+
+
+def with_search_slot(tool: BaseTool, service_name: str, index_name: str, tenant_id: str) -> BaseTool:
+    """
+    Wrap a search tool on a pooled retriever so each call holds one of the tenant's search slots
+    (SearchClientPool.acquire).
+
+    Parameters:
+
+        tool (BaseTool): search tool using `SearchClientPool.get_retriever(service_name, index_name)`.
+
+        service_name (str): azure ai search service name.
+
+        index_name (str): index name.
+
+        tenant_id (str): tenant uuid.
+    """
+    async def _arun(callbacks: Callbacks = None, **kwargs: Any) -> Any:
+        async with SearchClientPool.acquire(service_name, index_name, tenant_id):
+            return await tool.ainvoke(kwargs, config=wrapped_config(callbacks))
+
+    def _run(callbacks: Callbacks = None, **kwargs: Any) -> Any:
+        # the tenant slots are asyncio semaphores, sync calls are not bounded
+        return tool.invoke(kwargs, config=wrapped_config(callbacks))
+
+    return StructuredTool.from_function(
+        func=_run,
+        coroutine=_arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema or tool.get_input_schema(),
+        return_direct=tool.return_direct
+    )
+
+
+def semantic_cache_key(tool: BaseTool, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    (partition, query) of a tool call: the query text is matched by similarity, everything else (tool
+    config, filters, other arguments) must be equal.
+    """
+    query = kwargs.get("query")
+    if not isinstance(query, str):
+        return json.dumps({"cfg": getattr(tool, "cfg", None)}, sort_keys=True, default=str), json.dumps(kwargs, sort_keys=True, default=str)
+    options = {key: value for key, value in kwargs.items() if key != "query"}
+    return json.dumps({"cfg": getattr(tool, "cfg", None), "options": options}, sort_keys=True, default=str), query
+
+
+def with_semantic_cache(tool: BaseTool, cache: SemanticCache, embeddings: Embeddings) -> BaseTool:
+    """
+    Wrap a search tool so repeated and near-duplicate queries are answered from the tenant's semantic cache.
+
+    The same query is looked up as is, otherwise the query is embedded and looked up among cached calls
+    with the same tool config and arguments. Only a miss calls the wrapped tool.
+
+    Parameters:
+
+        tool (BaseTool): search tool to wrap.
+
+        cache (SemanticCache): the tenant's semantic cache.
+
+        embeddings (Embeddings): embeddings client for the tool input.
+    """
+    async def _arun(callbacks: Callbacks = None, **kwargs: Any) -> Any:
+        partition, query = semantic_cache_key(tool, kwargs)
+        output = cache.lookup_exact(tool.name, query=query, partition=partition)
+        if output is None:
+            vector = await embeddings.aembed_query(query)
+            output = cache.lookup(tool.name, vector, query=query, partition=partition)
+            if output is None:
+                output = await tool.ainvoke(kwargs, config=wrapped_config(callbacks))
+                cache.add(tool.name, vector, output, query=query, partition=partition)
+                return output
+        logger.info(f"Semantic cache hit for tool: {tool.name}")
+        return output
+
+    def _run(callbacks: Callbacks = None, **kwargs: Any) -> Any:
+        partition, query = semantic_cache_key(tool, kwargs)
+        output = cache.lookup_exact(tool.name, query=query, partition=partition)
+        if output is None:
+            vector = embeddings.embed_query(query)
+            output = cache.lookup(tool.name, vector, query=query, partition=partition)
+            if output is None:
+                output = tool.invoke(kwargs, config=wrapped_config(callbacks))
+                cache.add(tool.name, vector, output, query=query, partition=partition)
+        return output
+
+    return StructuredTool.from_function(
+        func=_run,
+        coroutine=_arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema or tool.get_input_schema(),
+        return_direct=tool.return_direct
+    )
@@ -0,0 +1,2 @@
+from .semantic import SemanticCache, SemanticCacheRegistry
+from .faiss_store import FaissIndexStore
\ No newline at end of file
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import pickle
+import re
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.embeddings import Embeddings
+from app.utils.logging import AppLogger
+
+logger = AppLogger().get_logger()
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+SETTINGS_FILE = "index.json"
+TMP_SUFFIX = ".tmp-"
+
+def safe_path_part(value: str) -> str:
+    """
+    Session id / file hash as a single path component.
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", value)
+
+
+class FaissIndexStore:
+    """
+    Disk-backed store of FAISS vector stores for uploaded files.
+
+    An uploaded file is chunked, embedded and indexed once per (session, file hash), saved under
+    `root_dir`, and reopened with FAISS mmap on later turns, so a follow-up question costs one vector
+    search instead of re-embedding the document. Open stores are kept in a worker-wide LRU.
+
+    An index is written to a temporary directory and renamed into place, so other workers never open a
+    half-written one. Indexes not opened for `max_age` seconds are deleted from disk.
+    """
+
+    root_dir: str = os.path.join("static", "faiss_indexes")
+    max_open: int = 64
+    max_age: float = 7 * 24 * 3600
+    cleanup_interval: float = 3600
+
+    _open: "OrderedDict[Tuple[str, str], FAISS]" = OrderedDict()
+    _locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+    _last_cleanup: float = 0
+
+    @classmethod
+    def __index_path__(cls, session_id: str, file_hash: str) -> str:
+        return os.path.join(cls.root_dir, safe_path_part(session_id), safe_path_part(file_hash))
+
+    @classmethod
+    def __save__(cls, path: str, vector_store: FAISS):
+        tmp_path = f"{path}{TMP_SUFFIX}{uuid.uuid4().hex}"
+        try:
+            vector_store.save_local(tmp_path)
+            with open(os.path.join(tmp_path, SETTINGS_FILE), "w") as f:
+                json.dump({
+                    "distance_strategy": DistanceStrategy(vector_store.distance_strategy).value,
+                    "normalize_L2": vector_store._normalize_L2,
+                }, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if not os.path.exists(os.path.join(path, INDEX_FILE)):
+                raise
+            # another worker saved the same file first
+            logger.info(f"Faiss index {path} already saved: {e}")
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    @classmethod
+    def __load__(cls, path: str, embeddings: Embeddings) -> Optional[FAISS]:
+        if not os.path.exists(os.path.join(path, INDEX_FILE)):
+            return None
+        index = faiss.read_index(os.path.join(path, INDEX_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        # written by __save__ in this store, not user supplied
+        with open(os.path.join(path, DOCSTORE_FILE), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        settings = {}
+        if os.path.exists(os.path.join(path, SETTINGS_FILE)):
+            with open(os.path.join(path, SETTINGS_FILE)) as f:
+                settings = json.load(f)
+        # last use, for cleanup
+        os.utime(path)
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+            distance_strategy=DistanceStrategy(settings.get("distance_strategy", DistanceStrategy.EUCLIDEAN_DISTANCE.value)),
+            normalize_L2=settings.get("normalize_L2", False)
+        )
+
+    @classmethod
+    def cleanup(cls, max_age: Optional[float] = None) -> int:
+        """
+        Delete indexes (and leftover temporary directories) not used for `max_age` seconds, and empty
+        session directories. Returns the number of deleted indexes.
+        """
+        max_age = cls.max_age if max_age is None else max_age
+        if not os.path.isdir(cls.root_dir):
+            return 0
+        now = time.time()
+        deleted = 0
+        for session_dir in os.scandir(cls.root_dir):
+            if not session_dir.is_dir():
+                continue
+            for index_dir in os.scandir(session_dir.path):
+                try:
+                    if index_dir.is_dir() and now - index_dir.stat().st_mtime > max_age:
+                        shutil.rmtree(index_dir.path)
+                        deleted += TMP_SUFFIX not in index_dir.name
+                except OSError as e:
+                    logger.warning(f"Failed to delete faiss index {index_dir.path}: {e}")
+            try:
+                os.rmdir(session_dir.path)
+            except OSError:
+                # not empty
+                pass
+        if deleted:
+            logger.info(f"Deleted {deleted} faiss indexes unused for {max_age}s")
+        return deleted
+
+    @classmethod
+    async def __maybe_cleanup__(cls):
+        if time.monotonic() - cls._last_cleanup < cls.cleanup_interval:
+            return
+        cls._last_cleanup = time.monotonic()
+        try:
+            await asyncio.to_thread(cls.cleanup)
+        except Exception as e:
+            logger.warning(f"Failed to clean up faiss indexes: {e}")
+
+    @classmethod
+    def __remember__(cls, key: Tuple[str, str], vector_store: FAISS):
+        cls._open[key] = vector_store
+        cls._open.move_to_end(key)
+        while len(cls._open) > cls.max_open:
+            cls._open.popitem(last=False)
+
+    @classmethod
+    async def get_or_build(
+        cls,
+        session_id: str,
+        file_hash: str,
+        embeddings: Embeddings,
+        build: Callable[[], Awaitable[FAISS]]
+    ) -> FAISS:
+        """
+        Get the vector store of an uploaded file, building and saving it on the first request.
+
+        Parameters:
+
+            session_id (str): session id the file was uploaded to.
+
+            file_hash (str): content hash of the file.
+
+            embeddings (Embeddings): embeddings for queries against the store.
+
+            build (Callable[[], Awaitable[FAISS]]): chunks, embeds and indexes the file.
+        """
+        key = (session_id, file_hash)
+        if key in cls._open:
+            cls._open.move_to_end(key)
+            return cls._open[key]
+
+        lock = cls._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                if key in cls._open:
+                    return cls._open[key]
+
+                path = cls.__index_path__(session_id, file_hash)
+                try:
+                    vector_store = await asyncio.to_thread(cls.__load__, path, embeddings)
+                except Exception as e:
+                    logger.warning(f"Failed to open faiss index {path}, rebuilding: {e}")
+                    vector_store = None
+
+                if vector_store is None:
+                    logger.info(f"Building faiss index for session: {session_id}, file: {file_hash}")
+                    vector_store = await build()
+                    await asyncio.to_thread(cls.__save__, path, vector_store)
+                    await cls.__maybe_cleanup__()
+
+                cls.__remember__(key, vector_store)
+                return vector_store
+        finally:
+            # also after a failed build, so failing files don't keep a lock each
+            cls._locks.pop(key, None)
+
+    @classmethod
+    def evict(cls, session_id: str, file_hash: Optional[str] = None):
+        """
+        Close open stores of a session, or of one file of it. Files on disk are kept.
+        """
+        for key in [key for key in cls._open if key[0] == session_id and file_hash in (None, key[1])]:
+            del cls._open[key]
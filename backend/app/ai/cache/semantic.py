@@ -0,0 +1,243 @@
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from app.utils.logging import AppLogger
+
+logger = AppLogger().get_logger()
+
+NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def query_numbers(query: str) -> Tuple[str, ...]:
+    """
+    Numbers of a query (years, amounts, versions), which embeddings barely tell apart.
+    """
+    return tuple(sorted(NUMBER.findall(query)))
+
+
+@dataclass
+class SemanticCacheEntry:
+    output: Any
+    expires_at: float
+    partition: str
+    query: str
+    numbers: Tuple[str, ...]
+
+
+class SemanticCache:
+    """
+    Cache of tool outputs keyed by query embedding.
+
+    Entries are partitioned by tool and by `partition`, a fingerprint of everything but the query that
+    changes the output (tool config, filters). A lookup returns the output of the same normalized query
+    of the partition, or else of the nearest cached query of the partition with a cosine similarity of
+    at least `threshold` and the same numbers.
+    Entries expire after `ttl` seconds, and the least recently used ones are evicted once the cache holds
+    more than `max_entries` entries.
+    """
+
+    # nearest queries checked for matching numbers
+    candidates: int = 4
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 1000):
+        """
+        Parameters:
+
+            threshold (float): min cosine similarity of a hit.
+
+            ttl (float): entry lifetime in seconds.
+
+            max_entries (int): max number of entries over all tools.
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._indexes: Dict[Tuple[str, str], faiss.IndexIDMap] = {}
+        self._entries: "OrderedDict[Tuple[str, int], SemanticCacheEntry]" = OrderedDict()
+        self._exact: Dict[Tuple[str, str, str], int] = {}
+        self._next_id = 0
+        self._lock = Lock()
+
+    def __normalize__(self, vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(array)
+        return array
+
+    def __remove__(self, tool_name: str, entry_id: int):
+        # caller holds self._lock
+        entry = self._entries.pop((tool_name, entry_id), None)
+        if entry is None:
+            return
+        if self._exact.get((tool_name, entry.partition, entry.query)) == entry_id:
+            del self._exact[(tool_name, entry.partition, entry.query)]
+        index = self._indexes.get((tool_name, entry.partition))
+        if index is not None:
+            index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def __hit__(self, tool_name: str, entry_id: int) -> Optional[Any]:
+        # caller holds self._lock
+        entry = self._entries[(tool_name, entry_id)]
+        if entry.expires_at < time.monotonic():
+            self.__remove__(tool_name, entry_id)
+            return None
+        self._entries.move_to_end((tool_name, entry_id))
+        self.hits += 1
+        return entry.output
+
+    def lookup_exact(self, tool_name: str, query: str, partition: str = "") -> Optional[Any]:
+        """
+        Get the cached output of the same normalized query, None without counting a miss, so the caller
+        can skip embedding the query on a hit.
+        """
+        query = normalize_query(query)
+        with self._lock:
+            entry_id = self._exact.get((tool_name, partition, query))
+            return self.__hit__(tool_name, entry_id) if entry_id is not None else None
+
+    def lookup(self, tool_name: str, vector: List[float], query: str, partition: str = "") -> Optional[Any]:
+        """
+        Get the cached output of the same or the nearest query, None on a miss.
+
+        Parameters:
+
+            tool_name (str): tool name.
+
+            vector (List[float]): query embedding.
+
+            query (str): query text.
+
+            partition (str): fingerprint of the other tool inputs and config.
+        """
+        query = normalize_query(query)
+        search = self.__normalize__(vector)
+        with self._lock:
+            entry_id = self._exact.get((tool_name, partition, query))
+            if entry_id is not None:
+                output = self.__hit__(tool_name, entry_id)
+                if output is not None:
+                    return output
+
+            index = self._indexes.get((tool_name, partition))
+            if index is None or index.ntotal == 0 or index.d != search.shape[1]:
+                self.misses += 1
+                return None
+
+            numbers = query_numbers(query)
+            scores, ids = index.search(search, min(self.candidates, index.ntotal))
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self._entries.get((tool_name, int(entry_id)))
+                if entry is None or entry.numbers != numbers:
+                    continue
+                output = self.__hit__(tool_name, int(entry_id))
+                if output is not None:
+                    return output
+
+            self.misses += 1
+            return None
+
+    def add(self, tool_name: str, vector: List[float], output: Any, query: str, partition: str = ""):
+        """
+        Cache a tool output.
+        """
+        query = normalize_query(query)
+        search = self.__normalize__(vector)
+        with self._lock:
+            index = self._indexes.get((tool_name, partition))
+            if index is None or index.d != search.shape[1]:
+                index = self._indexes[(tool_name, partition)] = faiss.IndexIDMap(faiss.IndexFlatIP(search.shape[1]))
+
+            previous = self._exact.get((tool_name, partition, query))
+            if previous is not None:
+                self.__remove__(tool_name, previous)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(search, np.array([entry_id], dtype=np.int64))
+            self._entries[(tool_name, entry_id)] = SemanticCacheEntry(
+                output=output,
+                expires_at=time.monotonic() + self.ttl,
+                partition=partition,
+                query=query,
+                numbers=query_numbers(query)
+            )
+            self._exact[(tool_name, partition, query)] = entry_id
+
+            while len(self._entries) > self.max_entries:
+                (evicted_tool, evicted_id), _ = next(iter(self._entries.items()))
+                self.__remove__(evicted_tool, evicted_id)
+
+            # partitions without entries, e.g. of an old tool config
+            for key in [key for key, index in self._indexes.items() if index.ntotal == 0]:
+                del self._indexes[key]
+
+    def invalidate(self, tool_name: Optional[str] = None):
+        """
+        Drop the entries of one tool or of all tools.
+        """
+        with self._lock:
+            for key in [key for key in self._indexes if tool_name is None or key[0] == tool_name]:
+                del self._indexes[key]
+            for key in [key for key in self._entries if tool_name is None or key[0] == tool_name]:
+                del self._entries[key]
+            for key in [key for key in self._exact if tool_name is None or key[0] == tool_name]:
+                del self._exact[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SemanticCacheRegistry:
+    """
+    Per-tenant semantic caches of a worker.
+    """
+
+    threshold: float = 0.95
+    ttl: float = 3600
+    max_entries_per_tenant: int = 1000
+
+    _caches: Dict[str, SemanticCache] = {}
+    _lock = Lock()
+
+    @classmethod
+    def get(cls, tenant_id: str) -> SemanticCache:
+        """
+        Get the semantic cache of a tenant.
+        """
+        with cls._lock:
+            if tenant_id not in cls._caches:
+                cls._caches[tenant_id] = SemanticCache(
+                    threshold=cls.threshold,
+                    ttl=cls.ttl,
+                    max_entries=cls.max_entries_per_tenant
+                )
+            return cls._caches[tenant_id]
+
+    @classmethod
+    def invalidate(cls, tenant_id: Optional[str] = None, tool_name: Optional[str] = None):
+        """
+        Invalidate cached tool outputs, e.g. after a tenant's search index was updated.
+
+        Parameters:
+
+            tenant_id (Optional[str]): tenant to invalidate, all tenants if None.
+
+            tool_name (Optional[str]): tool to invalidate, all tools if None.
+        """
+        with cls._lock:
+            caches = [cls._caches.get(tenant_id)] if tenant_id is not None else list(cls._caches.values())
+        for cache in caches:
+            if cache is not None:
+                cache.invalidate(tool_name=tool_name)
+        logger.info(f"Invalidated semantic cache for tenant: {tenant_id or 'all'}, tool: {tool_name or 'all'}")
@@ -0,0 +1 @@
+from .renderer import ChartRenderer, normalize_chart_options
\ No newline at end of file
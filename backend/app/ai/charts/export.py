@@ -0,0 +1,14 @@
+import os
+import highchartexport as hc_export
+
+def export_chart(options: dict, format: str, path: str) -> str:
+    """
+    Export chart options to an image file, runs in a ChartRenderer worker process.
+
+    Written to a temporary file first, so readers never see a partial image.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    getattr(hc_export, f"save_as_{format}")(config=options, filename=tmp_path)
+    os.replace(tmp_path, path)
+    return path
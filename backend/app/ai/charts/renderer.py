@@ -0,0 +1,139 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+from app.utils.logging import AppLogger
+from .export import export_chart
+
+logger = AppLogger().get_logger()
+
+def normalize_chart_options(options: Dict[str, Any]) -> str:
+    """
+    Canonical JSON of chart options: sorted keys, no whitespace, floats rounded to 6 digits.
+    """
+    def normalize(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {str(key): normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        if isinstance(value, float):
+            return round(value, 6)
+        return value
+
+    return json.dumps(normalize(options), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class ChartRenderer:
+    """
+    Chart export in a bounded process pool with a content-addressed cache.
+
+    Images are stored under `root_dir` by the hash of the normalized chart options, a chart that was
+    rendered before returns its link without rendering. Concurrent requests for the same chart share
+    one export, and the event loop only awaits the worker process.
+    """
+
+    root_dir: str = os.path.join("static", "charts")
+    url_prefix: str = "/static/charts"
+    max_workers: int = 2
+    # exports waiting for a worker, beyond that render() waits before submitting
+    max_pending: int = 32
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _inflight: Dict[str, asyncio.Task] = {}
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def __get_executor__(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            # spawn, forking a worker with running threads / event loop is unsafe
+            cls._executor = ProcessPoolExecutor(
+                max_workers=cls.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(cls.shutdown)
+        return cls._executor
+
+    @classmethod
+    def chart_key(cls, options: Dict[str, Any], format: str = "png") -> str:
+        return hashlib.sha256(f"{format}\n{normalize_chart_options(options)}".encode()).hexdigest()
+
+    @classmethod
+    def __chart_path__(cls, key: str, format: str) -> str:
+        return os.path.join(cls.root_dir, key[:2], f"{key}.{format}")
+
+    @classmethod
+    def __chart_url__(cls, key: str, format: str) -> str:
+        return f"{cls.url_prefix}/{key[:2]}/{key}.{format}"
+
+    @classmethod
+    async def render(cls, options: Dict[str, Any], format: str = "png") -> str:
+        """
+        Render a chart, returns the link of the image.
+
+        Parameters:
+
+            options (Dict[str, Any]): highcharts options.
+
+            format (str): image format, "png", "jpeg", "svg" or "pdf". Default to "png".
+        """
+        key = cls.chart_key(options, format=format)
+        path = cls.__chart_path__(key, format)
+        if os.path.exists(path):
+            cls.hits += 1
+            return cls.__chart_url__(key, format)
+
+        task = cls._inflight.get(key)
+        if task is None:
+            cls.misses += 1
+            # its own task: a cancelled requester (e.g. a tool timeout) doesn't cancel it for the others
+            task = cls._inflight[key] = asyncio.create_task(cls.__render__(key, options, format, path))
+            task.add_done_callback(lambda _: cls.__render_done__(key, task))
+        else:
+            cls.hits += 1
+        await asyncio.shield(task)
+        return cls.__chart_url__(key, format)
+
+    @classmethod
+    async def __render__(cls, key: str, options: Dict[str, Any], format: str, path: str):
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(cls.max_workers + cls.max_pending)
+        try:
+            async with cls._semaphore:
+                await asyncio.get_running_loop().run_in_executor(
+                    cls.__get_executor__(),
+                    export_chart,
+                    json.loads(normalize_chart_options(options)),
+                    format,
+                    path
+                )
+        except Exception as e:
+            logger.error(f"Failed to render chart {key}: {e}")
+            raise
+
+    @classmethod
+    def __render_done__(cls, key: str, task: asyncio.Task):
+        if cls._inflight.get(key) is task:
+            del cls._inflight[key]
+        # retrieved also when every requester was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "inflight": len(cls._inflight),
+        }
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
@@ -0,0 +1 @@
+from .service import EmbeddingService, EmbeddingVectorCache
\ No newline at end of file
@@ -0,0 +1,333 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.utils.logging import AppLogger
+
+logger = AppLogger().get_logger()
+
+KEYS_FILE = "keys.txt"
+VECTORS_FILE = "vectors.f32"
+
+# anchored in the backend directory, so the cache doesn't depend on the working directory of the server
+DEFAULT_CACHE_DIR = os.getenv(
+    "EMBEDDINGS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "static", "embeddings_cache")
+)
+
+class EmbeddingVectorCache:
+    """
+    Content-hash -> float32 vector cache, backed by append-only files.
+
+    `vectors.f32` holds raw float32 rows and `keys.txt` one "hash dimension byte-offset" line per row,
+    written after the row, so a partial write never maps a key to the wrong bytes. Appends are serialized
+    across workers with a file lock and stop once the vectors file reaches `max_file_bytes`.
+
+    The key file is read on first use (`load()` / `aload()`), the vectors file is memory mapped and rows are
+    copied into an LRU of `max_memory_entries` when used. Rows appended by this worker are indexed as they are
+    written and the file is re-mapped when a row past the mapped size is read. Entries written by other
+    workers show up after a restart.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str],
+        max_memory_entries: int = 100_000,
+        max_file_bytes: int = 2 * 2**30
+    ):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_file_bytes = max_file_bytes
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._data: Optional[np.memmap] = None
+        self._loaded = cache_dir is None
+        self._lock = Lock()
+        self._load_lock = Lock()
+
+    def load(self):
+        """
+        Read the key file and map the vectors file, once.
+        """
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self.__load__()
+                self._loaded = True
+
+    async def aload(self):
+        if not self._loaded:
+            await asyncio.to_thread(self.load)
+
+    def __load__(self):
+        keys_path = os.path.join(self.cache_dir, KEYS_FILE)
+        vectors_path = os.path.join(self.cache_dir, VECTORS_FILE)
+        if not os.path.exists(keys_path) or not os.path.exists(vectors_path):
+            return
+        vectors_size = os.path.getsize(vectors_path)
+        if vectors_size < 4:
+            return
+        index: Dict[str, Tuple[int, int]] = {}
+        with open(keys_path) as f:
+            for line in f:
+                fields = line.split()
+                # torn lines of a crashed write
+                if len(fields) != 3 or len(fields[0]) != 64 or not fields[1].isdigit() or not fields[2].isdigit():
+                    continue
+                dim, offset = int(fields[1]), int(fields[2])
+                if offset % 4 or offset + dim * 4 > vectors_size:
+                    continue
+                index[fields[0]] = (offset // 4, dim)
+        with self._lock:
+            self.__map__()
+            self._index.update(index)
+        logger.info(f"Indexed {len(index)} cached embeddings in {self.cache_dir}")
+
+    def __map__(self):
+        """
+        Map the whole vectors file. Called with the lock held.
+        """
+        vectors_size = os.path.getsize(os.path.join(self.cache_dir, VECTORS_FILE))
+        self._data = np.memmap(
+            os.path.join(self.cache_dir, VECTORS_FILE), dtype=np.float32, mode="r", shape=(vectors_size // 4,)
+        )
+
+    def __remember__(self, key: str, vector: np.ndarray):
+        self._vectors[key] = vector
+        self._vectors.move_to_end(key)
+        while len(self._vectors) > self.max_memory_entries:
+            self._vectors.popitem(last=False)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+                return vector
+            location = self._index.get(key)
+            if location is None:
+                return None
+            start, dim = location
+            if self._data is None or start + dim > len(self._data):
+                # appended after the file was mapped
+                self.__map__()
+            vector = np.array(self._data[start:start + dim])
+            self.__remember__(key, vector)
+            return vector
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, vector in vectors.items():
+                self.__remember__(key, vector)
+
+    def persist(self, vectors: Dict[str, np.ndarray]):
+        """
+        Append vectors to the cache files.
+        """
+        if self.cache_dir is None or not vectors:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, KEYS_FILE), "a+") as keys_file:
+            fcntl.flock(keys_file, fcntl.LOCK_EX)
+            try:
+                with open(os.path.join(self.cache_dir, VECTORS_FILE), "ab") as vectors_file:
+                    offset = os.fstat(vectors_file.fileno()).st_size
+                    if offset >= self.max_file_bytes:
+                        return
+                    # realign after a torn row
+                    if offset % 4:
+                        vectors_file.write(b"\0" * (4 - offset % 4))
+                        offset += 4 - offset % 4
+                    lines = []
+                    index: Dict[str, Tuple[int, int]] = {}
+                    for key, vector in vectors.items():
+                        data = vector.astype(np.float32).tobytes()
+                        vectors_file.write(data)
+                        lines.append(f"{key} {len(vector)} {offset}\n")
+                        index[key] = (offset // 4, len(vector))
+                        offset += len(data)
+                    vectors_file.flush()
+                # a torn last line doesn't swallow the first new one
+                keys_size = os.fstat(keys_file.fileno()).st_size
+                if keys_size:
+                    keys_file.seek(keys_size - 1)
+                    if keys_file.read(1) != "\n":
+                        lines.insert(0, "\n")
+                keys_file.write("".join(lines))
+            finally:
+                keys_file.flush()
+                fcntl.flock(keys_file, fcntl.LOCK_UN)
+        # served from the file once they leave the memory LRU
+        with self._lock:
+            self._index.update(index)
+
+
+class EmbeddingService(Embeddings):
+    """
+    Batched, deduplicated and cached embeddings.
+
+    Concurrent async requests are collected for `batch_window` seconds and sent in embedding calls of up
+    to `batch_size` texts. Texts are keyed by content hash, so identical texts are
+    embedded once, and vectors are kept in an EmbeddingVectorCache so repeated chunks and queries
+    cost no embedding calls.
+
+    The sync methods block on the embedding call, as the wrapped client does; appending their vectors to
+    the cache files runs on a background thread. Async callers should use `aembed_documents` / `aembed_query`.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        namespace: str,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        batch_size: int = 2048,
+        batch_window: float = 0.01
+    ):
+        """
+        Parameters:
+
+            embeddings (Embeddings): embeddings client, e.g. AzureOpenAIEmbeddings.
+
+            namespace (str): model / deployment name, part of the cache key.
+
+            cache_dir (Optional[str]): directory of the persisted cache, memory only if None. Default to
+                EMBEDDINGS_CACHE_DIR, else backend/static/embeddings_cache.
+
+            batch_size (int): max number of texts per embedding call.
+
+            batch_window (float): seconds to wait for more texts before sending a batch.
+        """
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.cache = EmbeddingVectorCache(
+            cache_dir=os.path.join(cache_dir, namespace) if cache_dir is not None else None
+        )
+        self.hits = 0
+        self.misses = 0
+        self.calls = 0
+        self._pending: "OrderedDict[str, str]" = OrderedDict()
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # one writer, appends of sync calls keep their order and don't hold up the caller
+        self._persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embeddings-cache")
+
+    def __key__(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\n{text}".encode()).hexdigest()
+
+    async def __flush__(self):
+        await asyncio.sleep(self.batch_window)
+        while self._pending:
+            keys = list(self._pending)[:self.batch_size]
+            texts = [self._pending.pop(key) for key in keys]
+            # futures stay registered while the call is in flight so new requests for the same texts join it
+            futures = [self._futures[key] for key in keys]
+            try:
+                self.calls += 1
+                result = await self.embeddings.aembed_documents(texts)
+                vectors = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(keys, result)}
+                self.cache.put_many(vectors)
+                for future, key in zip(futures, keys):
+                    if not future.done():
+                        future.set_result(vectors[key])
+                await asyncio.to_thread(self.cache.persist, vectors)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for key in keys:
+                    self._futures.pop(key, None)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.__key__(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+
+        await self.cache.aload()
+        for key, text in zip(keys, texts):
+            if key in vectors or key in waiting:
+                continue
+            vector = self.cache.get(key)
+            if vector is not None:
+                self.hits += 1
+                vectors[key] = vector
+                continue
+            self.misses += 1
+            if key not in self._futures:
+                self._futures[key] = asyncio.get_running_loop().create_future()
+                self._pending[key] = text
+            waiting[key] = self._futures[key]
+
+        if waiting:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self.__flush__())
+            # shared with other callers of the same texts, cancelling this one must not cancel them
+            results = await asyncio.gather(*(asyncio.shield(future) for future in waiting.values()))
+            vectors.update(zip(waiting.keys(), results))
+
+        return [vectors[key].tolist() for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.__key__(text) for text in texts]
+        self.cache.load()
+        vectors: Dict[str, np.ndarray] = {}
+        missing: "OrderedDict[str, str]" = OrderedDict()
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self.cache.get(key)
+            if vector is not None:
+                vectors[key] = vector
+            else:
+                missing[key] = text
+        self.hits += len(vectors)
+        self.misses += len(missing)
+
+        new_vectors: Dict[str, np.ndarray] = {}
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[start:start + self.batch_size]
+            self.calls += 1
+            result = self.embeddings.embed_documents([missing[key] for key in batch])
+            new_vectors.update({key: np.asarray(vector, dtype=np.float32) for key, vector in zip(batch, result)})
+        self.cache.put_many(new_vectors)
+        if new_vectors:
+            self._persist_executor.submit(self.__persist__, new_vectors)
+        vectors.update(new_vectors)
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def wait_persisted(self):
+        """
+        Wait until the vectors of earlier sync calls are appended to the cache files.
+        """
+        self._persist_executor.submit(lambda: None).result()
+
+    def __persist__(self, vectors: Dict[str, np.ndarray]):
+        try:
+            self.cache.persist(vectors)
+        except Exception as e:
+            logger.warning(f"Failed to persist {len(vectors)} embeddings: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "calls": self.calls,
+            "pending": len(self._pending),
+        }
@@ -1,2 +1,3 @@
 from .agent import AgentStreamingEventTypeEnum
-from .tool import ToolNameEnum
\ No newline at end of file
+from .tool import ToolNameEnum
+from .model import ModelTierEnum, ModelRoutingPolicyEnum
\ No newline at end of file
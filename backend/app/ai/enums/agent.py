@@ -5,4 +5,5 @@ class AgentStreamingEventTypeEnum(PyEnum):
     CAHIN_END = "chain_end"
     MESSAGE = "message"
     TOOL_START = "tool_start"
-    TOOL_END = "tool_end"
\ No newline at end of file
+    TOOL_END = "tool_end"
+    ERROR = "error"
\ No newline at end of file
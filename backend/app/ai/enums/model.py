@@ -0,0 +1,11 @@
+from enum import Enum as PyEnum
+
+class ModelTierEnum(PyEnum):
+    FAST = "fast"
+    SMART = "smart"
+
+
+class ModelRoutingPolicyEnum(PyEnum):
+    SMART = "smart"
+    TIERED = "tiered"
+    CASCADE = "cascade"
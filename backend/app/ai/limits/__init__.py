@@ -0,0 +1,3 @@
+from .shared import SharedRateBudget
+from .admission import AdmissionController, LLMRequestContext, llm_request_context, llm_request_context_var, Permit, INTERACTIVE, BACKGROUND
+from .transport import AdmissionTransport
\ No newline at end of file
@@ -0,0 +1,223 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+from app.utils.logging import AppLogger
+from .shared import SharedRateBudget
+
+logger = AppLogger().get_logger()
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+@dataclass(frozen=True)
+class LLMRequestContext:
+    tenant: str = "default"
+    priority: int = INTERACTIVE
+
+
+llm_request_context_var: ContextVar[LLMRequestContext] = ContextVar("llm_request_context", default=LLMRequestContext())
+
+@contextmanager
+def llm_request_context(tenant: str, priority: int = INTERACTIVE):
+    """
+    Tenant and priority of the LLM calls made inside the block, including tasks started in it.
+    """
+    token = llm_request_context_var.set(LLMRequestContext(tenant=tenant, priority=priority))
+    try:
+        yield
+    finally:
+        llm_request_context_var.reset(token)
+
+
+@dataclass
+class Permit:
+    tenant: str
+    priority: int
+    granted_at: float
+
+
+class AdmissionController:
+    """
+    Admission control for the LLM calls of one deployment.
+
+    - shared requests / tokens per minute budgets across the workers of a host (SharedRateBudget),
+      and a shared pause after a 429.
+    - AIMD concurrency per worker: the limit grows by about one per round of successful calls and is
+      cut on 429s and when latency goes over `latency_target`.
+    - waiting calls are served by priority (interactive chat before background reports), and round-robin
+      across tenants within a priority, so one tenant's burst can't starve the others.
+    """
+
+    state_dir: str = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else "/tmp", "agent_llm_limits")
+    default_rpm: float = float(os.getenv("LLM_DEFAULT_RPM", "600"))
+    default_tpm: float = float(os.getenv("LLM_DEFAULT_TPM", "150000"))
+
+    _controllers: Dict[str, "AdmissionController"] = {}
+
+    def __init__(
+        self,
+        deployment: str,
+        rpm: float,
+        tpm: float,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        latency_target: float = 20.0
+    ):
+        """
+        Parameters:
+
+            deployment (str): azure openai deployment name.
+
+            rpm (float): deployment requests per minute, shared by all workers.
+
+            tpm (float): deployment tokens per minute, shared by all workers.
+
+            initial_concurrency (int): concurrent calls per worker to start with.
+
+            min_concurrency (int): lower bound of the adaptive limit.
+
+            max_concurrency (int): upper bound of the adaptive limit.
+
+            latency_target (float): seconds to response headers above which the limit is decreased.
+        """
+        self.deployment = deployment
+        self.budget = SharedRateBudget(
+            path=os.path.join(self.state_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", deployment)),
+            rpm=rpm,
+            tpm=tpm
+        )
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.active = 0
+        self._waiters: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+        self._last_decrease = 0.0
+        self.admitted = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+
+    @classmethod
+    def for_deployment(cls, deployment: str) -> "AdmissionController":
+        """
+        Worker-wide controller of a deployment. Budgets come from LLM_RPM_<DEPLOYMENT> / LLM_TPM_<DEPLOYMENT>,
+        e.g. LLM_RPM_GPT_4O, falling back to LLM_DEFAULT_RPM / LLM_DEFAULT_TPM.
+        """
+        if deployment not in cls._controllers:
+            name = re.sub(r"[^A-Za-z0-9]", "_", deployment).upper()
+            cls._controllers[deployment] = cls(
+                deployment=deployment,
+                rpm=float(os.getenv(f"LLM_RPM_{name}", cls.default_rpm)),
+                tpm=float(os.getenv(f"LLM_TPM_{name}", cls.default_tpm))
+            )
+        return cls._controllers[deployment]
+
+    def __waiting__(self) -> int:
+        return sum(len(queue) for tenants in self._waiters.values() for queue in tenants.values())
+
+    def __next_waiter__(self) -> Optional[asyncio.Future]:
+        for priority in sorted(self._waiters):
+            tenants = self._waiters[priority]
+            while tenants:
+                tenant, queue = next(iter(tenants.items()))
+                future = queue.popleft()
+                if queue:
+                    tenants.move_to_end(tenant)
+                else:
+                    del tenants[tenant]
+                # cancelled waiters are skipped
+                if not future.done():
+                    return future
+            del self._waiters[priority]
+        return None
+
+    def __wake__(self):
+        while self.active < int(self.limit):
+            future = self.__next_waiter__()
+            if future is None:
+                return
+            self.active += 1
+            future.set_result(True)
+
+    async def acquire(self, tenant: str, priority: int, tokens: float) -> Permit:
+        """
+        Wait for a concurrency slot and rate budget for one call of about `tokens` tokens.
+        """
+        start = time.perf_counter()
+        if self.active < int(self.limit) and self.__waiting__() == 0:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(priority, OrderedDict()).setdefault(tenant, deque()).append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # the slot was granted while being cancelled
+                    self.active -= 1
+                    self.__wake__()
+                raise
+
+        try:
+            while True:
+                wait = await asyncio.to_thread(self.budget.try_take, tokens)
+                if wait == 0:
+                    break
+                self.throttled += 1
+                await asyncio.sleep(min(wait, 1.0))
+        except BaseException:
+            self.active -= 1
+            self.__wake__()
+            raise
+
+        self.admitted += 1
+        self.wait_time += time.perf_counter() - start
+        return Permit(tenant=tenant, priority=priority, granted_at=time.perf_counter())
+
+    def release(self, permit: Permit, status_code: Optional[int], latency: float):
+        """
+        Return a slot and adapt the limit: cut on 429 / slow responses, grow on healthy ones.
+
+        Parameters:
+
+            permit (Permit): permit of the call.
+
+            status_code (Optional[int]): response status, None if the request failed.
+
+            latency (float): seconds to response headers.
+        """
+        self.active -= 1
+        now = time.monotonic()
+        if status_code == 429 or latency > self.latency_target:
+            # at most one decrease per second, a burst of 429s is one congestion signal
+            if now - self._last_decrease > 1.0:
+                self.limit = max(self.min_concurrency, self.limit * (0.5 if status_code == 429 else 0.8))
+                self._last_decrease = now
+                logger.info(f"LLM concurrency of {self.deployment} decreased to {int(self.limit)}")
+        elif status_code is not None and status_code < 400:
+            self.limit = min(self.max_concurrency, self.limit + 1 / max(self.limit, 1))
+        self.__wake__()
+
+    def backoff(self, seconds: float):
+        """
+        Pause calls of this deployment in all workers.
+        """
+        logger.warning(f"LLM deployment {self.deployment} is rate limited, pausing for {seconds:.1f}s")
+        self.budget.backoff(seconds)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.__waiting__(),
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "avg_wait_time": self.wait_time / self.admitted if self.admitted else 0.0,
+        }
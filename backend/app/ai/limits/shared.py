@@ -0,0 +1,84 @@
+import fcntl
+import os
+import struct
+import time
+from typing import Tuple
+
+# requests level, tokens level, last refill, backoff until
+STATE = struct.Struct("dddd")
+
+class SharedRateBudget:
+    """
+    Requests-per-minute and tokens-per-minute token buckets of one deployment, shared by all workers
+    of the host through a small state file (in /dev/shm when available) updated under flock.
+
+    Also holds a shared backoff deadline, so a 429 seen by one worker pauses all of them.
+    """
+
+    def __init__(self, path: str, rpm: float, tpm: float, burst_seconds: float = 10):
+        """
+        Parameters:
+
+            path (str): state file.
+
+            rpm (float): requests per minute.
+
+            tpm (float): tokens per minute.
+
+            burst_seconds (float): bucket capacity in seconds of budget.
+        """
+        self.path = path
+        self.request_rate = rpm / 60
+        self.token_rate = tpm / 60
+        self.request_capacity = max(self.request_rate * burst_seconds, 1)
+        self.token_capacity = max(self.token_rate * burst_seconds, 1)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def __read__(self, now: float) -> Tuple[float, float, float, float]:
+        data = os.pread(self._fd, STATE.size, 0)
+        if len(data) < STATE.size:
+            return self.request_capacity, self.token_capacity, now, 0.0
+        return STATE.unpack(data)
+
+    def __write__(self, *state: float):
+        os.pwrite(self._fd, STATE.pack(*state), 0)
+
+    def try_take(self, tokens: float) -> float:
+        """
+        Take one request and `tokens` tokens from the budget. Returns 0 when taken, otherwise the seconds
+        to wait before trying again (nothing is taken).
+        """
+        tokens = min(tokens, self.token_capacity)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            now = time.time()
+            requests, budget_tokens, updated, backoff_until = self.__read__(now)
+            elapsed = max(now - updated, 0)
+            requests = min(requests + elapsed * self.request_rate, self.request_capacity)
+            budget_tokens = min(budget_tokens + elapsed * self.token_rate, self.token_capacity)
+
+            wait = max(backoff_until - now, 0)
+            if requests < 1:
+                wait = max(wait, (1 - requests) / self.request_rate)
+            if budget_tokens < tokens:
+                wait = max(wait, (tokens - budget_tokens) / self.token_rate)
+            if wait == 0:
+                requests -= 1
+                budget_tokens -= tokens
+            self.__write__(requests, budget_tokens, now, backoff_until)
+            return wait
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def backoff(self, seconds: float):
+        """
+        Pause all workers for `seconds`, e.g. the Retry-After of a 429.
+        """
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            now = time.time()
+            requests, budget_tokens, updated, backoff_until = self.__read__(now)
+            self.__write__(requests, budget_tokens, updated, max(backoff_until, now + seconds))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
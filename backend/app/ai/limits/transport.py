@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Callable, Optional
+import httpx
+from .admission import AdmissionController, llm_request_context_var
+
+# completion tokens assumed when a request sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+def estimate_tokens(request: httpx.Request) -> float:
+    """
+    Rough token cost of a chat completion request: body size / 4 plus max_tokens.
+    """
+    try:
+        body = request.content or b""
+    except httpx.RequestNotRead:
+        return DEFAULT_COMPLETION_TOKENS
+    completion = DEFAULT_COMPLETION_TOKENS
+    try:
+        completion = json.loads(body).get("max_tokens") or completion
+    except (ValueError, AttributeError):
+        pass
+    return len(body) / 4 + completion
+
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """
+    Response body that returns the admission permit when it is closed, so a streamed completion
+    holds its slot until the last token.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self.stream = stream
+        self.release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        if self.release is not None:
+            release, self.release = self.release, None
+            release()
+        await self.stream.aclose()
+
+
+class AdmissionTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that admits every request through an AdmissionController.
+
+    Tenant and priority come from llm_request_context. A 429 pauses the deployment in all workers for
+    its Retry-After (1s by default) and lowers the concurrency limit.
+    """
+
+    def __init__(self, controller: AdmissionController, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.controller = controller
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        context = llm_request_context_var.get()
+        permit = await self.controller.acquire(context.tenant, context.priority, estimate_tokens(request))
+        start = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.controller.release(permit, status_code=None, latency=time.perf_counter() - start)
+            raise
+
+        latency = time.perf_counter() - start
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get("retry-after", 1))
+            except ValueError:
+                retry_after = 1.0
+            await asyncio.to_thread(self.controller.backoff, retry_after)
+        response.stream = ReleasingStream(
+            response.stream,
+            lambda: self.controller.release(permit, status_code=response.status_code, latency=latency)
+        )
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
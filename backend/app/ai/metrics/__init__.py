@@ -0,0 +1,2 @@
+from .store import MetricsStore
+from .agent import AgentRunMetrics, HISTORY_LOAD, PROMPT_FETCH, TIME_TO_FIRST_TOKEN, TOOL_DURATION, LLM_CALL, RUN_DURATION, LLM_TOKENS, LLM_ROUTED_CALLS, LLM_ESCALATIONS, SEARCH_SLOT_WAIT, SEARCH_CLIENTS
\ No newline at end of file
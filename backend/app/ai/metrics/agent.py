@@ -0,0 +1,124 @@
+import os
+import time
+from typing import Dict, List, Optional
+from .store import MetricsStore
+from ..enums import ToolNameEnum
+from ..tracing import generation_details
+
+HISTORY_LOAD = "agent_history_load_seconds"
+PROMPT_FETCH = "agent_prompt_fetch_seconds"
+TIME_TO_FIRST_TOKEN = "agent_time_to_first_token_seconds"
+TOOL_DURATION = "agent_tool_duration_seconds"
+LLM_CALL = "agent_llm_call_seconds"
+RUN_DURATION = "agent_run_seconds"
+LLM_TOKENS = "agent_llm_tokens_total"
+LLM_ROUTED_CALLS = "agent_llm_routed_calls_total"
+LLM_ESCALATIONS = "agent_llm_escalations_total"
+SEARCH_SLOT_WAIT = "agent_search_slot_wait_seconds"
+SEARCH_CLIENTS = "agent_search_clients_total"
+
+MetricsStore.histogram(HISTORY_LOAD, "Loading and trimming the session history.")
+MetricsStore.histogram(PROMPT_FETCH, "Getting a prompt template from the prompt registry.", buckets=(0.0001, 0.001, 0.01, 0.1, 0.5, 1.0, 5.0))
+MetricsStore.histogram(TIME_TO_FIRST_TOKEN, "Agent start to the first streamed answer token.")
+MetricsStore.histogram(TOOL_DURATION, "Tool call wall time.")
+MetricsStore.histogram(LLM_CALL, "Chat model call wall time.")
+MetricsStore.histogram(RUN_DURATION, "Agent run wall time, status is ok, error or cancelled.")
+MetricsStore.counter(LLM_TOKENS, "Chat model tokens, direction is in (prompt) or out (completion).")
+MetricsStore.counter(LLM_ROUTED_CALLS, "Chat model calls made through the model router, by prompt and tier.")
+MetricsStore.counter(LLM_ESCALATIONS, "Fast model answers that failed validation and were retried on the smart model.")
+MetricsStore.histogram(SEARCH_SLOT_WAIT, "Wait for a per-tenant search slot.", buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 5.0))
+MetricsStore.counter(SEARCH_CLIENTS, "Pooled search retrievers, event is created, reused (per borrow) or evicted.")
+
+TOOL_NAMES = {tool.value for tool in ToolNameEnum}
+
+class AgentRunMetrics:
+    """
+    Structured timings of one agent run, fed with the agent's astream_events.
+
+    Records time to first token, per-tool and per-LLM-call durations, LLM tokens in / out and the run
+    wall time, labelled by agent (and tool). Histograms and counters are labelled by tenant only with
+    AGENT_METRICS_TENANT_LABELS, as every tenant adds a series per bucket and per counter.
+    """
+
+    tenant_labels: bool = os.getenv("AGENT_METRICS_TENANT_LABELS", "").lower() in ("1", "true")
+
+    def __init__(self, tenant: str, agent: str, encoding=None):
+        """
+        Parameters:
+
+            tenant (str): tenant uuid.
+
+            agent (str): agent name.
+
+            encoding: tiktoken encoding to count tokens when the model reports no usage.
+        """
+        self.tenant = tenant
+        self.agent = agent
+        self.encoding = encoding
+        self.labels = self.labels_for(tenant=tenant, agent=agent)
+        self.start = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.finished = False
+        self._starts: Dict[str, float] = {}
+        self._streamed: Dict[str, int] = {}
+        self._prompt_tokens: Dict[str, int] = {}
+
+    @classmethod
+    def labels_for(cls, tenant: str, agent: str) -> Dict[str, str]:
+        """
+        Labels of agent metrics, the tenant only if tenant_labels is set.
+        """
+        return {"tenant": tenant, "agent": agent} if cls.tenant_labels else {"agent": agent}
+
+    def __count_input_tokens__(self, messages: List) -> int:
+        if self.encoding is None:
+            return 0
+        messages = messages[0] if messages and isinstance(messages[0], list) else messages
+        return sum(len(self.encoding.encode(str(message.content))) for message in messages if hasattr(message, "content"))
+
+    def on_event(self, event: Dict):
+        kind = event["event"]
+        if kind == "on_chat_model_start":
+            self._starts[event["run_id"]] = time.perf_counter()
+            self._streamed[event["run_id"]] = 0
+            self._prompt_tokens[event["run_id"]] = self.__count_input_tokens__(
+                (event["data"].get("input") or {}).get("messages", [])
+            )
+        elif kind == "on_chat_model_stream":
+            if event["data"]["chunk"].content:
+                if self.first_token is None:
+                    self.first_token = time.perf_counter()
+                    MetricsStore.observe(TIME_TO_FIRST_TOKEN, self.first_token - self.start, **self.labels)
+                self._streamed[event["run_id"]] = self._streamed.get(event["run_id"], 0) + 1
+        elif kind == "on_chat_model_end":
+            started = self._starts.pop(event["run_id"], None)
+            if started is not None:
+                MetricsStore.observe(LLM_CALL, time.perf_counter() - started, **self.labels)
+            _, usage = generation_details(event)
+            tokens_in = usage.get("input_tokens", 0) if usage else self._prompt_tokens.get(event["run_id"], 0)
+            # one streamed chunk is one token for azure openai
+            tokens_out = usage.get("output_tokens", 0) if usage else self._streamed.get(event["run_id"], 0)
+            self._prompt_tokens.pop(event["run_id"], None)
+            self._streamed.pop(event["run_id"], None)
+            MetricsStore.inc(LLM_TOKENS, tokens_in, direction="in", **self.labels)
+            MetricsStore.inc(LLM_TOKENS, tokens_out, direction="out", **self.labels)
+        elif kind == "on_tool_start":
+            self._starts[event["run_id"]] = time.perf_counter()
+        elif kind == "on_tool_end":
+            started = self._starts.pop(event["run_id"], None)
+            if started is not None:
+                MetricsStore.observe(
+                    TOOL_DURATION,
+                    time.perf_counter() - started,
+                    tool=event["name"] if event["name"] in TOOL_NAMES else "other",
+                    **self.labels
+                )
+
+    def finish(self, status: str = "ok"):
+        """
+        Record the run wall time, once. Called at the end of the run and again when the agent loop exits.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        MetricsStore.observe(RUN_DURATION, time.perf_counter() - self.start, status=status, **self.labels)
@@ -0,0 +1,13 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from .store import MetricsStore
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """
+    Prometheus metrics of all workers.
+    """
+    return PlainTextResponse(await asyncio.to_thread(MetricsStore.render), media_type="text/plain; version=0.0.4")
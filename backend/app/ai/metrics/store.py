@@ -0,0 +1,227 @@
+import glob
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from threading import Lock, Thread
+from typing import Dict, List, Optional, Tuple
+from app.utils.logging import AppLogger
+
+logger = AppLogger().get_logger()
+
+HISTOGRAM = "histogram"
+COUNTER = "counter"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class MetricsStore:
+    """
+    Histograms and counters of this worker, aggregated over all gunicorn workers for /metrics.
+
+    Every worker keeps its metrics in memory and a background thread writes a snapshot to
+    `<directory>/<pid>-<start time>.json` once a second, so a new worker that gets the pid of an exited
+    one doesn't overwrite its snapshot. `render()` sums the snapshots of all workers, including workers
+    that exited less than `dead_worker_retention` seconds ago, and deletes older ones of exited workers.
+    """
+
+    directory: str = os.getenv("AGENT_METRICS_DIR", os.path.join("/tmp", "agent_metrics"))
+    write_interval: float = 1.0
+    dead_worker_retention: float = float(os.getenv("AGENT_METRICS_DEAD_WORKER_RETENTION", 600))
+
+    # name -> (type, help, buckets)
+    _definitions: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}
+    # name -> labels -> [bucket counts..., sum, count] / counter value
+    _histograms: Dict[str, Dict[Labels, List[float]]] = {}
+    _counters: Dict[str, Dict[Labels, float]] = {}
+    _lock = Lock()
+    # the writer thread and /metrics requests both write the snapshot
+    _write_lock = Lock()
+    _dirty = False
+    _writer: Optional[Thread] = None
+
+    @classmethod
+    def histogram(cls, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        cls._definitions[name] = (HISTOGRAM, help, tuple(buckets))
+        cls._histograms.setdefault(name, {})
+
+    @classmethod
+    def counter(cls, name: str, help: str):
+        cls._definitions[name] = (COUNTER, help, ())
+        cls._counters.setdefault(name, {})
+
+    @classmethod
+    def observe(cls, name: str, value: float, **labels: str):
+        buckets = cls._definitions[name][2]
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with cls._lock:
+            series = cls._histograms[name].get(key)
+            if series is None:
+                series = cls._histograms[name][key] = [0.0] * (len(buckets) + 3)
+            # per-bucket (not cumulative) counts, the last bucket is +Inf
+            series[bisect_left(buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+            cls._dirty = True
+        cls.__ensure_writer__()
+
+    @classmethod
+    def inc(cls, name: str, value: float = 1, **labels: str):
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with cls._lock:
+            cls._counters[name][key] = cls._counters[name].get(key, 0) + value
+            cls._dirty = True
+        cls.__ensure_writer__()
+
+    @classmethod
+    def __ensure_writer__(cls):
+        if cls._writer is None or not cls._writer.is_alive():
+            cls._writer = Thread(target=cls.__write_loop__, name="metrics-writer", daemon=True)
+            cls._writer.start()
+
+    @classmethod
+    def __write_loop__(cls):
+        while True:
+            time.sleep(cls.write_interval)
+            try:
+                cls.write()
+            except Exception as e:
+                logger.warning(f"Failed to write metrics snapshot: {e}")
+
+    @classmethod
+    def __snapshot__(cls) -> Dict:
+        with cls._lock:
+            cls._dirty = False
+            return {
+                "histograms": {
+                    name: [[list(map(list, key)), list(series)] for key, series in values.items()]
+                    for name, values in cls._histograms.items()
+                },
+                "counters": {
+                    name: [[list(map(list, key)), value] for key, value in values.items()]
+                    for name, values in cls._counters.items()
+                },
+            }
+
+    @classmethod
+    def write(cls):
+        """
+        Write this worker's snapshot, if anything changed since the last one.
+        """
+        with cls._write_lock:
+            if not cls._dirty:
+                return
+            snapshot = cls.__snapshot__()
+            os.makedirs(cls.directory, exist_ok=True)
+            key = worker_key(os.getpid())
+            path = os.path.join(cls.directory, f"{key}.json")
+            fd, tmp_path = tempfile.mkstemp(dir=cls.directory, prefix=f"{key}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    @classmethod
+    def __is_stale__(cls, path: str) -> bool:
+        """
+        Snapshot of a worker that exited (or of an older format) and wasn't written for dead_worker_retention.
+        """
+        key = os.path.basename(path)[:-len(".json")]
+        pid, _, start = key.partition("-")
+        if key == worker_key(os.getpid()) or (pid.isdigit() and start != "0" and worker_key(int(pid)) == key):
+            return False
+        try:
+            return time.time() - os.path.getmtime(path) > cls.dead_worker_retention
+        except OSError:
+            return False
+
+    @classmethod
+    def __aggregate__(cls) -> Tuple[Dict[str, Dict[Labels, List[float]]], Dict[str, Dict[Labels, float]]]:
+        cls.write()
+        histograms: Dict[str, Dict[Labels, List[float]]] = {}
+        counters: Dict[str, Dict[Labels, float]] = {}
+        for path in glob.glob(os.path.join(cls.directory, "*.json")):
+            if cls.__is_stale__(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, values in snapshot.get("histograms", {}).items():
+                for key, series in values:
+                    key = tuple(map(tuple, key))
+                    total = histograms.setdefault(name, {}).setdefault(key, [0.0] * len(series))
+                    for index, value in enumerate(series):
+                        total[index] += value
+            for name, values in snapshot.get("counters", {}).items():
+                for key, value in values:
+                    key = tuple(map(tuple, key))
+                    counters.setdefault(name, {})[key] = counters.get(name, {}).get(key, 0) + value
+        return histograms, counters
+
+    @classmethod
+    def render(cls) -> str:
+        """
+        All workers' metrics in the Prometheus text exposition format.
+        """
+        histograms, counters = cls.__aggregate__()
+        lines = []
+        for name, (kind, help, buckets) in sorted(cls._definitions.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == HISTOGRAM:
+                for key, series in sorted(histograms.get(name, {}).items()):
+                    cumulative = 0.0
+                    for bound, count in zip(list(buckets) + ["+Inf"], series[:-2]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(key + (('le', str(bound)),))} {cumulative!r}")
+                    lines.append(f"{name}_sum{format_labels(key)} {series[-2]!r}")
+                    lines.append(f"{name}_count{format_labels(key)} {series[-1]!r}")
+            else:
+                for key, value in sorted(counters.get(name, {}).items()):
+                    lines.append(f"{name}{format_labels(key)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def clear(cls):
+        """
+        Drop this worker's metrics and all snapshot files.
+        """
+        with cls._lock:
+            for values in list(cls._histograms.values()) + list(cls._counters.values()):
+                values.clear()
+        for path in glob.glob(os.path.join(cls.directory, "*.json")):
+            os.remove(path)
+
+
+def worker_key(pid: int) -> str:
+    """
+    `<pid>-<start time>` of a running process, the start time in clock ticks since boot from /proc.
+    Processes that are gone (or without /proc) get `<pid>-0`.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # the command name may contain spaces, fields after it start with the state (field 3)
+            return f"{pid}-{f.read().rpartition(')')[2].split()[19]}"
+    except (OSError, IndexError):
+        return f"{pid}-0"
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{label}="{escape_label_value(value)}"' for label, value in labels) + "}"
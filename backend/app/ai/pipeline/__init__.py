@@ -0,0 +1,4 @@
+from .checkpoint import CheckpointStore, MemoryCheckpointStore, ReportCheckpointStore
+from .dag import Stage, StageTiming, PipelineRun
+from .prefilter import PrefilterConfig, ChunkPrefilter, rank_chunks
+from .chunk_store import bulk_insert_chunks, find_chunks_by_report_id
\ No newline at end of file
@@ -0,0 +1,93 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict
+import sqlalchemy as sa
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+def encode_checkpoint(key: str, output: Any) -> str:
+    """
+    JSON of a stage output. Raises TypeError unless the output reads back as an equal value, so a resumed
+    run gets exactly what a fresh run computed (no tuples, non-string keys, NaN or custom objects).
+    """
+    try:
+        encoded = json.dumps(output, allow_nan=False)
+    except (TypeError, ValueError) as e:
+        raise TypeError(f"Output of pipeline checkpoint {key} is not JSON serializable: {e}") from e
+    if json.loads(encoded) != output:
+        raise TypeError(f"Output of pipeline checkpoint {key} doesn't read back as the same value from JSON")
+    return encoded
+
+
+class CheckpointStore(ABC):
+    """
+    Storage of finished pipeline stage outputs.
+    """
+
+    @abstractmethod
+    async def load(self) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def save(self, stage: str, output: Any):
+        ...
+
+
+class MemoryCheckpointStore(CheckpointStore):
+
+    def __init__(self):
+        self.outputs: Dict[str, Any] = {}
+
+    async def load(self) -> Dict[str, Any]:
+        return dict(self.outputs)
+
+    async def save(self, stage: str, output: Any):
+        self.outputs[stage] = json.loads(encode_checkpoint(stage, output))
+
+
+class ReportCheckpointStore(CheckpointStore):
+    """
+    Checkpoints of a report generation run, stored as JSON in `reports.pipeline_state`.
+
+    Each save adds one key to the stored object in the database instead of rewriting all outputs.
+    """
+
+    def __init__(self, db_session: AsyncSession, report_id: str):
+        self.db_session = db_session
+        self.report_id = report_id
+        self._lock = asyncio.Lock()
+
+    async def load(self) -> Dict[str, Any]:
+        async with self._lock:
+            result = await self.db_session.execute(
+                sa.text("SELECT pipeline_state FROM reports WHERE uuid = :report_id"),
+                {"report_id": self.report_id}
+            )
+            state = result.scalar_one_or_none()
+            if isinstance(state, str):
+                state = json.loads(state)
+            return state or {}
+
+    async def save(self, stage: str, output: Any):
+        encoded = encode_checkpoint(stage, output)
+        async with self._lock:
+            await self.db_session.execute(
+                sa.text(
+                    "UPDATE reports SET pipeline_state = CAST("
+                    "COALESCE(CAST(pipeline_state AS JSONB), '{}'::jsonb) || jsonb_build_object(CAST(:stage AS TEXT), CAST(:output AS JSONB)) "
+                    "AS JSON) WHERE uuid = :report_id"
+                ),
+                {"stage": stage, "output": encoded, "report_id": self.report_id}
+            )
+            await self.db_session.commit()
+
+    async def clear(self):
+        """
+        Drop checkpoints once the report is stored.
+        """
+        async with self._lock:
+            await self.db_session.execute(
+                sa.text("UPDATE reports SET pipeline_state = NULL WHERE uuid = :report_id"),
+                {"report_id": self.report_id}
+            )
+            await self.db_session.commit()
@@ -0,0 +1,78 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+import sqlalchemy as sa
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database.agent import ChunkModel
+
+CHUNK_COLUMNS = [
+    "created_at",
+    "updated_at",
+    "uuid",
+    "type",
+    "query",
+    "llm_similarity_score",
+    "vector_similarity_score",
+    "source",
+    "content",
+    "captions_text",
+    "captions_highlights",
+    "report_id",
+    "session_id",
+]
+
+chunks_table = sa.table("chunks", *[sa.column(name) for name in CHUNK_COLUMNS])
+
+def _chunk_row(chunk: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    row = {name: chunk.get(name) for name in CHUNK_COLUMNS}
+    row["uuid"] = row["uuid"] or uuid.uuid4()
+    row["created_at"] = row["created_at"] or now
+    row["updated_at"] = row["updated_at"] or now
+    return row
+
+
+async def bulk_insert_chunks(db_session: AsyncSession, chunks: Sequence[Dict[str, Any]]) -> List[uuid.UUID]:
+    """
+    Insert many chunk rows in one round trip instead of one ORM add per chunk.
+
+    Uses asyncpg COPY (`copy_records_to_table`) on postgres and a single executemany insert on other
+    drivers. The session is committed.
+
+    Parameters:
+
+        db_session (AsyncSession): agent database session.
+
+        chunks (Sequence[Dict[str, Any]]): chunk fields by column name, uuid and timestamps are generated if missing.
+
+    Returns:
+
+        List[uuid.UUID]: uuids of the inserted chunks, in input order.
+    """
+    if not chunks:
+        return []
+
+    now = datetime.utcnow()
+    rows = [_chunk_row(chunk, now) for chunk in chunks]
+
+    connection = await db_session.connection()
+    if connection.dialect.driver == "asyncpg":
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            "chunks",
+            records=[tuple(row[name] for name in CHUNK_COLUMNS) for row in rows],
+            columns=CHUNK_COLUMNS
+        )
+    else:
+        await connection.execute(sa.insert(chunks_table), rows)
+
+    await db_session.commit()
+    return [row["uuid"] for row in rows]
+
+
+async def find_chunks_by_report_id(db_session: AsyncSession, report_id: uuid.UUID) -> List[ChunkModel]:
+    """
+    Load all chunks of a report, uses `ix_chunks_report_id`.
+    """
+    result = await db_session.exec(select(ChunkModel).where(ChunkModel.report_id == report_id))
+    return list(result.all())
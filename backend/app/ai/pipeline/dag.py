@@ -0,0 +1,222 @@
+import asyncio
+import time
+import weakref
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, ClassVar, Dict, List, Optional, Sequence
+from app.utils.logging import AppLogger
+from ..limits import BACKGROUND, llm_request_context
+from .checkpoint import CheckpointStore
+
+logger = AppLogger().get_logger()
+
+# set while an llm=True stage holds its slot, its map() calls would wait for slots it may be holding up
+_holds_llm_slot: ContextVar[bool] = ContextVar("holds_llm_slot", default=False)
+
+@dataclass
+class Stage:
+    """
+    Pipeline stage.
+
+    Parameters:
+
+        name (str): unique stage name, also the checkpoint key.
+
+        fn (Callable[[Dict[str, Any]], Awaitable[Any]]): gets the outputs of `deps` by name and returns the
+            stage output, which must read back unchanged from JSON (no tuples or non-string keys) to be checkpointed.
+
+        deps (Sequence[str]): stages that must finish first.
+
+        llm (bool): the stage is one LLM call and holds an LLM concurrency slot while it runs. Stages that
+            call `PipelineRun.map` must keep llm=False, the items take their own slots.
+    """
+    name: str
+    fn: Callable[[Dict[str, Any]], Awaitable[Any]]
+    deps: Sequence[str] = ()
+    llm: bool = False
+
+
+@dataclass
+class StageTiming:
+    name: str
+    start: float
+    end: float
+    deps: Sequence[str] = ()
+    restored: bool = False
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class PipelineRun:
+    """
+    Run stages as a DAG: every stage starts as soon as its dependencies are done.
+
+    LLM work across all runs of a worker is bounded by one shared semaphore, stage outputs are saved to
+    `checkpoint` and a resumed run restores finished stages instead of running them again.
+    LLM calls of the run are admitted as `tenant` with background priority.
+    """
+    stages: List[Stage]
+    checkpoint: Optional[CheckpointStore] = None
+    tenant: str = "default"
+    priority: int = BACKGROUND
+    timings: Dict[str, StageTiming] = field(default_factory=dict)
+
+    llm_concurrency: ClassVar[int] = 8
+    _llm_semaphores: ClassVar["weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"] = weakref.WeakKeyDictionary()
+
+    def __post_init__(self):
+        self._stages = {stage.name: stage for stage in self.stages}
+        if len(self._stages) != len(self.stages):
+            raise ValueError("Duplicate stage names in pipeline")
+        self.__check_acyclic__()
+        self._t0 = time.perf_counter()
+        self._outputs: Dict[str, asyncio.Future] = {}
+        self._saved: Dict[str, Any] = {}
+
+    def __check_acyclic__(self):
+        visiting, done = set(), set()
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a cycle through stage: {name}")
+            if name not in self._stages:
+                raise ValueError(f"Unknown pipeline stage: {name}")
+            visiting.add(name)
+            for dep in self._stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self._stages:
+            visit(name)
+
+    @classmethod
+    def llm_semaphore(cls) -> asyncio.Semaphore:
+        """
+        LLM concurrency semaphore shared by all pipeline runs on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in cls._llm_semaphores:
+            # a semaphore that had waiters references its loop and keeps the weak key alive, drop closed loops here
+            for closed in [other for other in cls._llm_semaphores.keys() if other.is_closed()]:
+                cls._llm_semaphores.pop(closed, None)
+            cls._llm_semaphores[loop] = asyncio.Semaphore(cls.llm_concurrency)
+        return cls._llm_semaphores[loop]
+
+    def __now__(self) -> float:
+        return time.perf_counter() - self._t0
+
+    async def __run_stage__(self, stage: Stage):
+        inputs = {dep: await self._outputs[dep] for dep in stage.deps}
+
+        if stage.name in self._saved:
+            now = self.__now__()
+            self.timings[stage.name] = StageTiming(stage.name, now, now, stage.deps, restored=True)
+            return self._saved[stage.name]
+
+        if stage.llm:
+            async with self.llm_semaphore():
+                start = self.__now__()
+                token = _holds_llm_slot.set(True)
+                try:
+                    output = await stage.fn(inputs)
+                finally:
+                    _holds_llm_slot.reset(token)
+        else:
+            start = self.__now__()
+            output = await stage.fn(inputs)
+        self.timings[stage.name] = StageTiming(stage.name, start, self.__now__(), stage.deps)
+
+        if self.checkpoint is not None:
+            await self.checkpoint.save(stage.name, output)
+        return output
+
+    async def map(self, name: str, fn: Callable[[Any], Awaitable[Any]], items: Sequence[Any]) -> List[Any]:
+        """
+        Run `fn` for every item concurrently, each call holding an LLM slot. For per-section work inside a stage.
+
+        Each item is timed and checkpointed as "{name}[{index}]". Not allowed in llm=True stages: with all
+        slots held by such stages, their items would wait forever.
+        """
+        if _holds_llm_slot.get():
+            raise RuntimeError(f"Pipeline map {name} called from an llm=True stage, use llm=False for stages that call map")
+
+        async def run_item(index: int, item: Any):
+            key = f"{name}[{index}]"
+            if key in self._saved:
+                now = self.__now__()
+                self.timings[key] = StageTiming(key, now, now, restored=True)
+                return self._saved[key]
+            async with self.llm_semaphore():
+                start = self.__now__()
+                output = await fn(item)
+            self.timings[key] = StageTiming(key, start, self.__now__())
+            if self.checkpoint is not None:
+                await self.checkpoint.save(key, output)
+            return output
+
+        return list(await asyncio.gather(*[run_item(index, item) for index, item in enumerate(items)]))
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run all stages, returns stage outputs by name.
+        """
+        with llm_request_context(tenant=self.tenant, priority=self.priority):
+            return await self.__run__()
+
+    async def __run__(self) -> Dict[str, Any]:
+        if self.checkpoint is not None:
+            self._saved = await self.checkpoint.load()
+            if self._saved:
+                logger.info(f"Resuming pipeline with {len(self._saved)} checkpointed stages")
+
+        loop = asyncio.get_running_loop()
+        for name in self._stages:
+            self._outputs[name] = loop.create_future()
+
+        async def run_and_resolve(stage: Stage):
+            try:
+                self._outputs[stage.name].set_result(await self.__run_stage__(stage))
+            except BaseException as e:
+                self._outputs[stage.name].set_exception(e)
+                raise
+
+        tasks = [asyncio.create_task(run_and_resolve(stage)) for stage in self.stages]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for future in self._outputs.values():
+                if future.done() and not future.cancelled():
+                    future.exception()
+        return {name: future.result() for name, future in self._outputs.items()}
+
+    def critical_path(self) -> List[StageTiming]:
+        """
+        Chain of stages that determined the total run time.
+        """
+        stage_timings = [timing for name, timing in self.timings.items() if name in self._stages]
+        if not stage_timings:
+            return []
+        path = [max(stage_timings, key=lambda timing: timing.end)]
+        while path[-1].deps:
+            path.append(max((self.timings[dep] for dep in path[-1].deps), key=lambda timing: timing.end))
+        return list(reversed(path))
+
+    def timing_report(self) -> str:
+        """
+        Per-stage timings with the critical path marked.
+        """
+        critical = {timing.name for timing in self.critical_path()}
+        lines = [f"{'stage':<40} {'start':>8} {'end':>8} {'duration':>9}"]
+        for timing in sorted(self.timings.values(), key=lambda timing: timing.start):
+            marker = "*" if timing.name in critical else " "
+            restored = " (checkpoint)" if timing.restored else ""
+            lines.append(f"{marker}{timing.name:<39} {timing.start:>8.2f} {timing.end:>8.2f} {timing.duration:>9.2f}{restored}")
+        return "\n".join(lines)
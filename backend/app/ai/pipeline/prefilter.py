@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+@dataclass
+class PrefilterConfig:
+    """
+    Parameters:
+
+        top_k (int): max number of chunks sent to LLM relevance checks.
+
+        min_similarity (float): chunks below this cosine similarity to every query are dropped.
+
+        dedup_threshold (float): chunks at least this similar to a higher ranked chunk are dropped as near-duplicates.
+
+        rank_constant (int): k of the reciprocal rank fusion of embedding and retriever scores.
+    """
+    top_k: int = 20
+    min_similarity: float = 0.2
+    dedup_threshold: float = 0.95
+    rank_constant: int = 60
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _reciprocal_ranks(scores: np.ndarray, rank_constant: int) -> np.ndarray:
+    """
+    1 / (k + rank) of each score among the known (non-NaN) scores, best rank 1, NaN where unknown.
+    """
+    known = ~np.isnan(scores)
+    ranks = np.full(len(scores), np.nan, dtype=np.float32)
+    order = np.argsort(-scores[known], kind="stable")
+    ranks[np.flatnonzero(known)[order]] = np.arange(1, len(order) + 1)
+    return 1.0 / (rank_constant + ranks)
+
+
+def rank_chunks(
+    chunk_vectors: np.ndarray,
+    query_vectors: np.ndarray,
+    cfg: PrefilterConfig,
+    vector_scores: Optional[np.ndarray] = None
+) -> List[int]:
+    """
+    Pre-rank chunks against the queries and return the indices of the chunks worth an LLM relevance check,
+    best first.
+
+    A chunk's similarity is its max cosine similarity to any query, from one matrix product. If the retriever
+    already scored chunks (`vector_similarity_score`, whose scale depends on the search mode and can
+    exceed 1), chunks are ordered by reciprocal rank fusion of both rankings instead of by the raw
+    numbers. A chunk without a retriever score counts its embedding rank twice. `min_similarity` always
+    applies to the cosine similarity.
+
+    Parameters:
+
+        chunk_vectors (np.ndarray): (n_chunks, dim) chunk embeddings.
+
+        query_vectors (np.ndarray): (n_queries, dim) query embeddings.
+
+        cfg (PrefilterConfig): top k and thresholds.
+
+        vector_scores (Optional[np.ndarray]): (n_chunks,) retriever similarity scores, NaN where unknown.
+    """
+    if len(chunk_vectors) == 0:
+        return []
+
+    chunks = _normalize(np.asarray(chunk_vectors, dtype=np.float32))
+    queries = _normalize(np.asarray(query_vectors, dtype=np.float32))
+    similarities = (chunks @ queries.T).max(axis=1)
+    scores = similarities
+    if vector_scores is not None:
+        vector_scores = np.asarray(vector_scores, dtype=np.float32)
+        if not np.isnan(vector_scores).all():
+            embedding_ranks = _reciprocal_ranks(similarities, cfg.rank_constant)
+            retriever_ranks = _reciprocal_ranks(vector_scores, cfg.rank_constant)
+            scores = embedding_ranks + np.where(np.isnan(retriever_ranks), embedding_ranks, retriever_ranks)
+
+    order = np.argsort(-scores, kind="stable")
+    order = order[similarities[order] >= cfg.min_similarity]
+
+    selected: List[int] = []
+    for index in order:
+        if len(selected) >= cfg.top_k:
+            break
+        if selected and float((chunks[selected] @ chunks[index]).max()) >= cfg.dedup_threshold:
+            continue
+        selected.append(int(index))
+    return selected
+
+
+class ChunkPrefilter:
+    """
+    Embedding based pre-ranking of retrieved chunks before `ReportPrompts.check_chunk_relevance`.
+    """
+
+    def __init__(self, embeddings: Embeddings, cfg: Optional[PrefilterConfig] = None):
+        self.embeddings = embeddings
+        self.cfg = cfg or PrefilterConfig()
+
+    async def select(
+        self,
+        chunks: Sequence[str],
+        queries: Sequence[str],
+        vector_scores: Optional[Sequence[Optional[float]]] = None
+    ) -> List[int]:
+        """
+        Indices of the chunks to send to LLM relevance checks, best first.
+        """
+        if not chunks:
+            return []
+        chunk_vectors = np.asarray(await self.embeddings.aembed_documents(list(chunks)), dtype=np.float32)
+        query_vectors = np.asarray(await self.embeddings.aembed_documents(list(queries)), dtype=np.float32)
+        scores = None
+        if vector_scores is not None:
+            scores = np.asarray([np.nan if score is None else score for score in vector_scores], dtype=np.float32)
+        return rank_chunks(chunk_vectors, query_vectors, self.cfg, scores)
@@ -1,3 +1,4 @@
 from .report_prompts import ReportPrompts
 from .chat_prompts import QAPrompts
-from .highchart_prompts import HighChartPrompts
\ No newline at end of file
+from .highchart_prompts import HighChartPrompts
+from .registry import PromptRegistry
\ No newline at end of file
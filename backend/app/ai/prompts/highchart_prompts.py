@@ -1,7 +1,7 @@
 from typing import Optional
 from datetime import datetime
-from app.utils.langfuse_client import LangFuseClient
 from app.utils.logging import AppLogger
+from .registry import PromptRegistry
 
 logger = AppLogger().get_logger()
 
@@ -9,4 +9,4 @@ class HighChartPrompts:
     
     @classmethod
     def highchart_generation_prompt(self, **kwargs):
-        return LangFuseClient().get_prompt_str(name="generate-chart").format(**kwargs)
\ No newline at end of file
+        return PromptRegistry.get_prompt_str(name="generate-chart").format(**kwargs)
\ No newline at end of file
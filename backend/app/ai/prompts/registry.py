@@ -0,0 +1,242 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional, Set
+from app.utils.langfuse_client import LangFuseClient
+from app.utils.logging import AppLogger
+from ..enums import ModelTierEnum
+from ..metrics import MetricsStore, PROMPT_FETCH
+
+logger = AppLogger().get_logger()
+
+@dataclass
+class CachedPrompt:
+    text: str
+    fetched_at: float
+
+
+class PromptRegistry:
+    """
+    In-process cache of langfuse prompt templates.
+
+    Prompts are served from memory. Once a prompt is older than `ttl` the cached copy is still
+    returned while a background thread fetches a fresh one, and if langfuse is unreachable the last
+    good copy keeps being served, retried every `retry_after` seconds.
+
+    Only a prompt that was never loaded costs a round trip. A prompt is fetched once at a time: a miss
+    while the warmup, a refresh or another miss is fetching it waits for that fetch. Async callers use
+    `aget_prompt_str`, which waits for a miss in a thread instead of blocking the event loop.
+    """
+
+    ttl: float = 300
+    retry_after: float = 30
+
+    prompt_names: List[str] = [
+        "chat-agent-prompt",
+        "qa-agent-prompt",
+        "report-agent-prompt",
+        "chat-with-report",
+        "generate-report",
+        "generate-section-content",
+        "order-chunks",
+        "section-order-chunks",
+        "check-chunk-relevance",
+        "get-web-search-queries",
+        "get-web-search-queries-for-section",
+        "get-rag-queries",
+        "get-section-rag-queries",
+        "get-template-queries",
+        "review-sections",
+        "generate-chart",
+        "conversation-summary",
+    ]
+
+    # model tier of each prompt, see ModelRouter. Short structured outputs (queries, rankings, relevance
+    # checks, summaries) run on the fast model, prompts that are not listed on the smart model.
+    prompt_tiers: Dict[str, ModelTierEnum] = {
+        "order-chunks": ModelTierEnum.FAST,
+        "section-order-chunks": ModelTierEnum.FAST,
+        "check-chunk-relevance": ModelTierEnum.FAST,
+        "get-web-search-queries": ModelTierEnum.FAST,
+        "get-web-search-queries-for-section": ModelTierEnum.FAST,
+        "get-rag-queries": ModelTierEnum.FAST,
+        "get-section-rag-queries": ModelTierEnum.FAST,
+        "get-template-queries": ModelTierEnum.FAST,
+        "conversation-summary": ModelTierEnum.FAST,
+    }
+
+    hits: int = 0
+    misses: int = 0
+    stale_hits: int = 0
+    refreshes: int = 0
+    refresh_errors: int = 0
+
+    _prompts: Dict[str, CachedPrompt] = {}
+    _refreshing: Set[str] = set()
+    _inflight: Dict[str, Event] = {}
+    _warmed_up: bool = False
+    _lock = Lock()
+
+    @classmethod
+    def get_prompt_str(cls, name: str) -> str:
+        """
+        Get prompt template by name.
+        """
+        start = time.perf_counter()
+        text = cls.__get_cached__(name, start)
+        if text is not None:
+            return text
+        return cls.__load_missing__(name, start)
+
+    @classmethod
+    async def aget_prompt_str(cls, name: str) -> str:
+        """
+        Get prompt template by name, a miss is loaded in a thread.
+        """
+        start = time.perf_counter()
+        text = cls.__get_cached__(name, start)
+        if text is not None:
+            return text
+        return await asyncio.to_thread(cls.__load_missing__, name, start)
+
+    @classmethod
+    def __get_cached__(cls, name: str, start: float) -> Optional[str]:
+        cls.__start_warmup__()
+        with cls._lock:
+            cached = cls._prompts.get(name)
+            if cached is None:
+                cls.misses += 1
+                return None
+            cls.hits += 1
+            if time.monotonic() - cached.fetched_at > cls.ttl:
+                cls.stale_hits += 1
+                cls.__start_refresh__(name)
+        MetricsStore.observe(PROMPT_FETCH, time.perf_counter() - start, prompt=name, cache="hit")
+        return cached.text
+
+    @classmethod
+    def __load_missing__(cls, name: str, start: float) -> str:
+        text = cls.__fetch_once__(name, raise_error=True)
+        MetricsStore.observe(PROMPT_FETCH, time.perf_counter() - start, prompt=name, cache="miss")
+        return text
+
+    @classmethod
+    def get_prompt_tier(cls, name: str) -> ModelTierEnum:
+        """
+        Model tier a prompt is declared for, smart by default.
+        """
+        return cls.prompt_tiers.get(name, ModelTierEnum.SMART)
+
+    @classmethod
+    def warmup(cls, names: Optional[List[str]] = None):
+        """
+        Load prompts into memory, `prompt_names` by default.
+        """
+        for name in names or cls.prompt_names:
+            with cls._lock:
+                if name in cls._prompts:
+                    continue
+            cls.__fetch_once__(name, raise_error=False)
+
+    @classmethod
+    def invalidate(cls, name: Optional[str] = None):
+        """
+        Drop one or all cached prompts. The next access fetches them again.
+        """
+        with cls._lock:
+            if name is None:
+                cls._prompts.clear()
+            else:
+                cls._prompts.pop(name, None)
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """
+        Cache counters.
+        """
+        with cls._lock:
+            return {
+                "size": len(cls._prompts),
+                "hits": cls.hits,
+                "misses": cls.misses,
+                "stale_hits": cls.stale_hits,
+                "refreshes": cls.refreshes,
+                "refresh_errors": cls.refresh_errors,
+            }
+
+    @classmethod
+    def __fetch__(cls, name: str, raise_error: bool) -> Optional[str]:
+        try:
+            text = LangFuseClient().get_prompt_str(name=name)
+        except Exception as e:
+            with cls._lock:
+                cls.refresh_errors += 1
+                cached = cls._prompts.get(name)
+                if cached is not None:
+                    # keep serving the last good copy, retry after `retry_after`
+                    cached.fetched_at = time.monotonic() - cls.ttl + cls.retry_after
+                    logger.warning(f"Failed to refresh prompt {name}, serving cached copy: {e}")
+                    return cached.text
+            if raise_error:
+                raise
+            logger.warning(f"Failed to load prompt {name}: {e}")
+            return None
+
+        with cls._lock:
+            cached = cls._prompts.get(name)
+            if cached is not None and cached.text != text:
+                logger.info(f"Prompt {name} changed in langfuse, updating cache")
+            cls._prompts[name] = CachedPrompt(text=text, fetched_at=time.monotonic())
+            cls.refreshes += 1
+        return text
+
+    @classmethod
+    def __fetch_once__(cls, name: str, raise_error: bool) -> Optional[str]:
+        """
+        Fetch a prompt, or wait for the fetch of it that is already in flight.
+        """
+        with cls._lock:
+            done = cls._inflight.get(name)
+            leader = done is None
+            if leader:
+                done = cls._inflight[name] = Event()
+        if not leader:
+            done.wait()
+            with cls._lock:
+                cached = cls._prompts.get(name)
+            if cached is not None:
+                return cached.text
+            if raise_error:
+                raise RuntimeError(f"Failed to load prompt {name}")
+            return None
+        try:
+            return cls.__fetch__(name, raise_error=raise_error)
+        finally:
+            with cls._lock:
+                del cls._inflight[name]
+            done.set()
+
+    @classmethod
+    def __refresh__(cls, name: str):
+        try:
+            cls.__fetch_once__(name, raise_error=False)
+        finally:
+            with cls._lock:
+                cls._refreshing.discard(name)
+
+    @classmethod
+    def __start_refresh__(cls, name: str):
+        # caller holds cls._lock
+        if name in cls._refreshing:
+            return
+        cls._refreshing.add(name)
+        Thread(target=cls.__refresh__, args=(name,), name=f"prompt-refresh-{name}", daemon=True).start()
+
+    @classmethod
+    def __start_warmup__(cls):
+        with cls._lock:
+            if cls._warmed_up:
+                return
+            cls._warmed_up = True
+        Thread(target=cls.warmup, name="prompt-warmup", daemon=True).start()
@@ -12,17 +12,26 @@ class AgentStreamingEvent(BaseModel):
         
         name (Optional[str]): agent name or tool name.
         
-        content (Optional[str]): llm response message chunk. type is "message"
+        content (Optional[str]): llm response message chunk. type is "message", or why the run failed. type is "error"
         
         input (Optional[Any]): input of tool or agent
         
         output (Optional[Any]): output of tool or agent
+        
+        started_at (Optional[float]): seconds from agent start to tool start. type is "tool_end"
+        
+        duration (Optional[float]): tool wall time in seconds. type is "tool_end"
+        
+        message_id (Optional[str]): uuid of the persisted assistant message, to resume the stream with.
     """
     type: AgentStreamingEventTypeEnum
     name: Optional[str] = None
     content: Optional[str] = None
     input: Optional[Any] = None
     output: Optional[Any] = None
+    started_at: Optional[float] = None
+    duration: Optional[float] = None
+    message_id: Optional[str] = None
 
 class QAAgentStreamingEvent(AgentStreamingEvent):
     web_chunks: Optional[List] = []
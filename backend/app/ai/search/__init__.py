@@ -0,0 +1 @@
+from .pool import SearchClientPool
\ No newline at end of file
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Tuple
+from app.utils.logging import AppLogger
+from app.utils.vector_retriever import AzureAISearchVectorRetriever
+from ..metrics import MetricsStore, SEARCH_SLOT_WAIT, SEARCH_CLIENTS
+
+logger = AppLogger().get_logger()
+
+class SearchClientEntry:
+    """
+    Pooled retriever of one (service, index).
+    """
+
+    def __init__(self, retriever: AzureAISearchVectorRetriever):
+        self.retriever = retriever
+        self.last_used = time.monotonic()
+        self.active = 0
+
+
+class SearchClientPool:
+    """
+    Worker-wide pool of Azure AI Search vector retrievers, one per (service, index).
+
+    Agents and the report pipeline of all tenants on the same index share one long-lived retriever, and
+    with it its credential and keep-alive HTTP session, instead of creating one per request.
+
+    - search calls borrow the retriever with `acquire()`, which waits for one of the tenant's
+      `max_concurrency_per_tenant` slots, so one tenant can't take all connections of the worker.
+    - retrievers without calls for `idle_timeout` seconds leave the pool. Cached agent graphs keep
+      theirs until the graph is evicted.
+    - `stats()` and the agent_search_* metrics report pool size, slot wait time and how often a
+      borrow reused a pooled retriever.
+    """
+
+    idle_timeout: float = 1800
+    max_concurrency_per_tenant: int = 8
+
+    _entries: Dict[Tuple[str, str], SearchClientEntry] = {}
+    _tenant_semaphores: Dict[str, asyncio.Semaphore] = {}
+    acquires: int = 0
+    reuses: int = 0
+    created: int = 0
+    evicted: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+
+    @classmethod
+    def __get_entry__(cls, service_name: str, index_name: str) -> SearchClientEntry:
+        cls.__evict_idle__()
+        key = (service_name, index_name)
+        entry = cls._entries.get(key)
+        if entry is None:
+            logger.info(f"Creating search retriever for service: {service_name}, index: {index_name}")
+            cls.created += 1
+            MetricsStore.inc(SEARCH_CLIENTS, event="created")
+            entry = cls._entries[key] = SearchClientEntry(
+                retriever=AzureAISearchVectorRetriever(service_name=service_name, index_name=index_name)
+            )
+        entry.last_used = time.monotonic()
+        return entry
+
+    @classmethod
+    def __evict_idle__(cls):
+        now = time.monotonic()
+        for key, entry in list(cls._entries.items()):
+            if entry.active == 0 and now - entry.last_used > cls.idle_timeout:
+                logger.info(f"Dropping idle search retriever for service: {key[0]}, index: {key[1]}")
+                del cls._entries[key]
+                cls.evicted += 1
+                MetricsStore.inc(SEARCH_CLIENTS, event="evicted")
+
+    @classmethod
+    def get_retriever(cls, service_name: str, index_name: str) -> AzureAISearchVectorRetriever:
+        """
+        Shared vector retriever of an index, for the agent / pipeline search tools.
+
+        Parameters:
+
+            service_name (str): azure ai search service name.
+
+            index_name (str): index name.
+        """
+        return cls.__get_entry__(service_name, index_name).retriever
+
+    @classmethod
+    def __tenant_semaphore__(cls, tenant_id: str) -> asyncio.Semaphore:
+        if tenant_id not in cls._tenant_semaphores:
+            cls._tenant_semaphores[tenant_id] = asyncio.Semaphore(cls.max_concurrency_per_tenant)
+        return cls._tenant_semaphores[tenant_id]
+
+    @classmethod
+    @asynccontextmanager
+    async def acquire(cls, service_name: str, index_name: str, tenant_id: str) -> AsyncIterator[AzureAISearchVectorRetriever]:
+        """
+        Borrow the retriever of an index for one search call, waiting for a free slot of the tenant.
+
+            async with SearchClientPool.acquire(service_name, index_name, tenant_id) as retriever:
+                ...
+
+        Parameters:
+
+            service_name (str): azure ai search service name.
+
+            index_name (str): index name.
+
+            tenant_id (str): tenant uuid, concurrency is bounded per tenant.
+        """
+        start = time.perf_counter()
+        async with cls.__tenant_semaphore__(tenant_id):
+            waited = time.perf_counter() - start
+            cls.wait_time += waited
+            cls.max_wait_time = max(cls.max_wait_time, waited)
+            MetricsStore.observe(SEARCH_SLOT_WAIT, waited)
+
+            cls.acquires += 1
+            cls.__evict_idle__()
+            reused = (service_name, index_name) in cls._entries
+            if reused:
+                cls.reuses += 1
+                MetricsStore.inc(SEARCH_CLIENTS, event="reused")
+            entry = cls.__get_entry__(service_name, index_name)
+            entry.active += 1
+            try:
+                yield entry.retriever
+            finally:
+                entry.active -= 1
+                entry.last_used = time.monotonic()
+
+    @classmethod
+    def stats(cls) -> Dict[str, float]:
+        return {
+            "retrievers": len(cls._entries),
+            "active": sum(entry.active for entry in cls._entries.values()),
+            "tenants": len(cls._tenant_semaphores),
+            "acquires": cls.acquires,
+            "created": cls.created,
+            "evicted": cls.evicted,
+            "reuse_rate": cls.reuses / cls.acquires if cls.acquires else 0.0,
+            "avg_wait_time": cls.wait_time / cls.acquires if cls.acquires else 0.0,
+            "max_wait_time": cls.max_wait_time,
+        }
+
@@ -0,0 +1,7 @@
+from .events import StreamingEvent, StreamingEventEncoder, coalesce_messages, SSE, NDJSON
+from .buffer import ResponseBuffer
+from .persistence import StreamingMessageWriter, follow_persisted
+from .live import LiveStream, LiveStreams
+from .singleflight import SingleFlight, FlightChannel, flight_lock_id
+from .transport import STREAMING_HEADERS, with_heartbeats, stream_to_websocket
+from .structured import IncrementalJSONParser, IncrementalMarkdownParser, ParsedItem, parse_stream
\ No newline at end of file
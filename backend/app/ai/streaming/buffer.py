@@ -0,0 +1,30 @@
+from typing import List, Optional
+
+class ResponseBuffer:
+    """
+    Collects streamed message chunks, the full text is only joined when it is read.
+    """
+    __slots__ = ("_chunks", "_length", "_text")
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._length = 0
+        self._text: Optional[str] = None
+
+    def append(self, content: str):
+        self._chunks.append(content)
+        self._length += len(content)
+        self._text = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._chunks)
+            self._chunks = [self._text] if self._text else []
+        return self._text
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        return self.text
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+from ..enums import AgentStreamingEventTypeEnum
+from ..schemas import AgentStreamingEvent
+
+SSE = "sse"
+NDJSON = "ndjson"
+
+class StreamingEvent:
+    """
+    Lightweight agent streaming event for the token hot path.
+
+    Same fields as AgentStreamingEvent without pydantic validation, use `to_model()` where the
+    pydantic schema is needed.
+    """
+    __slots__ = ("type", "name", "content", "input", "output", "started_at", "duration", "message_id")
+
+    def __init__(
+        self,
+        type: AgentStreamingEventTypeEnum,
+        name: Optional[str] = None,
+        content: Optional[str] = None,
+        input: Optional[Any] = None,
+        output: Optional[Any] = None,
+        started_at: Optional[float] = None,
+        duration: Optional[float] = None,
+        message_id: Optional[str] = None
+    ):
+        self.type = type
+        self.name = name
+        self.content = content
+        self.input = input
+        self.output = output
+        self.started_at = started_at
+        self.duration = duration
+        self.message_id = message_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.type.value,
+            "name": self.name,
+            "content": self.content,
+            "input": self.input,
+            "output": self.output,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "message_id": self.message_id,
+        }
+
+    def to_model(self) -> AgentStreamingEvent:
+        return AgentStreamingEvent.model_construct(
+            type=self.type,
+            name=self.name,
+            content=self.content,
+            input=self.input,
+            output=self.output,
+            started_at=self.started_at,
+            duration=self.duration,
+            message_id=self.message_id
+        )
+
+
+class StreamingEventEncoder:
+    """
+    Encode streaming events to SSE or NDJSON bytes.
+
+    Message events, the bulk of a stream, are written from pre-encoded byte fragments so only the
+    content string goes through json. Other events are encoded with all AgentStreamingEvent fields.
+    """
+
+    def __init__(self, format: str = SSE):
+        """
+        Parameters:
+
+            format (str): "sse" or "ndjson".
+        """
+        if format not in (SSE, NDJSON):
+            raise ValueError(f"Unknown streaming format: {format}")
+        self.format = format
+        if format == SSE:
+            self._prefix, self._suffix = b"data: ", b"\n\n"
+        else:
+            self._prefix, self._suffix = b"", b"\n"
+        self._message_prefix = self._prefix + b'{"type": "' + AgentStreamingEventTypeEnum.MESSAGE.value.encode() + b'", "content": '
+        self._message_suffix = b"}" + self._suffix
+
+    def encode(self, event: StreamingEvent) -> bytes:
+        if event.type is AgentStreamingEventTypeEnum.MESSAGE:
+            return self._message_prefix + json.dumps(event.content).encode() + self._message_suffix
+        return self._prefix + json.dumps(event.to_dict(), default=str).encode() + self._suffix
+
+    @property
+    def heartbeat(self) -> bytes:
+        """
+        Keep-alive frame: an SSE comment, or a heartbeat line for NDJSON.
+        """
+        return b": heartbeat\n\n" if self.format == SSE else b'{"type": "heartbeat"}\n'
+
+    @property
+    def media_type(self) -> str:
+        return "text/event-stream" if self.format == SSE else "application/x-ndjson"
+
+
+async def coalesce_messages(
+    events: AsyncIterator[StreamingEvent],
+    flush_interval: float = 0.05,
+    flush_bytes: int = 512
+) -> AsyncIterator[StreamingEvent]:
+    """
+    Merge consecutive message events into one event per flush window.
+
+    Buffered content is flushed once it is `flush_interval` seconds old or holds `flush_bytes` bytes of UTF-8,
+    and before any other event so ordering is kept.
+
+    Parameters:
+
+        events (AsyncIterator[StreamingEvent]): agent streaming events.
+
+        flush_interval (float): max seconds a token is held back.
+
+        flush_bytes (int): max buffered bytes, measured UTF-8 encoded as sent on the wire.
+    """
+    iterator = events.__aiter__()
+    buffer = []
+    buffered = 0
+    buffered_at = 0.0
+    next_event = None
+
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None
+            if buffer:
+                timeout = max(buffered_at + flush_interval - time.monotonic(), 0)
+            done, _ = await asyncio.wait({next_event}, timeout=timeout)
+
+            if not done:
+                yield StreamingEvent(type=AgentStreamingEventTypeEnum.MESSAGE, content="".join(buffer))
+                buffer, buffered = [], 0
+                continue
+
+            task, next_event = next_event, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                break
+
+            if event.type is AgentStreamingEventTypeEnum.MESSAGE:
+                if not buffer:
+                    buffered_at = time.monotonic()
+                buffer.append(event.content)
+                buffered += len(event.content.encode("utf-8"))
+                if buffered >= flush_bytes:
+                    yield StreamingEvent(type=AgentStreamingEventTypeEnum.MESSAGE, content="".join(buffer))
+                    buffer, buffered = [], 0
+                continue
+
+            if buffer:
+                yield StreamingEvent(type=AgentStreamingEventTypeEnum.MESSAGE, content="".join(buffer))
+                buffer, buffered = [], 0
+            yield event
+
+        if buffer:
+            yield StreamingEvent(type=AgentStreamingEventTypeEnum.MESSAGE, content="".join(buffer))
+    finally:
+        if next_event is not None:
+            next_event.cancel()
@@ -0,0 +1,78 @@
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional
+from .events import StreamingEvent
+
+class LiveStream:
+    """
+    Events of one running agent stream, fanned out to any number of subscribers.
+
+    The run is not tied to a client: subscribers can leave and join, and every new subscriber first
+    gets all events so far, then live events.
+    """
+
+    def __init__(self, message_id: str):
+        self.message_id = message_id
+        self.events: List[StreamingEvent] = []
+        self.closed = False
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: StreamingEvent):
+        self.events.append(event)
+        for subscriber in self._subscribers:
+            subscriber.put_nowait(event)
+
+    def close(self):
+        self.closed = True
+        for subscriber in self._subscribers:
+            subscriber.put_nowait(None)
+
+    async def subscribe(self) -> AsyncIterator[StreamingEvent]:
+        queue: asyncio.Queue = asyncio.Queue()
+        # replay and registration happen without an await in between, so no event is missed or repeated
+        history = list(self.events)
+        if not self.closed:
+            self._subscribers.append(queue)
+        try:
+            for event in history:
+                yield event
+            if self.closed:
+                return
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            if queue in self._subscribers:
+                self._subscribers.remove(queue)
+
+
+class LiveStreams:
+    """
+    Running agent streams of this worker by assistant message uuid.
+    """
+
+    keep_after_close: float = 60
+
+    _streams: Dict[str, LiveStream] = {}
+
+    @classmethod
+    def open(cls, message_id: str) -> LiveStream:
+        stream = cls._streams[str(message_id)] = LiveStream(message_id=str(message_id))
+        return stream
+
+    @classmethod
+    def get(cls, message_id: str) -> Optional[LiveStream]:
+        return cls._streams.get(str(message_id))
+
+    @classmethod
+    def close(cls, stream: LiveStream):
+        """
+        Close a stream, it stays available for late resumes for `keep_after_close` seconds.
+        """
+        stream.close()
+        asyncio.get_running_loop().call_later(cls.keep_after_close, cls._streams.pop, stream.message_id, None)
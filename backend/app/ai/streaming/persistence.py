@@ -0,0 +1,193 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database.agent import MessageModel
+from app.enums import MessageRoleEnum
+from app.utils.logging import AppLogger
+from ..enums import AgentStreamingEventTypeEnum
+from .events import StreamingEvent
+
+logger = AppLogger().get_logger()
+
+class StreamingMessageWriter:
+    """
+    Persist a streamed assistant message while it is generated.
+
+    The message row is created when the stream starts and token batches are appended with coalesced
+    UPDATEs at most every `flush_interval` seconds (or every `flush_chars` characters), so a dropped
+    connection loses at most one batch. Writes use their own session, the run may outlive the request.
+
+    The row is marked `streaming` until the answer is complete, and its `updated_at` is refreshed every
+    `heartbeat_interval` seconds (also during long tool calls) so readers can tell a dead writer. A run that
+    fails or is cancelled keeps its partial answer with a `stream_error`, so it is neither followed as
+    complete nor used as conversation history.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        flush_interval: float = 1.0,
+        flush_chars: int = 2000,
+        heartbeat_interval: float = 10.0
+    ):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.heartbeat_interval = heartbeat_interval
+        self.message_id = None
+        self._session: Optional[AsyncSession] = None
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._finished = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    async def start(self, session_id: str, type: str) -> str:
+        """
+        Create the (empty) streaming assistant message, returns its uuid.
+        """
+        self._session = AsyncSession(bind=self.engine, expire_on_commit=False)
+        message = MessageModel(
+            session_id=session_id,
+            role=MessageRoleEnum.ASSISTANT.value,
+            content="",
+            type=type
+        )
+        self._session.add(message)
+        await self._session.flush()
+        # not a model field, see app.ai.tables
+        await self._session.execute(
+            sa.text("UPDATE messages SET streaming = true WHERE uuid = :uuid"),
+            {"uuid": message.uuid}
+        )
+        await self._session.commit()
+        self.message_id = message.uuid
+        self._heartbeat_task = asyncio.create_task(self.__heartbeat__())
+        return message.uuid
+
+    async def __heartbeat__(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._finished.wait(), timeout=self.heartbeat_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            async with self._lock:
+                if self._session is None:
+                    return
+                try:
+                    await self._session.execute(
+                        sa.text("UPDATE messages SET updated_at = :now WHERE uuid = :uuid"),
+                        {"now": datetime.utcnow(), "uuid": self.message_id}
+                    )
+                    await self._session.commit()
+                except Exception as e:
+                    logger.warning(f"Failed to refresh streamed message {self.message_id}: {e}")
+                    await self._session.rollback()
+
+    def append(self, content: str):
+        self._buffer.append(content)
+        self._buffered += len(content)
+        if (
+            (self._buffered >= self.flush_chars or time.monotonic() - self._last_flush >= self.flush_interval)
+            and (self._flush_task is None or self._flush_task.done())
+        ):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        async with self._lock:
+            if not self._buffer:
+                return
+            delta = "".join(self._buffer)
+            self._buffer, self._buffered = [], 0
+            self._last_flush = time.monotonic()
+            try:
+                await self._session.execute(
+                    sa.text("UPDATE messages SET content = COALESCE(content, '') || :delta, updated_at = :now WHERE uuid = :uuid"),
+                    {"delta": delta, "now": datetime.utcnow(), "uuid": self.message_id}
+                )
+                await self._session.commit()
+            except Exception as e:
+                logger.warning(f"Failed to persist streamed message {self.message_id}: {e}")
+                await self._session.rollback()
+                self._buffer.insert(0, delta)
+                self._buffered += len(delta)
+
+    async def finish(self, content: str, error: Optional[str] = None):
+        """
+        Write the final content, mark the message as complete (or failed with `error`) and close the
+        writer's session. Later calls do nothing.
+        """
+        if self._session is None:
+            return
+        self._finished.set()
+        await asyncio.gather(
+            *[task for task in (self._flush_task, self._heartbeat_task) if task is not None],
+            return_exceptions=True
+        )
+        async with self._lock:
+            self._buffer, self._buffered = [], 0
+            try:
+                await self._session.execute(
+                    sa.text(
+                        "UPDATE messages SET content = :content, streaming = false, stream_error = :error, "
+                        "updated_at = :now WHERE uuid = :uuid"
+                    ),
+                    {"content": content, "error": error, "now": datetime.utcnow(), "uuid": self.message_id}
+                )
+                await self._session.commit()
+            finally:
+                await self._session.close()
+                self._session = None
+
+
+async def follow_persisted(
+    engine: AsyncEngine,
+    message_id: str,
+    poll_interval: float = 1.0,
+    stale_after: float = 30.0
+) -> AsyncIterator[StreamingEvent]:
+    """
+    Events of a saved message that is not running in this worker: its content so far, then the content
+    another worker appends (polled every `poll_interval` seconds), and CHAIN_END once it is complete, or
+    ERROR with the reason if its run failed.
+
+    Parameters:
+
+        engine (AsyncEngine): database engine, each poll uses a short-lived connection.
+
+        message_id (str): assistant message uuid.
+
+        poll_interval (float): seconds between reads of a streaming message.
+
+        stale_after (float): a streaming message not updated for this many seconds lost its writer
+            (worker died), the stream ends with an error instead of CHAIN_END.
+    """
+    sent = 0
+    while True:
+        async with engine.connect() as connection:
+            row = (await connection.execute(
+                sa.text("SELECT content, streaming, stream_error, updated_at FROM messages WHERE uuid = :uuid"),
+                {"uuid": message_id}
+            )).first()
+        if row is None:
+            raise ValueError(f"Message not found: {message_id}")
+        content = row.content or ""
+        if len(content) > sent:
+            yield StreamingEvent(type=AgentStreamingEventTypeEnum.MESSAGE, content=content[sent:], message_id=message_id)
+            sent = len(content)
+        if not row.streaming and row.stream_error is not None:
+            yield StreamingEvent(type=AgentStreamingEventTypeEnum.ERROR, content=row.stream_error, message_id=message_id)
+            return
+        if not row.streaming:
+            yield StreamingEvent(type=AgentStreamingEventTypeEnum.CAHIN_END, output=content, message_id=message_id)
+            return
+        if datetime.utcnow() - row.updated_at > timedelta(seconds=stale_after):
+            raise RuntimeError(f"Streamed message {message_id} was abandoned by its writer")
+        await asyncio.sleep(poll_interval)
\ No newline at end of file
@@ -0,0 +1,428 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.utils.logging import AppLogger
+from ..enums import AgentStreamingEventTypeEnum
+from .events import StreamingEvent
+from .live import LiveStream
+
+logger = AppLogger().get_logger()
+
+CHANNEL = "agent_flights"
+# postgres NOTIFY payloads are limited to 8000 bytes
+MAX_PAYLOAD = 7000
+# characters per field part, at most 6 bytes each once json encoded
+PART_SIZE = 1000
+
+def flight_lock_id(key: str) -> int:
+    """
+    Advisory lock id (signed bigint) of a flight key.
+    """
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big", signed=True)
+
+
+class FlightChannel:
+    """
+    Worker-wide postgres connection for single-flight coordination.
+
+    It LISTENs on the flights channel, sends notifications and holds the advisory locks of the flights led
+    by this worker, so the locks are released when the worker dies.
+    """
+
+    _connection: Optional[AsyncConnection] = None
+    _driver_connection = None
+    _handlers: Dict[str, Callable[[Dict], None]] = {}
+    _connect_lock: Optional[asyncio.Lock] = None
+    _query_lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def connected(cls) -> bool:
+        return cls._driver_connection is not None and not cls._driver_connection.is_closed()
+
+    @classmethod
+    async def start(cls, engine: AsyncEngine):
+        """
+        Open the coordination connection, or open it again after it was lost.
+        """
+        if cls.connected():
+            return
+        if cls._connect_lock is None:
+            cls._connect_lock = asyncio.Lock()
+            cls._query_lock = asyncio.Lock()
+        async with cls._connect_lock:
+            if cls.connected():
+                return
+            await cls.__reset__()
+            connection = await engine.connect()
+            try:
+                raw_connection = await connection.get_raw_connection()
+                driver_connection = raw_connection.driver_connection
+                await driver_connection.add_listener(CHANNEL, cls.__dispatch__)
+                driver_connection.add_termination_listener(cls.__on_terminated__)
+            except Exception:
+                await connection.close()
+                raise
+            cls._connection = connection
+            cls._driver_connection = driver_connection
+            logger.info(f"Listening on {CHANNEL} for in-flight agent requests")
+
+    @classmethod
+    async def __reset__(cls):
+        """
+        Drop a lost connection, the advisory locks it held are gone with it.
+        """
+        connection, cls._connection, cls._driver_connection = cls._connection, None, None
+        if connection is not None:
+            try:
+                await connection.invalidate()
+            except Exception as e:
+                logger.debug(f"Failed to close the {CHANNEL} connection: {e}")
+
+    @classmethod
+    def __on_terminated__(cls, connection):
+        if connection is cls._driver_connection:
+            logger.warning(f"Lost the {CHANNEL} connection, reconnecting on the next agent request")
+            cls._driver_connection = None
+
+    @classmethod
+    def __dispatch__(cls, connection, pid, channel, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        handler = cls._handlers.get(message.get("k"))
+        if handler is not None:
+            handler(message)
+
+    @classmethod
+    def subscribe(cls, key: str, handler: Callable[[Dict], None]):
+        cls._handlers[key] = handler
+
+    @classmethod
+    def unsubscribe(cls, key: str):
+        cls._handlers.pop(key, None)
+
+    @classmethod
+    async def __fetchval__(cls, query: str, *args):
+        # one asyncpg connection, queries must not overlap. Outside a transaction, so NOTIFY is sent at once
+        async with cls._query_lock:
+            if not cls.connected():
+                raise ConnectionError(f"No {CHANNEL} connection")
+            try:
+                return await cls._driver_connection.fetchval(query, *args)
+            except Exception:
+                if not cls.connected():
+                    await cls.__reset__()
+                raise
+
+    @classmethod
+    async def notify(cls, message: Dict):
+        await cls.__fetchval__("SELECT pg_notify($1, $2)", CHANNEL, json.dumps(message, default=str, ensure_ascii=False))
+
+    @classmethod
+    async def try_lock(cls, key: str) -> bool:
+        return await cls.__fetchval__("SELECT pg_try_advisory_lock($1)", flight_lock_id(key))
+
+    @classmethod
+    async def unlock(cls, key: str):
+        await cls.__fetchval__("SELECT pg_advisory_unlock($1)", flight_lock_id(key))
+
+
+class Flight:
+    """
+    One in-flight agent request of this worker, as leader (runs the agent) or follower (relays the
+    events of the leader in another worker).
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.stream = LiveStream(message_id=key)
+        self.leader = False
+        self.follower = False
+        self.pending_joins = 0
+        self.forwards = 0
+        self.received = 0
+        self.parts: List[str] = []
+        self.ended = False
+        self.error: Optional[BaseException] = None
+        self.activity = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_when_unwatched = False
+
+
+class SingleFlight:
+    """
+    Coalesce identical agent requests so they cost one agent run.
+
+    Requests with the same key share one event stream: in a worker the first request runs the producer
+    and duplicates subscribe to its LiveStream. Across workers the leader holds a postgres advisory lock
+    on the key, other workers send a join on the flights channel and the leader forwards the events
+    (from the start) with NOTIFY. A follower that hears nothing for `join_timeout` seconds checks the
+    lock, and runs the producer itself if the leader went away before sending anything. Without the
+    coordination connection (e.g. postgres unreachable, or a pooler without LISTEN) the request runs in
+    this worker and the connection is opened again by the next request.
+
+    A flight started with `cancel_when_unwatched` (its result is not saved) is cancelled once its last
+    subscriber in this worker leaves and no other worker follows it.
+    """
+
+    join_timeout: float = 10.0
+    heartbeat_interval: float = 2.0
+    flush_interval: float = 0.05
+    # finished flights still serve duplicates for a short while (double submits)
+    keep_after_close: float = 5.0
+
+    _flights: Dict[str, Flight] = {}
+    _tasks: set = set()
+
+    @classmethod
+    def __spawn__(cls, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+        return task
+
+    @classmethod
+    async def run(
+        cls,
+        engine: AsyncEngine,
+        key: str,
+        producer: Callable[[], AsyncIterator[StreamingEvent]],
+        cancel_when_unwatched: bool = False
+    ) -> AsyncIterator[StreamingEvent]:
+        """
+        Events of the flight `key`, running `producer` only if no identical request is in flight.
+
+        Parameters:
+
+            engine (AsyncEngine): database engine, for the worker-wide coordination connection.
+
+            key (str): request key, e.g. agent, tenant, session and last message uuid.
+
+            producer (Callable[[], AsyncIterator[StreamingEvent]]): runs the agent, called at most once.
+
+            cancel_when_unwatched (bool): cancel the flight when nobody listens to it any more, for
+                results that are not saved. Default to False.
+        """
+        flight = cls._flights.get(key)
+        if flight is None:
+            flight = cls._flights[key] = Flight(key)
+            flight.cancel_when_unwatched = cancel_when_unwatched
+            flight.task = cls.__spawn__(cls.__fly__(engine, flight, producer))
+        events = flight.stream.subscribe()
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+            cls.__cancel_if_unwatched__(flight)
+        if flight.error is not None:
+            raise flight.error
+
+    @classmethod
+    def __cancel_if_unwatched__(cls, flight: Flight):
+        """
+        Cancel a flight whose result nobody waits for: no subscribers in this worker (forwards to other
+        workers subscribe too) and no joins waiting for the lead.
+        """
+        if (
+            not flight.cancel_when_unwatched
+            or flight.task is None
+            or flight.task.done()
+            or flight.stream.subscribers
+            or flight.forwards
+            or flight.pending_joins
+        ):
+            return
+        logger.info(f"Cancelling in-flight agent request without subscribers: {flight.key}")
+        # new identical requests start a new flight
+        if cls._flights.get(flight.key) is flight:
+            del cls._flights[flight.key]
+            FlightChannel.unsubscribe(flight.key)
+        flight.task.cancel()
+
+    @classmethod
+    async def __fly__(cls, engine: AsyncEngine, flight: Flight, producer: Callable[[], AsyncIterator[StreamingEvent]]):
+        try:
+            locked = None
+            try:
+                await FlightChannel.start(engine)
+                FlightChannel.subscribe(flight.key, lambda message: cls.__on_message__(flight, message))
+                locked = await FlightChannel.try_lock(flight.key)
+                if not locked:
+                    flight.follower = True
+                    await FlightChannel.notify({"k": flight.key, "op": "join"})
+            except Exception as e:
+                # coordination is an optimization, without it the request runs here
+                logger.warning(f"Single-flight coordination unavailable, running {flight.key} in this worker: {e}")
+                locked = False
+                flight.follower = False
+            if locked or not flight.follower:
+                await cls.__lead__(flight, producer, locked=locked)
+            else:
+                logger.info(f"Joined in-flight agent request of another worker: {flight.key}")
+                await cls.__follow__(flight, producer)
+        except Exception as e:
+            logger.error(f"In-flight agent request {flight.key} failed: {e}")
+            flight.error = e
+        finally:
+            flight.stream.close()
+            asyncio.get_running_loop().call_later(cls.keep_after_close, cls.__forget__, flight)
+
+    @classmethod
+    def __forget__(cls, flight: Flight):
+        if cls._flights.get(flight.key) is flight:
+            del cls._flights[flight.key]
+            FlightChannel.unsubscribe(flight.key)
+
+    @classmethod
+    async def __lead__(cls, flight: Flight, producer: Callable[[], AsyncIterator[StreamingEvent]], locked: bool = True):
+        """
+        Run the producer here. Without the lock (no coordination connection) only this worker's duplicates share it.
+        """
+        flight.leader = locked
+        flight.follower = False
+        if locked:
+            for _ in range(flight.pending_joins):
+                cls.__start_forward__(flight)
+            flight.pending_joins = 0
+        try:
+            async for event in producer():
+                flight.stream.publish(event)
+        finally:
+            if locked:
+                try:
+                    await FlightChannel.unlock(flight.key)
+                except Exception as e:
+                    logger.warning(f"Failed to unlock in-flight agent request {flight.key}: {e}")
+
+    @classmethod
+    async def __follow__(cls, flight: Flight, producer: Callable[[], AsyncIterator[StreamingEvent]]):
+        while not flight.ended:
+            flight.activity.clear()
+            try:
+                await asyncio.wait_for(flight.activity.wait(), timeout=cls.join_timeout)
+                continue
+            except asyncio.TimeoutError:
+                pass
+            try:
+                locked = await FlightChannel.try_lock(flight.key)
+            except Exception as e:
+                # lost our connection, the leader may still be running but we can't hear it any more
+                logger.warning(f"Lost single-flight coordination while following {flight.key}: {e}")
+                locked = None
+            if locked is False:
+                continue
+            if flight.received == 0:
+                logger.warning(f"Leader of in-flight agent request went away, running it here: {flight.key}")
+                await cls.__lead__(flight, producer, locked=bool(locked))
+                return
+            if locked:
+                await FlightChannel.unlock(flight.key)
+            raise RuntimeError(f"Leader of in-flight agent request went away: {flight.key}")
+        if flight.error is not None:
+            raise flight.error
+
+    @classmethod
+    def __on_message__(cls, flight: Flight, message: Dict):
+        op = message.get("op")
+        if op == "join":
+            if flight.leader:
+                cls.__start_forward__(flight)
+            else:
+                flight.pending_joins += 1
+            return
+        if not flight.follower:
+            return
+
+        if op == "events":
+            for item in message["e"]:
+                # every join replays the stream from the start, skip what was relayed already
+                if item["i"] != flight.received or item["p"] != len(flight.parts):
+                    continue
+                flight.parts.append(item["d"])
+                if item["more"]:
+                    continue
+                data = json.loads("".join(flight.parts))
+                flight.parts = []
+                flight.received += 1
+                flight.stream.publish(StreamingEvent(**{**data, "type": AgentStreamingEventTypeEnum(data["type"])}))
+        elif op == "end":
+            flight.ended = True
+            if message.get("error"):
+                flight.error = RuntimeError(message["error"])
+        flight.activity.set()
+
+    @classmethod
+    def __wire_items__(cls, index: int, event: StreamingEvent) -> List[Dict]:
+        """
+        Event as NOTIFY-sized items: its json, as the stream encoders send it, split into parts.
+        """
+        data = json.dumps(event.to_dict(), default=str, ensure_ascii=False)
+        parts = [data[start:start + PART_SIZE] for start in range(0, len(data), PART_SIZE)]
+        return [
+            {"i": index, "p": part, "more": part < len(parts) - 1, "d": text}
+            for part, text in enumerate(parts)
+        ]
+
+    @classmethod
+    def __start_forward__(cls, flight: Flight):
+        # counted from the start, the forward subscribes to the stream only once it runs
+        flight.forwards += 1
+        cls.__spawn__(cls.__forward__(flight))
+
+    @classmethod
+    async def __forward__(cls, flight: Flight):
+        """
+        Send the events of a led flight, from the start, to followers in other workers.
+        """
+        batch: List[Dict] = []
+        batch_size = 0
+        index = 0
+        last_send = time.monotonic()
+
+        async def send():
+            nonlocal batch, batch_size, last_send
+            if batch:
+                await FlightChannel.notify({"k": flight.key, "op": "events", "e": batch})
+            else:
+                await FlightChannel.notify({"k": flight.key, "op": "ping"})
+            batch, batch_size = [], 0
+            last_send = time.monotonic()
+
+        events = flight.stream.subscribe().__aiter__()
+        next_event = asyncio.ensure_future(events.__anext__())
+        try:
+            while True:
+                timeout = cls.flush_interval if batch else cls.heartbeat_interval
+                done, _ = await asyncio.wait({next_event}, timeout=max(0, timeout - (time.monotonic() - last_send)))
+                if next_event not in done:
+                    await send()
+                    continue
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    break
+                for item in cls.__wire_items__(index, event):
+                    size = len(json.dumps(item, default=str, ensure_ascii=False).encode())
+                    if batch and batch_size + size > MAX_PAYLOAD:
+                        await send()
+                    batch.append(item)
+                    batch_size += size
+                index += 1
+                next_event = asyncio.ensure_future(events.__anext__())
+            await send()
+            await FlightChannel.notify({
+                "k": flight.key,
+                "op": "end",
+                "error": str(flight.error) if flight.error is not None else None
+            })
+        except Exception as e:
+            logger.warning(f"Failed to forward in-flight agent request {flight.key}: {e}")
+        finally:
+            flight.forwards -= 1
+            if not next_event.done():
+                next_event.cancel()
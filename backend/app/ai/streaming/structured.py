@@ -0,0 +1,452 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterable, List, Optional, Set, Union
+import json_repair
+
+# a UUID, e.g. a chunk uuid the model cites
+CHUNK_REF = re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+# [1] or [^1]
+CITATION = re.compile(r"\[\^?(\d+)\]")
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)")
+STRING_SPECIAL = re.compile(r'["\\]')
+SCALAR_END = re.compile(r"[,}\]\s]")
+NON_SPACE = re.compile(r"\S")
+
+@dataclass
+class ParsedItem:
+    """
+    A completed part of a streamed answer.
+
+    For JSON, `kind` is the matched path pattern (e.g. "sections[]") and `path` the concrete path
+    (e.g. "sections[2]"). For markdown, `kind` is "section", "citation" or "chunk_ref".
+    """
+    kind: str
+    value: Any
+    path: Optional[str] = None
+
+
+@dataclass
+class JSONFrame:
+    container: str
+    pattern: str
+    path: str
+    key: Optional[str] = None
+    index: int = 0
+    # key / colon / value / comma
+    state: str = "value"
+    capture_start: Optional[int] = None
+
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON answer while it streams, emitting values at the given paths as soon as they close.
+
+    Paths use "." between keys and "[]" for array items, e.g. "sections[]", "sections[].citations[]" or
+    "chunk_ids[]". Nested matches are emitted before the value containing them.
+
+    The document starts at a "{" / "[" that begins a line (e.g. after prose or a code fence line) and is the
+    container the paths expect, so inline brackets in prose ("sources [1]") are ignored. A candidate that
+    turns out malformed, or completes without matching any path, before anything was emitted is skipped and
+    the search goes on. Text after the document is ignored.
+
+    If the answer is malformed or cut off, incremental parsing stops there and `finish` repairs the whole
+    text with json_repair and emits the matches that were not emitted yet.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        """
+        Parameters:
+
+            paths (Iterable[str]): path patterns of the values to emit.
+        """
+        self.paths: Set[str] = set(paths)
+        # "[" for "[]..." paths, "{" for "key..." paths
+        self._root_containers = {"[" if path.startswith("[") else "{" for path in self.paths} or {"{", "["}
+        self._line_start = True
+        # last complete document that matched no path, the result if no better one follows
+        self._candidate: Optional[tuple] = None
+        self._chunks: List[str] = []
+        # unscanned text, starts at absolute offset `_offset`, kept from the oldest open capture
+        self._buffer = ""
+        self._offset = 0
+        self._pos = 0
+        self._stack: List[JSONFrame] = []
+        self._mode: Optional[str] = None
+        self._value_start = 0
+        self._value_pattern = ""
+        self._value_path = ""
+        self._string_is_key = False
+        self._root_start: Optional[int] = None
+        self._root_end: Optional[int] = None
+        self._broken = False
+        self._emitted: Set[str] = set()
+        self._result: Any = None
+
+    @property
+    def done(self) -> bool:
+        return self._root_end is not None
+
+    def feed(self, text: str) -> List[ParsedItem]:
+        """
+        Add streamed text, returns the values completed by it.
+        """
+        self._chunks.append(text)
+        if self.done or self._broken:
+            return []
+        self._buffer += text
+        items: List[ParsedItem] = []
+        while not self._broken:
+            try:
+                self.__scan__(items)
+                break
+            except ValueError:
+                self.__fail__()
+        self.__trim__()
+        return items
+
+    def finish(self) -> List[ParsedItem]:
+        """
+        End of the stream, returns the values recovered from a malformed or truncated answer.
+        """
+        text = "".join(self._chunks)
+        if self.done and not self._broken:
+            self._result = json.loads(text[self._root_start:self._root_end])
+            return []
+        if self._root_start is None and self._candidate is not None:
+            self._result = json.loads(text[self._candidate[0]:self._candidate[1]])
+            return []
+        self._result = json_repair.loads(text[self._root_start or 0:])
+        items: List[ParsedItem] = []
+        self.__walk__(self._result, "", "", items)
+        return items
+
+    def result(self) -> Any:
+        """
+        The whole document, after `finish`.
+        """
+        return self._result
+
+    def __child__(self) -> tuple:
+        if not self._stack:
+            return "", ""
+        frame = self._stack[-1]
+        if frame.container == "[":
+            return f"{frame.pattern}[]", f"{frame.path}[{frame.index}]"
+        separator = "." if frame.pattern else ""
+        return f"{frame.pattern}{separator}{frame.key}", f"{frame.path}{separator}{frame.key}"
+
+    def __emit__(self, pattern: str, path: str, start: int, end: int, items: List[ParsedItem]):
+        text = self._buffer[start - self._offset:end - self._offset]
+        self._emitted.add(path)
+        items.append(ParsedItem(kind=pattern, value=json.loads(text), path=path))
+
+    def __end_value__(self, end: int):
+        if self._stack:
+            frame = self._stack[-1]
+            frame.state = "comma"
+            if frame.container == "[":
+                frame.index += 1
+        elif self.paths and not self._emitted:
+            # e.g. a bracketed line of prose, keep looking
+            self._candidate = (self._root_start, end)
+            self.__reset_root__()
+        else:
+            self._root_end = end
+
+    def __reset_root__(self, position: Optional[int] = None):
+        self._stack = []
+        self._mode = None
+        self._root_start = None
+        self._line_start = False
+        if position is not None:
+            self._pos = position - self._offset
+
+    def __fail__(self):
+        """
+        Malformed text in the document: skip the candidate if nothing was emitted from it, else stop.
+        """
+        if self._root_start is not None and not self._emitted and self._root_start >= self._offset:
+            self.__reset_root__(self._root_start + 1)
+        else:
+            self._broken = True
+
+    def __start_value__(self, char: str, position: int) -> bool:
+        pattern, path = self.__child__()
+        if char in "{[":
+            if not self._stack:
+                self._root_start = position
+            self._stack.append(JSONFrame(
+                container=char,
+                pattern=pattern,
+                path=path,
+                state="key" if char == "{" else "value",
+                capture_start=position if pattern in self.paths else None
+            ))
+            return True
+        if not self._stack:
+            return True
+        self._value_start, self._value_pattern, self._value_path = position, pattern, path
+        if char == '"':
+            self._mode = "string"
+            self._string_is_key = False
+        elif char in "-0123456789tfn":
+            self._mode = "scalar"
+        else:
+            return False
+        return True
+
+    def __close__(self, position: int, items: List[ParsedItem]):
+        frame = self._stack.pop()
+        if frame.capture_start is not None:
+            self.__emit__(frame.pattern, frame.path, frame.capture_start, position + 1, items)
+        self.__end_value__(position + 1)
+
+    def __scan__(self, items: List[ParsedItem]):
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self.done:
+            position = self._offset + self._pos
+            if self._mode == "string":
+                match = STRING_SPECIAL.search(buffer, self._pos)
+                if match is None:
+                    self._pos = len(buffer)
+                    return
+                if match.group() == "\\":
+                    if match.end() >= len(buffer):
+                        # escaped character not streamed yet
+                        self._pos = match.start()
+                        return
+                    self._pos = match.end() + 1
+                    continue
+                self._pos = match.end()
+                self._mode = None
+                frame = self._stack[-1]
+                if self._string_is_key:
+                    frame.key = json.loads(buffer[self._value_start - self._offset:self._pos])
+                    frame.state = "colon"
+                else:
+                    if self._value_pattern in self.paths:
+                        self.__emit__(self._value_pattern, self._value_path, self._value_start, self._offset + self._pos, items)
+                    self.__end_value__(self._offset + self._pos)
+                continue
+
+            if self._mode == "scalar":
+                match = SCALAR_END.search(buffer, self._pos)
+                if match is None:
+                    self._pos = len(buffer)
+                    return
+                self._pos = match.start()
+                self._mode = None
+                end = self._offset + self._pos
+                if self._value_pattern in self.paths:
+                    self.__emit__(self._value_pattern, self._value_path, self._value_start, end, items)
+                self.__end_value__(end)
+                continue
+
+            if not self._stack and not self._line_start:
+                # text before the document, skip to the next line
+                newline = buffer.find("\n", self._pos)
+                if newline == -1:
+                    self._pos = len(buffer)
+                    return
+                self._pos = newline + 1
+                self._line_start = True
+                continue
+
+            match = NON_SPACE.search(buffer, self._pos)
+            if match is None:
+                self._pos = len(buffer)
+                return
+            if not self._stack and "\n" in buffer[self._pos:match.start()]:
+                self._line_start = True
+            self._pos = match.start()
+            position = self._offset + self._pos
+            char = match.group()
+            if not self._stack:
+                if char in self._root_containers:
+                    self.__start_value__(char, position)
+                else:
+                    self._line_start = False
+                self._pos += 1
+                continue
+
+            frame = self._stack[-1]
+            closing = "}" if frame.container == "{" else "]"
+            if frame.state == "key":
+                if char == '"':
+                    self._mode = "string"
+                    self._string_is_key = True
+                    self._value_start = position
+                elif char == closing:
+                    self.__close__(position, items)
+                else:
+                    self.__fail__()
+                    continue
+            elif frame.state == "colon":
+                if char != ":":
+                    self.__fail__()
+                    continue
+                frame.state = "value"
+            elif frame.state == "value":
+                if char == closing and frame.container == "[":
+                    self.__close__(position, items)
+                elif not self.__start_value__(char, position):
+                    self.__fail__()
+                    continue
+            else:
+                if char == ",":
+                    frame.state = "key" if frame.container == "{" else "value"
+                elif char == closing:
+                    self.__close__(position, items)
+                else:
+                    self.__fail__()
+                    continue
+            self._pos += 1
+
+    def __trim__(self):
+        keep = self._offset + self._pos
+        if self._mode is not None:
+            keep = min(keep, self._value_start)
+        if self._root_start is not None and not self._emitted:
+            # a candidate can still be skipped, rescanned from its start
+            keep = min(keep, self._root_start)
+        for frame in self._stack:
+            if frame.capture_start is not None:
+                keep = min(keep, frame.capture_start)
+                break
+        if keep > self._offset:
+            cut = keep - self._offset
+            self._buffer = self._buffer[cut:]
+            self._pos -= cut
+            self._offset = keep
+
+    def __walk__(self, value: Any, pattern: str, path: str, items: List[ParsedItem]):
+        separator = "." if pattern else ""
+        if isinstance(value, dict):
+            for key, child in value.items():
+                self.__walk__(child, f"{pattern}{separator}{key}", f"{path}{separator}{key}", items)
+        elif isinstance(value, list):
+            for index, child in enumerate(value):
+                self.__walk__(child, f"{pattern}[]", f"{path}[{index}]", items)
+        if pattern in self.paths and path not in self._emitted:
+            self._emitted.add(path)
+            items.append(ParsedItem(kind=pattern, value=value, path=path))
+
+
+@dataclass
+class MarkdownSection:
+    title: Optional[str]
+    level: int
+    lines: List[str] = field(default_factory=list)
+    citations: List[str] = field(default_factory=list)
+    chunk_ids: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "level": self.level,
+            "content": "\n".join(self.lines).strip(),
+            "citations": self.citations,
+            "chunk_ids": self.chunk_ids,
+        }
+
+
+class IncrementalMarkdownParser:
+    """
+    Split a markdown answer into sections while it streams.
+
+    A section is emitted when the next heading of level `section_level` or higher starts (and the last
+    one on `finish`). Citations ("[1]", "[^1]") and chunk references (UUIDs) are emitted once per answer
+    when the line containing them is complete. Headings in code fences are not section breaks.
+    """
+
+    def __init__(self, section_level: int = 2, citation_pattern=CITATION, chunk_pattern=CHUNK_REF):
+        """
+        Parameters:
+
+            section_level (int): deepest heading level that starts a new section.
+
+            citation_pattern (re.Pattern): citation marker, group 1 is the citation id.
+
+            chunk_pattern (re.Pattern): chunk reference.
+        """
+        self.section_level = section_level
+        self.citation_pattern = citation_pattern
+        self.chunk_pattern = chunk_pattern
+        self._partial = ""
+        self._in_fence = False
+        self._section = MarkdownSection(title=None, level=0)
+        self._citations: Set[str] = set()
+        self._chunk_ids: Set[str] = set()
+        self.sections: List[dict] = []
+
+    def feed(self, text: str) -> List[ParsedItem]:
+        """
+        Add streamed text, returns the sections, citations and chunk references completed by it.
+        """
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        items: List[ParsedItem] = []
+        for line in lines:
+            self.__line__(line, items)
+        return items
+
+    def finish(self) -> List[ParsedItem]:
+        """
+        End of the stream, returns the rest, including the last section.
+        """
+        items: List[ParsedItem] = []
+        if self._partial:
+            self.__line__(self._partial, items)
+            self._partial = ""
+        self.__close_section__(items)
+        return items
+
+    def __close_section__(self, items: List[ParsedItem]):
+        section = self._section.to_dict()
+        if section["title"] is not None or section["content"]:
+            self.sections.append(section)
+            items.append(ParsedItem(kind="section", value=section))
+
+    def __line__(self, line: str, items: List[ParsedItem]):
+        if FENCE.match(line):
+            self._in_fence = not self._in_fence
+        elif not self._in_fence:
+            heading = HEADING.match(line)
+            if heading is not None and len(heading.group(1)) <= self.section_level:
+                self.__close_section__(items)
+                self._section = MarkdownSection(title=heading.group(2), level=len(heading.group(1)))
+                return
+
+        self._section.lines.append(line)
+        for match in self.citation_pattern.finditer(line):
+            citation = match.group(1)
+            if citation not in self._section.citations:
+                self._section.citations.append(citation)
+            if citation not in self._citations:
+                self._citations.add(citation)
+                items.append(ParsedItem(kind="citation", value=citation))
+        for match in self.chunk_pattern.finditer(line):
+            chunk_id = match.group().lower()
+            if chunk_id not in self._section.chunk_ids:
+                self._section.chunk_ids.append(chunk_id)
+            if chunk_id not in self._chunk_ids:
+                self._chunk_ids.add(chunk_id)
+                items.append(ParsedItem(kind="chunk_ref", value=chunk_id))
+
+
+async def parse_stream(
+    chunks: AsyncIterator[Any],
+    parser: Union[IncrementalJSONParser, IncrementalMarkdownParser]
+) -> AsyncIterator[ParsedItem]:
+    """
+    Completed items of a streamed answer, e.g. from `ModelRouter.astream` or a chat model's `astream`
+    (message chunks are read by their content).
+    """
+    async for chunk in chunks:
+        text = chunk if isinstance(chunk, str) else chunk.content
+        for item in parser.feed(text):
+            yield item
+    for item in parser.finish():
+        yield item
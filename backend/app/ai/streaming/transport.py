@@ -0,0 +1,76 @@
+import asyncio
+from typing import AsyncIterator, Dict
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from app.utils.logging import AppLogger
+from .events import StreamingEventEncoder
+
+logger = AppLogger().get_logger()
+
+# sent with streaming responses: no proxy buffering (nginx honours X-Accel-Buffering per response), no caching.
+# No hop-by-hop headers (Connection), the server and proxies manage the connection and HTTP/2 forbids them.
+STREAMING_HEADERS: Dict[str, str] = {
+    "Cache-Control": "no-cache, no-transform",
+    "X-Accel-Buffering": "no",
+}
+
+async def with_heartbeats(
+    frames: AsyncIterator[bytes],
+    heartbeat: bytes,
+    interval: float = 15.0
+) -> AsyncIterator[bytes]:
+    """
+    Pass encoded frames through, sending `heartbeat` whenever nothing was sent for `interval` seconds.
+
+    Keeps proxies and load balancers from closing the connection during long tool calls, and lets the
+    client tell a slow answer from a dead connection.
+
+    Parameters:
+
+        frames (AsyncIterator[bytes]): encoded streaming frames.
+
+        heartbeat (bytes): keep-alive frame, e.g. StreamingEventEncoder.heartbeat.
+
+        interval (float): max seconds without a frame.
+    """
+    iterator = frames.__aiter__()
+    next_frame = None
+    try:
+        while True:
+            if next_frame is None:
+                next_frame = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({next_frame}, timeout=interval)
+            if not done:
+                yield heartbeat
+                continue
+            task, next_frame = next_frame, None
+            try:
+                yield task.result()
+            except StopAsyncIteration:
+                break
+    finally:
+        if next_frame is not None:
+            next_frame.cancel()
+            await asyncio.gather(next_frame, return_exceptions=True)
+        # closes the source when the client leaves early, so its own cleanup (saving, unsubscribing) runs now
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def stream_to_websocket(
+    websocket: WebSocket,
+    frames: AsyncIterator[bytes],
+    encoder: StreamingEventEncoder,
+    heartbeat_interval: float = 15.0
+):
+    """
+    Send encoded NDJSON frames over an accepted websocket, one text message per frame.
+
+    Per-message deflate is negotiated by the server (see app.utils.workers.StreamingUvicornWorker), so
+    frames coalesced by coalesce_messages compress well. Stops quietly when the client disconnects.
+    """
+    try:
+        async for frame in with_heartbeats(frames, heartbeat=encoder.heartbeat, interval=heartbeat_interval):
+            await websocket.send_text(frame.decode().rstrip("\n"))
+    except WebSocketDisconnect:
+        logger.info("Websocket client disconnected during streaming")
@@ -0,0 +1,46 @@
+"""
+Columns, indexes and tables that the agent stack migrations add next to the app.database models,
+declared on the shared metadata so `alembic revision --autogenerate` keeps them.
+
+Imported by migrations/env.py.
+"""
+import sqlalchemy as sa
+from sqlmodel import SQLModel, AutoString
+import app.database.agent  # noqa: F401, defines the tables
+
+def declare_column(table: sa.Table, column: sa.Column):
+    if column.name not in table.c:
+        table.append_column(column)
+
+
+def declare_index(table: sa.Table, name: str, *columns: str):
+    if name not in {index.name for index in table.indexes}:
+        sa.Index(name, *[table.c[column] for column in columns])
+
+
+messages_table = SQLModel.metadata.tables["messages"]
+reports_table = SQLModel.metadata.tables["reports"]
+chunks_table = SQLModel.metadata.tables["chunks"]
+
+# last messages of a session
+declare_index(messages_table, "ix_messages_session_id_created_at", "session_id", "created_at")
+# assistant answers that are still being generated
+declare_column(messages_table, sa.Column("streaming", sa.Boolean(), server_default=sa.false(), nullable=False))
+# why a streamed answer ended early (failed or cancelled run), null for complete answers
+declare_column(messages_table, sa.Column("stream_error", sa.Text(), nullable=True))
+# report pipeline checkpoints
+declare_column(reports_table, sa.Column("pipeline_state", sa.JSON(), nullable=True))
+# chunks of a report / session
+declare_index(chunks_table, "ix_chunks_report_id", "report_id")
+declare_index(chunks_table, "ix_chunks_session_id", "session_id")
+
+# rolling conversation summaries of the context builder
+session_summaries_table = sa.Table(
+    "session_summaries",
+    SQLModel.metadata,
+    sa.Column("session_id", AutoString(), primary_key=True),
+    sa.Column("summary", AutoString(), nullable=False),
+    sa.Column("folded_until", sa.DateTime(), nullable=False),
+    sa.Column("updated_at", sa.DateTime(), nullable=False),
+    keep_existing=True,
+)
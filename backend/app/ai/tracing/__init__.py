@@ -0,0 +1 @@
+from .buffer import TraceBuffer, TraceRecord, TraceSink, LangfuseSink, StubSink, generation_details, SPAN_START, SPAN_END, GENERATION_START, GENERATION_END
\ No newline at end of file
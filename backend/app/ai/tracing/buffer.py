@@ -0,0 +1,244 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.utils.langfuse_client import StatefulTraceClient, StatefulSpanClient
+from app.utils.logging import AppLogger
+
+logger = AppLogger().get_logger()
+
+SPAN_START = "span_start"
+SPAN_END = "span_end"
+GENERATION_START = "generation_start"
+GENERATION_END = "generation_end"
+
+def generation_details(event: Dict) -> Tuple[Optional[str], Optional[Dict[str, int]]]:
+    """
+    Model name and token usage (input_tokens / output_tokens / total_tokens) of an `on_chat_model_end`
+    event, None where the model reported nothing.
+    """
+    message = event["data"].get("output")
+    if isinstance(message, dict):
+        # astream_events v1 sends the LLMResult as a dict
+        generations = message.get("generations") or [[]]
+        generation = generations[0][0] if generations[0] else {}
+        message = generation.get("message") if isinstance(generation, dict) else getattr(generation, "message", None)
+    usage = getattr(message, "usage_metadata", None)
+    response_metadata = getattr(message, "response_metadata", None) or {}
+    token_usage = response_metadata.get("token_usage")
+    if not usage and token_usage:
+        usage = {
+            "input_tokens": token_usage.get("prompt_tokens", 0),
+            "output_tokens": token_usage.get("completion_tokens", 0),
+            "total_tokens": token_usage.get("total_tokens", 0),
+        }
+    model = response_metadata.get("model_name") or (event.get("metadata") or {}).get("ls_model_name")
+    return model, dict(usage) if usage else None
+
+
+class TraceRecord:
+    """
+    One tracing call, applied to langfuse by a TraceSink. Generation ends carry the model and token usage.
+    """
+    __slots__ = ("kind", "trace", "run_id", "name", "input", "output", "model", "usage", "time")
+
+    def __init__(
+        self,
+        kind: str,
+        trace: Optional[StatefulTraceClient],
+        run_id: str,
+        name: Optional[str] = None,
+        input: Optional[Any] = None,
+        output: Optional[Any] = None,
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ):
+        self.kind = kind
+        self.trace = trace
+        self.run_id = run_id
+        self.name = name
+        self.input = input
+        self.output = output
+        self.model = model
+        self.usage = usage
+        self.time = datetime.now()
+
+
+class TraceSink(ABC):
+    """
+    Destination of flushed trace records.
+    """
+
+    @abstractmethod
+    def write(self, records: List[TraceRecord]):
+        ...
+
+
+class LangfuseSink(TraceSink):
+    """
+    Apply trace records as spans / generations on their langfuse trace.
+
+    Open observations whose end never arrives (dropped by a full buffer, failed run) are forgotten after
+    `max_age` seconds or once more than `max_open` are open.
+    """
+
+    def __init__(self, max_open: int = 10_000, max_age: float = 3600):
+        self.max_open = max_open
+        self.max_age = max_age
+        self.expired = 0
+        self._observations: "OrderedDict[str, Tuple[StatefulSpanClient, float]]" = OrderedDict()
+
+    def __open__(self, run_id: str, observation: StatefulSpanClient):
+        now = time.monotonic()
+        self._observations[run_id] = (observation, now)
+        while self._observations:
+            oldest_id, (_, opened) = next(iter(self._observations.items()))
+            if len(self._observations) <= self.max_open and now - opened <= self.max_age:
+                break
+            del self._observations[oldest_id]
+            self.expired += 1
+
+    def write(self, records: List[TraceRecord]):
+        for record in records:
+            try:
+                if record.kind == SPAN_START:
+                    self.__open__(record.run_id, record.trace.span(
+                        name=record.name,
+                        input=record.input,
+                        start_time=record.time
+                    ))
+                elif record.kind == GENERATION_START:
+                    self.__open__(record.run_id, record.trace.generation(
+                        name=record.name,
+                        input=record.input,
+                        start_time=record.time
+                    ))
+                elif record.run_id in self._observations:
+                    observation, _ = self._observations.pop(record.run_id)
+                    if record.kind == GENERATION_END:
+                        # what the langfuse langchain handler recorded, cost is derived from model and usage
+                        observation.update(
+                            end_time=record.time,
+                            output=record.output,
+                            model=record.model,
+                            usage={
+                                "input": record.usage.get("input_tokens", 0),
+                                "output": record.usage.get("output_tokens", 0),
+                                "total": record.usage.get("total_tokens", 0),
+                                "unit": "TOKENS",
+                            } if record.usage else None
+                        )
+                    else:
+                        observation.update(
+                            end_time=record.time,
+                            output=record.output
+                        )
+            except Exception as e:
+                logger.warning(f"Failed to write trace record {record.kind} {record.name}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "open": len(self._observations),
+            "expired": self.expired,
+        }
+
+
+class StubSink(TraceSink):
+    """
+    Collects records in memory, for tests and benchmarks.
+    """
+
+    def __init__(self):
+        self.records: List[TraceRecord] = []
+
+    def write(self, records: List[TraceRecord]):
+        self.records.extend(records)
+
+
+class TraceBuffer:
+    """
+    Bounded in-memory buffer between the agent event loop and langfuse.
+
+    `emit` never blocks: when the buffer is full the record is dropped and counted. A background task
+    flushes records in batches to the sink on a worker thread, so tracing adds no latency to the token
+    stream.
+    """
+
+    _default: Optional["TraceBuffer"] = None
+
+    def __init__(
+        self,
+        sink: TraceSink,
+        capacity: int = 4096,
+        batch_size: int = 128,
+        flush_interval: float = 0.2
+    ):
+        """
+        Parameters:
+
+            sink (TraceSink): destination of the records.
+
+            capacity (int): max number of buffered records.
+
+            batch_size (int): max number of records per sink write.
+
+            flush_interval (float): seconds between flushes.
+        """
+        self.sink = sink
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.flushed = 0
+        self._records: Deque[TraceRecord] = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def default(cls) -> "TraceBuffer":
+        """
+        Worker-wide buffer writing to langfuse.
+        """
+        if cls._default is None:
+            cls._default = cls(sink=LangfuseSink())
+        return cls._default
+
+    def emit(self, record: TraceRecord):
+        if len(self._records) >= self.capacity:
+            self.dropped += 1
+            return
+        self._records.append(record)
+        self.__ensure_flusher__()
+
+    def __ensure_flusher__(self):
+        if self._task is None or self._task.done():
+            try:
+                self._task = asyncio.get_running_loop().create_task(self.__run__())
+            except RuntimeError:
+                # no running loop, records are written by the next flush()
+                pass
+
+    async def __run__(self):
+        while self._records:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """
+        Write all buffered records to the sink.
+        """
+        while self._records:
+            batch = [self._records.popleft() for _ in range(min(self.batch_size, len(self._records)))]
+            try:
+                await asyncio.to_thread(self.sink.write, batch)
+                self.flushed += len(batch)
+            except Exception as e:
+                logger.warning(f"Failed to flush {len(batch)} trace records: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": len(self._records),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,171 @@
+import atexit
+import importlib
+import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler
+from typing import Any, Optional, Sequence
+
+class LogPayload:
+    """
+    Lazily formatted, size-capped log argument for large payloads (tool inputs / outputs).
+
+        logger.info("Tool output was: %s", LogPayload(output))
+
+    Nothing is formatted unless the record is emitted, and with QueueListenerHandler it is formatted
+    on the listener thread instead of the event loop.
+    """
+    __slots__ = ("payload", "max_length")
+
+    default_max_length: int = 2000
+
+    def __init__(self, payload: Any, max_length: Optional[int] = None):
+        self.payload = payload
+        self.max_length = max_length or self.default_max_length
+
+    def __str__(self) -> str:
+        text = str(self.payload)
+        if len(text) > self.max_length:
+            return f"{text[:self.max_length]}... ({len(text) - self.max_length} chars truncated)"
+        return text
+
+
+def sample_draw(record: logging.LogRecord) -> float:
+    """
+    Random number of a record in [0, 1), drawn by the first handler that samples it and shared by the others.
+    """
+    draw = getattr(record, "sample_draw", None)
+    if draw is None:
+        draw = record.sample_draw = random.random()
+    return draw
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Logging handler that hands records to a background thread, which writes them in batches to a
+    wrapped handler.
+
+    Usage in a logging config file (args after the handler class are passed to it):
+
+        [handler_file]
+        class = app.utils.log_queue.QueueListenerHandler
+        args = ('logging.FileHandler', '/var/log/cadenza/app.log', 'a')
+        kwargs = {"batch_size": 256, "flush_interval": 0.5, "sample_rate": 0.1}
+
+    - records are queued as is and formatted on the listener thread.
+    - stream handlers are flushed once per batch instead of once per record.
+    - messages longer than `max_message_length` are truncated.
+    - records below WARNING from `sampled_loggers` are kept with probability `sample_rate`. The random
+      draw is made once per record, so handlers with the same rate keep or drop the same records.
+    - when the queue is full records are dropped and counted in `dropped` instead of blocking.
+
+    The listener thread starts with the first record of each process: the config is loaded before
+    gunicorn forks its workers, and threads don't survive the fork.
+    """
+
+    def __init__(
+        self,
+        handler_class: str,
+        *args,
+        queue_size: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        max_message_length: int = 10000,
+        sample_rate: float = 1.0,
+        sampled_loggers: Sequence[str] = (),
+        **kwargs
+    ):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        module_name, class_name = handler_class.rsplit(".", 1)
+        self.target: logging.Handler = getattr(importlib.import_module(module_name), class_name)(*args, **kwargs)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_message_length = max_message_length
+        self.sample_rate = sample_rate
+        self.sampled_loggers = tuple(sampled_loggers)
+        self.dropped = 0
+
+        # the listener flushes once per batch
+        self._target_flush = self.target.flush
+        self.target.flush = lambda: None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt: logging.Formatter):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def filter(self, record: logging.LogRecord):
+        if (
+            self.sample_rate < 1.0
+            and record.levelno < logging.WARNING
+            and record.name.startswith(self.sampled_loggers)
+            and sample_draw(record) >= self.sample_rate
+        ):
+            return False
+        return super().filter(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # in-process queue, no need to format / pickle on the calling thread
+        if isinstance(record.msg, str) and len(record.msg) > self.max_message_length:
+            record.msg = f"{record.msg[:self.max_message_length]}... ({len(record.msg) - self.max_message_length} chars truncated)"
+        return record
+
+    def __start__(self):
+        """
+        Start the listener of this process. Called with the handler lock held, which logging re-creates after a fork.
+        """
+        if self._pid is not None:
+            # forked: the parent's queued records and listener are not ours
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.__listen__, name="log-queue-listener", daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            self.__start__()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def __write_batch__(self, batch):
+        for record in batch:
+            if record.levelno >= self.target.level:
+                try:
+                    self.target.handle(record)
+                except Exception:
+                    self.target.handleError(record)
+        try:
+            self._target_flush()
+        except Exception:
+            pass
+
+    def __listen__(self):
+        while not self._stop.is_set() or not self.queue.empty():
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.__write_batch__(batch)
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            if self._thread is not None and self._pid == os.getpid():
+                self._thread.join(timeout=5)
+            self._target_flush()
+            self.target.close()
+        super().close()
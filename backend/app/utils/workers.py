@@ -0,0 +1,21 @@
+import os
+from uvicorn.workers import UvicornWorker
+
+class StreamingUvicornWorker(UvicornWorker):
+    """
+    Uvicorn worker for the streaming agent endpoints.
+
+        gunicorn -k app.utils.workers.StreamingUvicornWorker ...
+
+    - websockets implementation with permessage-deflate, unless WS_PER_MESSAGE_DEFLATE=false.
+    - protocol level websocket pings every WS_PING_INTERVAL seconds.
+    - httptools parser, no h11 per-chunk overhead on the token stream.
+    """
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "http": "httptools",
+        "ws": "websockets",
+        "ws_per_message_deflate": os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() != "false",
+        "ws_ping_interval": float(os.getenv("WS_PING_INTERVAL", "20")),
+        "ws_ping_timeout": float(os.getenv("WS_PING_TIMEOUT", "20")),
+    }
@@ -0,0 +1,257 @@
+"""
+Offline load test of the agent stack: QAAgent.astreaming / ainvoke and a report pipeline run, with
+stand-ins for Azure OpenAI, the search tools and langfuse (see benchmarks.fakes).
+
+Nothing is sent to external services and no database is needed: the session history is synthetic and
+single-flight / response saving are off. The tiktoken encoding has to be cached (TIKTOKEN_CACHE_DIR)
+for fully offline runs.
+
+    poetry run python -m benchmarks.agent_load --mode astreaming --requests 200 --concurrency 50
+    poetry run python -m benchmarks.agent_load --mode pipeline --requests 20 --concurrency 5 --sections 8
+
+Reports p50 / p99 latency, time to first token (streaming), throughput and RSS.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+# sets the placeholder settings, before app modules are imported
+from . import placeholder_env  # noqa: F401
+import numpy as np
+from langchain_core.messages import HumanMessage
+from app.config import get_settings
+from app.enums import MessageRoleEnum
+from app.ai.agents import QAAgent
+from app.ai.agents.registry import AgentRegistry
+from app.ai.agents.tools import with_timeout
+from app.ai.enums import AgentStreamingEventTypeEnum, ToolNameEnum
+from app.ai.pipeline import PipelineRun, Stage
+from app.ai.tracing import TraceBuffer, LangfuseSink
+from .fakes import FakeStreamingChatModel, StubLangfuseTrace, fake_search_tool
+
+HISTORY_START = datetime(2026, 1, 1)
+SEARCH_TOOLS = [ToolNameEnum.AZUREAI_SEARCH.value, ToolNameEnum.TAVILY_SEARCH.value, ToolNameEnum.EXA_SEARCH.value]
+
+
+class BenchmarkQAAgent(QAAgent):
+    """
+    QAAgent with stand-in tools and a synthetic session history.
+    """
+
+    def __init__(self, history: int, search_latency: float, search_jitter: float, result_chars: int, **kwargs):
+        self.history = history
+        self.search_latency = search_latency
+        self.search_jitter = search_jitter
+        self.result_chars = result_chars
+        super().__init__(**kwargs)
+
+    def __build_tools__(self):
+        tools = [
+            fake_search_tool(
+                name,
+                latency=self.search_latency,
+                jitter=self.search_jitter,
+                results=self.tool_cfg['internal_top'],
+                result_chars=self.result_chars,
+                seed=index
+            )
+            for index, name in enumerate(SEARCH_TOOLS)
+        ]
+        return [with_timeout(tool, timeout=self.__tool_timeout__(tool.name)) for tool in tools]
+
+    def __history__(self, session_id: str):
+        roles = [MessageRoleEnum.USER.value, MessageRoleEnum.ASSISTANT.value]
+        return [
+            SimpleNamespace(
+                uuid=f"{session_id}-{index}",
+                session_id=session_id,
+                role=roles[(self.history - 1 - index) % 2],
+                content=f"message {index} " + "lorem ipsum dolor sit amet " * 20,
+                files=None,
+                type="text",
+                created_at=HISTORY_START + timedelta(minutes=index)
+            )
+            for index in range(self.history)
+        ]
+
+    async def __get_last_messages__(self, session_id: str, number_of_messages: int):
+        messages = self.__history__(session_id)
+        return messages[-number_of_messages:] if number_of_messages >= 0 else messages
+
+    async def __get_message_page__(self, session_id: str, before=None, after=None, limit: int = 10, oldest_first: bool = False):
+        # the synthetic history has no answers in progress
+        messages = [
+            message for message in self.__history__(session_id)
+            if (before is None or message.created_at < before) and (after is None or message.created_at > after)
+        ]
+        return messages[:limit] if oldest_first else messages[-limit:]
+
+
+class RequestResult:
+    def __init__(self, latency: float, ttft: Optional[float] = None, tokens: int = 0):
+        self.latency = latency
+        self.ttft = ttft
+        self.tokens = tokens
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def new_agent(args, trace: StubLangfuseTrace, trace_buffer: TraceBuffer) -> BenchmarkQAAgent:
+    return BenchmarkQAAgent(
+        history=args.history,
+        search_latency=args.search_latency,
+        search_jitter=args.search_jitter,
+        result_chars=args.result_chars,
+        tenant=SimpleNamespace(uuid=uuid.UUID(int=0), ai_search_service_name="benchmark", ai_search_index_name="benchmark"),
+        db_session=None,
+        langfuse_trace=trace,
+        trace_buffer=trace_buffer,
+        single_flight=False,
+        tool_cfg={'internal_top': 5, 'web_top': 5, 'file_top': 5, 'timeout': 60, 'semantic_cache': False}
+    )
+
+
+async def run_astreaming(args, trace, trace_buffer) -> RequestResult:
+    agent = new_agent(args, trace, trace_buffer)
+    start = time.perf_counter()
+    ttft, tokens = None, 0
+    async for event in agent.astreaming(session_id=str(uuid.uuid4())):
+        if event.type == AgentStreamingEventTypeEnum.MESSAGE:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            tokens += 1
+    return RequestResult(time.perf_counter() - start, ttft, tokens)
+
+
+async def run_ainvoke(args, trace, trace_buffer) -> RequestResult:
+    agent = new_agent(args, trace, trace_buffer)
+    start = time.perf_counter()
+    await agent.ainvoke(session_id=str(uuid.uuid4()))
+    return RequestResult(time.perf_counter() - start, tokens=args.tokens)
+
+
+async def run_pipeline(args, trace, trace_buffer) -> RequestResult:
+    """
+    Report-shaped pipeline: outline, per-section research and writing, summary.
+    """
+    # pipeline stages call the model directly, without tools
+    model = FakeStreamingChatModel(
+        tokens=args.tokens,
+        token_interval=args.token_interval,
+        first_token_latency=args.first_token_latency
+    )
+    search = fake_search_tool(
+        ToolNameEnum.AZUREAI_SEARCH.value,
+        latency=args.search_latency,
+        jitter=args.search_jitter,
+        result_chars=args.result_chars
+    )
+    sections = [f"section {index}" for index in range(args.sections)]
+    start = time.perf_counter()
+    run = None
+
+    async def llm(prompt: str) -> str:
+        return (await model.ainvoke([HumanMessage(content=prompt)])).content
+
+    async def outline(inputs):
+        return await llm("outline")
+
+    async def research(inputs):
+        return await run.map("research", lambda section: search.ainvoke({"query": section}), sections)
+
+    async def write(inputs):
+        return await run.map("write", lambda item: llm(f"write {item[:50]}"), inputs["research"])
+
+    async def summary(inputs):
+        return await llm("summary " + " ".join(inputs["write"])[:200])
+
+    run = PipelineRun(stages=[
+        Stage(name="outline", fn=outline, llm=True),
+        Stage(name="research", fn=research, deps=["outline"]),
+        Stage(name="write", fn=write, deps=["research"]),
+        Stage(name="summary", fn=summary, deps=["write"], llm=True),
+    ])
+    await run.run()
+    return RequestResult(time.perf_counter() - start, tokens=args.tokens * (args.sections + 2))
+
+
+RUNNERS = {
+    "astreaming": run_astreaming,
+    "ainvoke": run_ainvoke,
+    "pipeline": run_pipeline,
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": float("nan"), "p99": float("nan")}
+    values = np.asarray(values) * 1000
+    return {"p50": np.percentile(values, 50), "p99": np.percentile(values, 99)}
+
+
+async def main(args):
+    settings = get_settings()
+    model = FakeStreamingChatModel(
+        tokens=args.tokens,
+        token_interval=args.token_interval,
+        first_token_latency=args.first_token_latency,
+        call_tools=SEARCH_TOOLS[:args.tool_calls]
+    )
+    AgentRegistry.register_model(model=settings.SMART_LLM_MODEL, deployment=settings.AZURE_OPENAI_DEPLOYMENT_NAME, client=model)
+    trace = StubLangfuseTrace()
+    trace_buffer = TraceBuffer(sink=LangfuseSink())
+    runner = RUNNERS[args.mode]
+
+    rss_before = rss_mb()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited() -> RequestResult:
+        async with semaphore:
+            return await runner(args, trace, trace_buffer)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[limited() for _ in range(args.requests)])
+    elapsed = time.perf_counter() - start
+    await trace_buffer.flush()
+
+    latency = percentiles([result.latency for result in results])
+    ttft = percentiles([result.ttft for result in results if result.ttft is not None])
+    tokens = sum(result.tokens for result in results)
+    print(f"mode             : {args.mode}, {args.requests} requests at concurrency {args.concurrency}")
+    print(f"latency          : p50 {latency['p50']:8.1f} ms   p99 {latency['p99']:8.1f} ms")
+    if args.mode == "astreaming":
+        print(f"time to 1st token: p50 {ttft['p50']:8.1f} ms   p99 {ttft['p99']:8.1f} ms")
+    print(f"throughput       : {len(results) / elapsed:8.2f} requests/s   {tokens / elapsed:10.1f} tokens/s")
+    print(f"rss              : {rss_before:8.1f} MB before   {rss_mb():8.1f} MB after   {peak_rss_mb():8.1f} MB peak")
+    print(f"tracing          : {trace.stats()} {trace_buffer.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=list(RUNNERS), default="astreaming")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--history", type=int, default=20, help="synthetic session messages")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per answer")
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--tool-calls", type=int, default=2, help="search tools called per question")
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--search-jitter", type=float, default=0.2)
+    parser.add_argument("--result-chars", type=int, default=1000)
+    parser.add_argument("--sections", type=int, default=6, help="report sections (pipeline mode)")
+    args = parser.parse_args()
+    asyncio.run(main(args))
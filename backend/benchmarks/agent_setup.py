@@ -0,0 +1,64 @@
+"""
+Per-request agent setup cost, before and after the AgentRegistry.
+
+Run from backend/ with the usual .env.local sourced (no request is sent to Azure):
+
+    poetry run python -m benchmarks.agent_setup --requests 200
+"""
+import argparse
+import time
+from langchain_core.tools import tool
+from langchain_openai import AzureChatOpenAI
+from langgraph.prebuilt import create_react_agent
+from app.ai.agents.registry import AgentRegistry
+from app.config import get_settings
+
+
+@tool
+def search_tool(query: str) -> str:
+    """Stand-in search tool."""
+    return query
+
+
+def build_per_request():
+    settings = get_settings()
+    model = AzureChatOpenAI(
+        name="qa-agent",
+        model=settings.SMART_LLM_MODEL,
+        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+        azure_deployment=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+        openai_api_version=settings.AZURE_OPENAI_API_VERSION,
+    )
+    return create_react_agent(model, [search_tool]).with_config({"run_name": "qa-agent"})
+
+
+def build_from_registry():
+    settings = get_settings()
+    model = AgentRegistry.get_model(
+        model=settings.SMART_LLM_MODEL,
+        deployment=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+        name="qa-agent"
+    )
+    return AgentRegistry.get_agent(
+        key=("qa-agent", "benchmark"),
+        builder=lambda: create_react_agent(model, [search_tool]).with_config({"run_name": "qa-agent"})
+    )
+
+
+def measure(fn, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return (time.perf_counter() - start) / requests * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    before = measure(build_per_request, args.requests)
+    after = measure(build_from_registry, args.requests)
+    print(f"per-request build : {before:8.3f} ms/request")
+    print(f"agent registry    : {after:8.3f} ms/request")
+    print(f"speedup           : {before / after:8.1f}x")
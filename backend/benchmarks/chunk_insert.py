@@ -0,0 +1,82 @@
+"""
+ORM inserts (add_all, one commit) vs. bulk COPY for chunks, and loading all chunks of a report.
+
+Runs against PG_AGENT_DATABASE_URL (migrated to head) and removes its rows again:
+
+    poetry run python -m benchmarks.chunk_insert --chunks 10000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import get_settings
+from app.database.agent import ChunkModel
+from app.ai.pipeline import bulk_insert_chunks, find_chunks_by_report_id
+
+
+def synthetic_chunks(report_id: uuid.UUID, count: int):
+    return [
+        {
+            "type": "web",
+            "query": f"query {i % 20}",
+            "vector_similarity_score": 0.5,
+            "source": f"https://example.com/{i}",
+            "content": "lorem ipsum dolor sit amet " * 30,
+            "report_id": report_id,
+        }
+        for i in range(count)
+    ]
+
+
+async def create_report(db_session: AsyncSession) -> uuid.UUID:
+    report_id = uuid.uuid4()
+    now = datetime.utcnow()
+    await db_session.execute(
+        sa.text("INSERT INTO reports (created_at, updated_at, uuid) VALUES (:now, :now, :uuid)"),
+        {"now": now, "uuid": report_id}
+    )
+    await db_session.commit()
+    return report_id
+
+
+async def orm_insert(db_session: AsyncSession, chunks):
+    db_session.add_all([ChunkModel(**chunk) for chunk in chunks])
+    await db_session.commit()
+
+
+async def main(count: int):
+    engine = create_async_engine(get_settings().PG_AGENT_DATABASE_URL)
+    report_ids = []
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as db_session:
+            for name, insert in [("orm add_all", orm_insert), ("bulk copy", bulk_insert_chunks)]:
+                report_id = await create_report(db_session)
+                report_ids.append(report_id)
+                chunks = synthetic_chunks(report_id, count)
+
+                start = time.perf_counter()
+                await insert(db_session, chunks)
+                insert_s = time.perf_counter() - start
+
+                start = time.perf_counter()
+                loaded = await find_chunks_by_report_id(db_session, report_id)
+                load_ms = (time.perf_counter() - start) * 1000
+                print(f"{name:<18} insert {count} chunks: {insert_s:8.2f} s, load {len(loaded)} chunks: {load_ms:8.1f} ms")
+    finally:
+        async with AsyncSession(engine) as db_session:
+            for report_id in report_ids:
+                await db_session.execute(sa.text("DELETE FROM chunks WHERE report_id = :id"), {"id": report_id})
+                await db_session.execute(sa.text("DELETE FROM reports WHERE uuid = :id"), {"id": report_id})
+            await db_session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.chunks))
@@ -0,0 +1,47 @@
+"""
+LLM relevance checks with and without the vectorised chunk pre-filter.
+
+Synthetic chunks are embedded as random vectors around a few topics, with near-duplicates, and every
+LLM relevance check is simulated with a fixed latency at the pipeline's LLM concurrency:
+
+    poetry run python -m benchmarks.chunk_prefilter --chunks 80 --llm-latency 1.5
+"""
+import argparse
+import math
+import time
+import numpy as np
+from app.ai.pipeline import PrefilterConfig, rank_chunks
+
+
+def synthetic(chunks: int, queries: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(queries, dim))
+    chunk_vectors = topics[rng.integers(0, queries, chunks)] + rng.normal(scale=1.5, size=(chunks, dim))
+    # a quarter of the chunks are near-duplicates of another chunk (same source from several retrievers)
+    duplicates = rng.choice(chunks, chunks // 4, replace=False)
+    chunk_vectors[duplicates] = chunk_vectors[rng.integers(0, chunks, len(duplicates))] + rng.normal(scale=0.01, size=(len(duplicates), dim))
+    return chunk_vectors, topics + rng.normal(scale=0.5, size=(queries, dim))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=80)
+    parser.add_argument("--queries", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=1.5)
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    chunk_vectors, query_vectors = synthetic(args.chunks, args.queries, args.dim)
+
+    start = time.perf_counter()
+    selected = rank_chunks(chunk_vectors, query_vectors, PrefilterConfig(top_k=args.top_k))
+    prefilter_ms = (time.perf_counter() - start) * 1000
+
+    def llm_seconds(calls: int) -> float:
+        return math.ceil(calls / args.llm_concurrency) * args.llm_latency
+
+    print(f"{'':<14} {'llm calls':>10} {'est. latency':>13}")
+    print(f"{'all chunks':<14} {args.chunks:>10} {llm_seconds(args.chunks):>11.1f} s")
+    print(f"{'pre-filtered':<14} {len(selected):>10} {llm_seconds(len(selected)) + prefilter_ms / 1000:>11.1f} s  (pre-filter {prefilter_ms:.1f} ms)")
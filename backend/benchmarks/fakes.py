@@ -0,0 +1,210 @@
+"""
+Local stand-ins for the external services of the agent stack, for offline benchmarks.
+
+- FakeStreamingChatModel: chat model that calls the configured tools once and then streams a fixed
+  answer at a configurable token rate.
+- fake_search_tool: search tool with configurable latency and payload size.
+- StubLangfuseTrace: langfuse trace that only counts spans / generations.
+
+All randomness comes from explicit seeds, so runs are repeatable.
+"""
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional, Sequence
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, BaseCallbackHandler, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool, StructuredTool
+
+WORDS = "the report market revenue growth customer segment analysis risk forecast quarter product region".split()
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Deterministic chat model.
+
+    On the first turn after a user message it calls every tool in `call_tools` (in parallel, like
+    the real model with parallel tool calls), afterwards it answers with `tokens` tokens, the first
+    one after `first_token_latency` seconds and then one every `token_interval` seconds.
+    `tokens_by_prefix` overrides the answer length for user messages starting with a prefix.
+    """
+    tokens: int = 200
+    token_interval: float = 0.01
+    first_token_latency: float = 0.3
+    call_tools: List[str] = []
+    tokens_by_prefix: Dict[str, int] = {}
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs) -> "FakeStreamingChatModel":
+        return self
+
+    def __needs_tools__(self, messages: List[BaseMessage]) -> bool:
+        for message in reversed(messages):
+            if isinstance(message, ToolMessage):
+                return False
+            if isinstance(message, HumanMessage):
+                break
+        return bool(self.call_tools)
+
+    def __tool_call_chunk__(self, messages: List[BaseMessage]) -> AIMessageChunk:
+        query = next((message.content for message in reversed(messages) if isinstance(message, HumanMessage)), "")
+        return AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {"name": name, "args": json.dumps({"query": str(query)[:200]}), "id": f"call_{index}", "index": index}
+                for index, name in enumerate(self.call_tools)
+            ]
+        )
+
+    def __answer_tokens__(self, messages: List[BaseMessage]) -> List[str]:
+        tokens = self.tokens
+        query = next((str(message.content) for message in reversed(messages) if isinstance(message, HumanMessage)), "")
+        for prefix, count in self.tokens_by_prefix.items():
+            if query.startswith(prefix):
+                tokens = count
+                break
+        rng = random.Random(self.seed)
+        return [" " + rng.choice(WORDS) for _ in range(tokens)]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs
+    ) -> ChatResult:
+        chunks = list(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        message = chunks[0].message
+        for chunk in chunks[1:]:
+            message = message + chunk.message
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(
+            content=message.content,
+            tool_calls=message.tool_calls
+        ))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        if self.__needs_tools__(messages):
+            yield ChatGenerationChunk(message=self.__tool_call_chunk__(messages))
+            return
+        for index, token in enumerate(self.__answer_tokens__(messages)):
+            if index:
+                time.sleep(self.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        if self.__needs_tools__(messages):
+            yield ChatGenerationChunk(message=self.__tool_call_chunk__(messages))
+            return
+        for index, token in enumerate(self.__answer_tokens__(messages)):
+            if index:
+                await asyncio.sleep(self.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs
+    ) -> ChatResult:
+        chunks = [chunk async for chunk in self._astream(messages, stop=stop, run_manager=run_manager, **kwargs)]
+        message = chunks[0].message
+        for chunk in chunks[1:]:
+            message = message + chunk.message
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(
+            content=message.content,
+            tool_calls=message.tool_calls
+        ))])
+
+
+def fake_search_tool(
+    name: str,
+    latency: float = 0.5,
+    jitter: float = 0.0,
+    results: int = 5,
+    result_chars: int = 1000,
+    seed: int = 0
+) -> BaseTool:
+    """
+    Search tool returning `results` synthetic documents of `result_chars` characters after `latency`
+    (+ up to `jitter`) seconds.
+    """
+    rng = random.Random(seed)
+    documents = [
+        {"title": f"Document {index}", "content": " ".join(rng.choice(WORDS) for _ in range(result_chars // 6))[:result_chars]}
+        for index in range(results)
+    ]
+
+    async def search(query: str) -> str:
+        await asyncio.sleep(latency + rng.random() * jitter)
+        return json.dumps(documents)
+
+    return StructuredTool.from_function(
+        coroutine=search,
+        name=name,
+        description=f"Stand-in for {name}."
+    )
+
+
+class StubObservation:
+
+    def __init__(self, trace: "StubLangfuseTrace"):
+        self.trace = trace
+
+    def update(self, **kwargs):
+        self.trace.updates += 1
+
+
+class StubLangfuseTrace:
+    """
+    Langfuse trace stand-in, counts the observations written to it.
+    """
+
+    def __init__(self):
+        self.spans = 0
+        self.generations = 0
+        self.updates = 0
+
+    def span(self, **kwargs) -> StubObservation:
+        self.spans += 1
+        return StubObservation(self)
+
+    def generation(self, **kwargs) -> StubObservation:
+        self.generations += 1
+        return StubObservation(self)
+
+    def update(self, **kwargs):
+        self.updates += 1
+
+    def get_langchain_handler(self, **kwargs) -> BaseCallbackHandler:
+        return BaseCallbackHandler()
+
+    def stats(self) -> Dict[str, int]:
+        return {"spans": self.spans, "generations": self.generations, "updates": self.updates}
@@ -0,0 +1,89 @@
+"""
+Full-session fetch + slice vs. windowed "last N messages" query.
+
+Seeds synthetic sessions of 10 / 1k / 10k messages into PG_AGENT_DATABASE_URL (migrated to head),
+times both paths and removes the synthetic rows again:
+
+    poetry run python -m benchmarks.message_window --last 10 --repeat 20
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select, col
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import get_settings
+from app.database.agent import MessageModel, MessageService
+from app.enums import MessageRoleEnum
+
+SESSION_SIZES = [10, 1_000, 10_000]
+
+
+async def seed(db_session: AsyncSession, session_id: str, size: int):
+    roles = [MessageRoleEnum.USER.value, MessageRoleEnum.ASSISTANT.value]
+    db_session.add_all([
+        MessageModel(
+            session_id=session_id,
+            role=roles[i % 2],
+            type="text",
+            content="lorem ipsum dolor sit amet " * 40,
+            files=[f"file-{i}.pdf"] if i % 5 == 0 else None
+        )
+        for i in range(size)
+    ])
+    await db_session.commit()
+
+
+async def full_fetch(db_session: AsyncSession, session_id: str, last: int):
+    messages = await MessageService(db_session=db_session).find_by_session_id(session_id=session_id)
+    return messages[-last:]
+
+
+async def windowed_fetch(db_session: AsyncSession, session_id: str, last: int):
+    statement = (
+        select(MessageModel)
+        .where(MessageModel.session_id == session_id)
+        .order_by(col(MessageModel.created_at).desc())
+        .limit(last)
+    )
+    result = await db_session.exec(statement)
+    return list(reversed(result.all()))
+
+
+async def measure(fn, db_session: AsyncSession, session_id: str, last: int, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await fn(db_session, session_id, last)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def main(last: int, repeat: int):
+    engine = create_async_engine(get_settings().PG_AGENT_DATABASE_URL)
+    session_ids = {size: f"benchmark-{uuid.uuid4()}" for size in SESSION_SIZES}
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as db_session:
+            for size, session_id in session_ids.items():
+                await seed(db_session, session_id, size)
+
+            print(f"{'messages':>10} {'full + slice':>14} {'windowed':>12}")
+            for size, session_id in session_ids.items():
+                full = await measure(full_fetch, db_session, session_id, last, repeat)
+                windowed = await measure(windowed_fetch, db_session, session_id, last, repeat)
+                print(f"{size:>10} {full:>11.2f} ms {windowed:>9.2f} ms")
+    finally:
+        async with AsyncSession(engine) as db_session:
+            await db_session.exec(
+                delete(MessageModel).where(col(MessageModel.session_id).in_(list(session_ids.values())))
+            )
+            await db_session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--last", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.last, args.repeat))
@@ -0,0 +1,225 @@
+"""
+End-to-end report latency under the model routing policies (see app.ai.agents.ModelRouter), offline.
+
+A report-shaped pipeline (query generation, search, chunk relevance checks, chunk ordering, section
+writing, review) runs on stand-in fast and smart models, once per policy:
+
+- smart: every call on the smart model (the behaviour before routing).
+- tiered: query / ranking prompts on the fast model.
+- cascade: tiered, and fast answers failing validation (`--fast-failure-rate`) are retried on the smart model.
+
+    poetry run python -m benchmarks.model_routing --reports 20 --concurrency 5 --sections 6
+    poetry run python -m benchmarks.model_routing --policies tiered cascade --fast-failure-rate 0.2
+
+Reports p50 / p99 report latency, LLM calls per tier and, against quality, the estimated cost per report
+(token counts of the stand-in models at `--*-price-*` per 1M tokens) and how many fast answers failed
+validation and how many of those ended up in the report. The smart model is assumed to always pass.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import AsyncIterator, Dict, List
+from langchain_core.outputs import ChatGenerationChunk
+
+# sets the placeholder settings, before app modules are imported
+from . import placeholder_env  # noqa: F401
+from .agent_load import percentiles, peak_rss_mb
+from app.ai.agents import ModelRouter
+from app.ai.agents.registry import AgentRegistry
+from app.ai.enums import ModelTierEnum, ModelRoutingPolicyEnum, ToolNameEnum
+from app.ai.pipeline import PipelineRun, Stage
+from app.ai.prompts import PromptRegistry
+from .fakes import FakeStreamingChatModel, fake_search_tool
+
+
+class MeteredChatModel(FakeStreamingChatModel):
+    """
+    Stand-in model counting its prompt (4 characters a token) and completion tokens, for the cost estimate.
+    """
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        self.prompt_tokens += sum(len(str(message.content)) for message in messages) // 4
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            if chunk.message.content:
+                self.completion_tokens += 1
+            yield chunk
+
+
+class ValidationStats:
+    """
+    Validation outcomes of the fast answers of one policy run.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.failed = 0
+
+    def failure_rate(self) -> float:
+        return self.failed / self.checked if self.checked else 0.0
+
+
+def register_models(args) -> Dict[ModelTierEnum, MeteredChatModel]:
+    # answers of the fast-tier prompts are short whichever model writes them
+    short_answers = {prompt: args.short_tokens for prompt in PromptRegistry.prompt_tiers}
+    models = {
+        ModelTierEnum.FAST: MeteredChatModel(
+            tokens=args.tokens,
+            token_interval=args.fast_token_interval,
+            first_token_latency=args.fast_first_token_latency,
+            tokens_by_prefix=short_answers
+        ),
+        ModelTierEnum.SMART: MeteredChatModel(
+            tokens=args.tokens,
+            token_interval=args.smart_token_interval,
+            first_token_latency=args.smart_first_token_latency,
+            tokens_by_prefix=short_answers
+        ),
+    }
+    for tier, model in models.items():
+        AgentRegistry.register_model(model=ModelRouter.model_name(tier), deployment=ModelRouter.deployment(tier), client=model)
+    return models
+
+
+def estimated_cost(args, models: Dict[ModelTierEnum, MeteredChatModel]) -> Dict[ModelTierEnum, float]:
+    prices = {
+        ModelTierEnum.FAST: (args.fast_price_in, args.fast_price_out),
+        ModelTierEnum.SMART: (args.smart_price_in, args.smart_price_out),
+    }
+    return {
+        tier: (model.prompt_tokens * prices[tier][0] + model.completion_tokens * prices[tier][1]) / 1_000_000
+        for tier, model in models.items()
+    }
+
+
+async def run_report(args, rng: random.Random, validation: ValidationStats) -> float:
+    search = fake_search_tool(
+        ToolNameEnum.AZUREAI_SEARCH.value,
+        latency=args.search_latency,
+        results=args.chunks,
+        result_chars=args.result_chars
+    )
+    sections = [f"section {index}" for index in range(args.sections)]
+    run = None
+
+    def flaky(text: str) -> bool:
+        # stand-in for the prompt's output validation, fails for a share of the fast answers
+        validation.checked += 1
+        if rng.random() < args.fast_failure_rate:
+            validation.failed += 1
+            return False
+        return True
+
+    async def llm(prompt: str, text: str, validate=None) -> str:
+        fast = ModelRouter.route(prompt) == ModelTierEnum.FAST
+        response = await ModelRouter.ainvoke(prompt, f"{prompt}: {text}", validate=validate if fast else None)
+        if fast and validate is not None and ModelRouter.current_policy() != ModelRoutingPolicyEnum.CASCADE:
+            # not checked by the router, measured only: the answer is used either way
+            validate(response.content)
+        return response.content
+
+    async def rag_queries(inputs):
+        return await llm("get-rag-queries", "report topic", validate=flaky)
+
+    async def web_queries(inputs):
+        return await llm("get-web-search-queries", "report topic", validate=flaky)
+
+    async def research(inputs):
+        results = await run.map("research", lambda section: search.ainvoke({"query": section}), sections)
+        return [[document["content"] for document in json.loads(result)] for result in results]
+
+    async def relevance(inputs):
+        chunks = [chunk for section_chunks in inputs["research"] for chunk in section_chunks]
+        return await run.map("relevance", lambda chunk: llm("check-chunk-relevance", chunk[:200], validate=flaky), chunks)
+
+    async def order(inputs):
+        return await run.map("order", lambda section: llm("section-order-chunks", section, validate=flaky), sections)
+
+    async def write(inputs):
+        return await run.map("write", lambda section: llm("generate-section-content", section), sections)
+
+    async def review(inputs):
+        return await llm("review-sections", " ".join(inputs["write"])[:500])
+
+    run = PipelineRun(stages=[
+        Stage(name="rag_queries", fn=rag_queries, llm=True),
+        Stage(name="web_queries", fn=web_queries, llm=True),
+        Stage(name="research", fn=research, deps=["rag_queries", "web_queries"]),
+        Stage(name="relevance", fn=relevance, deps=["research"]),
+        Stage(name="order", fn=order, deps=["relevance"]),
+        Stage(name="write", fn=write, deps=["order"]),
+        Stage(name="review", fn=review, deps=["write"], llm=True),
+    ])
+    start = time.perf_counter()
+    await run.run()
+    return time.perf_counter() - start
+
+
+async def run_policy(args, policy: ModelRoutingPolicyEnum, models: Dict[ModelTierEnum, MeteredChatModel]):
+    ModelRouter.policy = policy
+    ModelRouter.reset_stats()
+    for model in models.values():
+        model.prompt_tokens = model.completion_tokens = 0
+    rng = random.Random(args.seed)
+    validation = ValidationStats()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited() -> float:
+        async with semaphore:
+            return await run_report(args, rng, validation)
+
+    start = time.perf_counter()
+    latencies: List[float] = await asyncio.gather(*[limited() for _ in range(args.reports)])
+    elapsed = time.perf_counter() - start
+    latency = percentiles(latencies)
+    stats = ModelRouter.stats()
+    print(
+        f"{policy.value:<8} report p50 {latency['p50']:9.1f} ms   p99 {latency['p99']:9.1f} ms   "
+        f"{args.reports / elapsed:6.2f} reports/s   fast calls {stats['fast_calls']:5d}   "
+        f"smart calls {stats['smart_calls']:5d}   escalations {stats['escalations']:4d}"
+    )
+    cost = estimated_cost(args, models)
+    # with cascade every failed fast answer was replaced by a smart one
+    invalid_kept = 0 if policy == ModelRoutingPolicyEnum.CASCADE else validation.failed
+    print(
+        f"{'':<8} cost ${sum(cost.values()) / args.reports:.4f}/report (fast ${cost[ModelTierEnum.FAST]:.4f}, "
+        f"smart ${cost[ModelTierEnum.SMART]:.4f} in total)   fast answers failing validation "
+        f"{validation.failure_rate():6.1%} of {validation.checked}   invalid answers in reports {invalid_kept}"
+    )
+
+
+async def main(args):
+    models = register_models(args)
+    print(f"{args.reports} reports of {args.sections} sections at concurrency {args.concurrency}, fast failure rate {args.fast_failure_rate}")
+    for policy in args.policies:
+        await run_policy(args, ModelRoutingPolicyEnum(policy), models)
+    print(f"peak rss         : {peak_rss_mb():8.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--policies", nargs="+", choices=[policy.value for policy in ModelRoutingPolicyEnum], default=[policy.value for policy in ModelRoutingPolicyEnum])
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--chunks", type=int, default=5, help="search results per section")
+    parser.add_argument("--tokens", type=int, default=300, help="tokens per section / review answer")
+    parser.add_argument("--short-tokens", type=int, default=40, help="tokens per query / ranking answer")
+    parser.add_argument("--smart-first-token-latency", type=float, default=0.8)
+    parser.add_argument("--smart-token-interval", type=float, default=0.02)
+    parser.add_argument("--fast-first-token-latency", type=float, default=0.25)
+    parser.add_argument("--fast-token-interval", type=float, default=0.006)
+    parser.add_argument("--fast-failure-rate", type=float, default=0.1, help="share of fast answers failing validation")
+    # USD per 1M tokens, gpt-4o / gpt-4o-mini list prices
+    parser.add_argument("--smart-price-in", type=float, default=2.5)
+    parser.add_argument("--smart-price-out", type=float, default=10.0)
+    parser.add_argument("--fast-price-in", type=float, default=0.15)
+    parser.add_argument("--fast-price-out", type=float, default=0.6)
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--result-chars", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,27 @@
+"""
+Placeholder settings for the offline benchmarks, the stand-ins never use them.
+
+Imported for its side effect before any app module, app.config reads the environment on import.
+"""
+import os
+
+PLACEHOLDERS = {
+    "AZURE_OPENAI_ENDPOINT": "https://benchmark.invalid",
+    "AZURE_OPENAI_API_KEY": "benchmark",
+    "AZURE_OPENAI_DEPLOYMENT_NAME": "gpt-4o",
+    "AZURE_OPENAI_API_VERSION": "2024-02-15-preview",
+    "AZURE_EMBEDDING_MODEL": "text-embedding-3-small",
+    "SMART_LLM_MODEL": "gpt-4o",
+    "FAST_LLM_MODEL": "gpt-4o-mini",
+    "AZURE_OPENAI_FAST_DEPLOYMENT_NAME": "gpt-4o-mini",
+    "AZURE_AI_SEARCH_API_KEY": "benchmark",
+    "AZURE_AI_SEARCH_API_VERSION": "2024-05-01-preview",
+    "TAVILY_API_KEY": "benchmark",
+    "EXA_API_KEY": "benchmark",
+    "LANGFUSE_SECRET_KEY": "benchmark",
+    "LANGFUSE_PUBLIC_KEY": "benchmark",
+    "LANGFUSE_HOST": "https://benchmark.invalid",
+}
+
+for name, value in PLACEHOLDERS.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,59 @@
+"""
+Streamed answer assembly: string concatenation vs. ResponseBuffer.
+
+    poetry run python -m benchmarks.response_buffer --token-size 4
+"""
+import argparse
+import time
+import tracemalloc
+from app.ai.streaming import ResponseBuffer
+
+ANSWER_SIZES = [2_000, 20_000, 200_000]
+
+
+def tokens(answer_size: int, token_size: int):
+    token = "x" * token_size
+    return [token] * (answer_size // token_size)
+
+
+class Holder:
+    # the agent loop keeps the answer on a frame that is also referenced elsewhere,
+    # which defeats CPython's in-place str concatenation
+    final_response = ""
+
+
+def concatenate(chunks):
+    holder = Holder()
+    for content in chunks:
+        holder.final_response = holder.final_response + content
+    return holder.final_response
+
+
+def buffer(chunks):
+    response = ResponseBuffer()
+    for content in chunks:
+        response.append(content)
+    return response.text
+
+
+def measure(fn, chunks):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(chunks)
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-size", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'chars':>8} {'concat ms':>10} {'concat KiB':>11} {'buffer ms':>10} {'buffer KiB':>11}")
+    for size in ANSWER_SIZES:
+        chunks = tokens(size, args.token_size)
+        concat_ms, concat_kib = measure(concatenate, chunks)
+        buffer_ms, buffer_kib = measure(buffer, chunks)
+        print(f"{size:>8} {concat_ms:>10.2f} {concat_kib:>11.1f} {buffer_ms:>10.2f} {buffer_kib:>11.1f}")
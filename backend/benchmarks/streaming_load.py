@@ -0,0 +1,157 @@
+"""
+Streaming load test: time to first byte, time to first token and inter-token gaps through the proxy.
+
+Runs concurrent clients against benchmarks.streaming_server (directly or through nginx):
+
+    docker compose -f docker-compose.loadtest.yml up --build --abort-on-container-exit
+
+    poetry run python -m benchmarks.streaming_load --url http://localhost:8080 --clients 50 --modes sse,sse-buffered,ndjson,ws
+
+Gaps are measured between received message frames, so proxy buffering shows up as a few large gaps
+instead of steady ones.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+import httpx
+import numpy as np
+import websockets
+
+PATHS = {
+    "sse": "/stream/sse",
+    "sse-buffered": "/stream/sse?buffered=1",
+    "ndjson": "/stream/ndjson",
+    "ws": "/stream/ws",
+}
+
+
+class ClientResult:
+    def __init__(self):
+        self.ttfb: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.gaps: List[float] = []
+        self.frames = 0
+        self.error: Optional[str] = None
+
+
+def is_message(line: str) -> bool:
+    line = line[len("data: "):] if line.startswith("data: ") else line
+    if not line.startswith("{"):
+        return False
+    return json.loads(line).get("type") == "message"
+
+
+async def http_client(client: httpx.AsyncClient, url: str) -> ClientResult:
+    result = ClientResult()
+    start = time.perf_counter()
+    last_token = None
+    pending = ""
+    try:
+        async with client.stream("GET", url) as response:
+            async for chunk in response.aiter_text():
+                now = time.perf_counter()
+                if result.ttfb is None:
+                    result.ttfb = now - start
+                # frames can be split across chunks
+                *lines, pending = (pending + chunk).split("\n")
+                for line in lines:
+                    if not line.strip() or not is_message(line):
+                        continue
+                    result.frames += 1
+                    if last_token is None:
+                        result.ttft = now - start
+                    else:
+                        result.gaps.append(now - last_token)
+                    last_token = now
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+async def ws_client(url: str) -> ClientResult:
+    result = ClientResult()
+    start = time.perf_counter()
+    last_token = None
+    try:
+        async with websockets.connect(url, compression="deflate") as websocket:
+            async for text in websocket:
+                now = time.perf_counter()
+                if result.ttfb is None:
+                    result.ttfb = now - start
+                if not is_message(text):
+                    continue
+                result.frames += 1
+                if last_token is None:
+                    result.ttft = now - start
+                else:
+                    result.gaps.append(now - last_token)
+                last_token = now
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": float("nan"), "p99": float("nan"), "max": float("nan")}
+    values = np.asarray(values) * 1000
+    return {"p50": np.percentile(values, 50), "p99": np.percentile(values, 99), "max": values.max()}
+
+
+async def run_mode(base_url: str, mode: str, clients: int, query: str) -> List[ClientResult]:
+    path = PATHS[mode]
+    url = f"{base_url}{path}{'&' if '?' in path else '?'}{query}"
+    if mode == "ws":
+        url = url.replace("http://", "ws://").replace("https://", "wss://")
+        return await asyncio.gather(*[ws_client(url) for _ in range(clients)])
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        return await asyncio.gather(*[http_client(client, url) for _ in range(clients)])
+
+
+async def wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(f"{url}{PATHS['sse']}?tokens=0&tool_delay=0")
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(1)
+
+
+async def main(url: str, clients: int, modes: List[str], query: str):
+    await wait_ready(url)
+    print(f"{'mode':<14} {'ok':>5} {'ttfb p50':>9} {'ttfb p99':>9} {'ttft p50':>9} {'ttft p99':>9} {'gap p50':>8} {'gap p99':>8} {'gap max':>8}  (ms)")
+    for mode in modes:
+        results = await run_mode(url, mode, clients, query)
+        ok = [result for result in results if result.error is None]
+        ttfb = percentiles([result.ttfb for result in ok if result.ttfb is not None])
+        ttft = percentiles([result.ttft for result in ok if result.ttft is not None])
+        gaps = percentiles([gap for result in ok for gap in result.gaps])
+        print(
+            f"{mode:<14} {len(ok):>5} {ttfb['p50']:>9.1f} {ttfb['p99']:>9.1f} {ttft['p50']:>9.1f} {ttft['p99']:>9.1f}"
+            f" {gaps['p50']:>8.1f} {gaps['p99']:>8.1f} {gaps['max']:>8.1f}"
+        )
+        for result in results:
+            if result.error is not None:
+                print(f"  error: {result.error}")
+                break
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--modes", default="sse,sse-buffered,ndjson,ws")
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--tool-delay", type=float, default=0.5)
+    parser.add_argument("--flush-interval", type=float, default=0.0)
+    args = parser.parse_args()
+    query = f"tokens={args.tokens}&token_interval={args.token_interval}&tool_delay={args.tool_delay}&flush_interval={args.flush_interval}"
+    asyncio.run(main(args.url, args.clients, args.modes.split(","), query))
@@ -0,0 +1,85 @@
+"""
+Agent streaming endpoints backed by a stubbed LLM, for the streaming load test.
+
+Same encoding / coalescing / heartbeat path as the real agent endpoints, with a fake agent that emits
+a tool call and then tokens at a fixed rate:
+
+    gunicorn -w 4 -k app.utils.workers.StreamingUvicornWorker -b 0.0.0.0:8000 benchmarks.streaming_server:app
+
+Endpoints, all with ?tokens=&token_interval=&tool_delay=&flush_interval=:
+
+    GET /stream/sse          SSE with X-Accel-Buffering: no
+    GET /stream/sse?buffered=1   SSE without the streaming headers, i.e. buffered by nginx
+    GET /stream/ndjson       NDJSON
+    WS  /stream/ws           one NDJSON text message per frame
+"""
+import asyncio
+from typing import AsyncIterator
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import StreamingResponse
+from app.ai.enums import AgentStreamingEventTypeEnum
+from app.ai.streaming import (
+    StreamingEvent,
+    StreamingEventEncoder,
+    coalesce_messages,
+    with_heartbeats,
+    stream_to_websocket,
+    STREAMING_HEADERS,
+    SSE,
+    NDJSON
+)
+
+app = FastAPI()
+
+
+async def stub_agent_events(tokens: int, token_interval: float, tool_delay: float) -> AsyncIterator[StreamingEvent]:
+    yield StreamingEvent(type=AgentStreamingEventTypeEnum.CHAIN_START, name="qa-agent")
+    yield StreamingEvent(type=AgentStreamingEventTypeEnum.TOOL_START, name="azure_ai_search_tool", input={"query": "load test"})
+    await asyncio.sleep(tool_delay)
+    yield StreamingEvent(type=AgentStreamingEventTypeEnum.TOOL_END, name="azure_ai_search_tool", output="stub results", duration=tool_delay)
+    content = []
+    for i in range(tokens):
+        await asyncio.sleep(token_interval)
+        token = f" token{i}"
+        content.append(token)
+        yield StreamingEvent(type=AgentStreamingEventTypeEnum.MESSAGE, content=token)
+    yield StreamingEvent(type=AgentStreamingEventTypeEnum.CAHIN_END, name="qa-agent", output="".join(content))
+
+
+async def encoded(format: str, tokens: int, token_interval: float, tool_delay: float, flush_interval: float) -> AsyncIterator[bytes]:
+    encoder = StreamingEventEncoder(format=format)
+    events = stub_agent_events(tokens, token_interval, tool_delay)
+    if flush_interval > 0:
+        events = coalesce_messages(events, flush_interval=flush_interval)
+    async for event in events:
+        yield encoder.encode(event)
+
+
+def streaming_response(format: str, buffered: bool, **kwargs) -> StreamingResponse:
+    encoder = StreamingEventEncoder(format=format)
+    return StreamingResponse(
+        with_heartbeats(encoded(format, **kwargs), heartbeat=encoder.heartbeat),
+        media_type=encoder.media_type,
+        headers=None if buffered else STREAMING_HEADERS
+    )
+
+
+@app.get("/stream/sse")
+async def stream_sse(tokens: int = 200, token_interval: float = 0.02, tool_delay: float = 0.5, flush_interval: float = 0.0, buffered: bool = False):
+    return streaming_response(SSE, buffered, tokens=tokens, token_interval=token_interval, tool_delay=tool_delay, flush_interval=flush_interval)
+
+
+@app.get("/stream/ndjson")
+async def stream_ndjson(tokens: int = 200, token_interval: float = 0.02, tool_delay: float = 0.5, flush_interval: float = 0.0, buffered: bool = False):
+    return streaming_response(NDJSON, buffered, tokens=tokens, token_interval=token_interval, tool_delay=tool_delay, flush_interval=flush_interval)
+
+
+@app.websocket("/stream/ws")
+async def stream_ws(websocket: WebSocket, tokens: int = 200, token_interval: float = 0.02, tool_delay: float = 0.5, flush_interval: float = 0.0):
+    await websocket.accept()
+    await stream_to_websocket(
+        websocket,
+        encoded(NDJSON, tokens=tokens, token_interval=token_interval, tool_delay=tool_delay, flush_interval=flush_interval),
+        encoder=StreamingEventEncoder(format=NDJSON)
+    )
+    await websocket.close()
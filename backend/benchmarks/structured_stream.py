@@ -0,0 +1,112 @@
+"""
+Report outline streaming: parse-at-the-end vs incremental parsing (app.ai.streaming.IncrementalJSONParser).
+
+A synthetic `generate_report` answer (JSON with sections, citations and chunk ids) is streamed in small
+tokens at `--token-interval`. Every section then needs a `generate_section_content` call of
+`--write-latency` seconds:
+
+- buffered: wait for the whole answer, json_repair it, then write all sections.
+- incremental: start writing each section as soon as it closes in the stream.
+
+    poetry run python -m benchmarks.structured_stream --sections 12 --token-interval 0.01
+
+Reports time to the first section, report completion time and parser CPU time per token and per MB.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import AsyncIterator, List
+import json_repair
+from app.ai.streaming.structured import IncrementalJSONParser, parse_stream
+
+SECTION_PATHS = ["sections[]"]
+
+
+def report_answer(sections: int, words: int, seed: int) -> str:
+    rng = random.Random(seed)
+    vocabulary = "market revenue growth customer segment analysis risk forecast quarter product region".split()
+    report = {
+        "title": "Synthetic report",
+        "sections": [
+            {
+                "title": f"Section {index}",
+                "summary": " ".join(rng.choice(vocabulary) for _ in range(words)),
+                "citations": [{"id": citation, "url": f"https://example.com/{citation}"} for citation in range(3)],
+                "chunk_ids": [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(3)],
+            }
+            for index in range(sections)
+        ],
+    }
+    return "```json\n" + json.dumps(report, indent=2) + "\n```"
+
+
+def tokens(text: str, size: int = 4) -> List[str]:
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+async def stream(parts: List[str], interval: float) -> AsyncIterator[str]:
+    for part in parts:
+        await asyncio.sleep(interval)
+        yield part
+
+
+async def write_section(section: dict, latency: float) -> str:
+    await asyncio.sleep(latency)
+    return section["title"]
+
+
+async def run_buffered(args, parts: List[str]):
+    start = time.perf_counter()
+    text = "".join([part async for part in stream(parts, args.token_interval)])
+    sections = json_repair.loads(text)["sections"]
+    first_section = time.perf_counter() - start
+    await asyncio.gather(*[write_section(section, args.write_latency) for section in sections])
+    return first_section, time.perf_counter() - start
+
+
+async def run_incremental(args, parts: List[str]):
+    start = time.perf_counter()
+    first_section = None
+    writes = []
+    async for item in parse_stream(stream(parts, args.token_interval), IncrementalJSONParser(SECTION_PATHS)):
+        if first_section is None:
+            first_section = time.perf_counter() - start
+        writes.append(asyncio.create_task(write_section(item.value, args.write_latency)))
+    await asyncio.gather(*writes)
+    return first_section, time.perf_counter() - start
+
+
+def parser_cpu(parts: List[str], repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        parser = IncrementalJSONParser(SECTION_PATHS + ["sections[].citations[]", "sections[].chunk_ids[]"])
+        for part in parts:
+            parser.feed(part)
+        parser.finish()
+    return (time.process_time() - start) / repeat
+
+
+async def main(args):
+    text = report_answer(args.sections, args.words, args.seed)
+    parts = tokens(text)
+    print(f"answer           : {len(text)} chars, {len(parts)} tokens, {len(parts) * args.token_interval:.2f}s to stream")
+    for name, runner in (("buffered", run_buffered), ("incremental", run_incremental)):
+        first_section, total = await runner(args, parts)
+        print(f"{name:<17}: first section {first_section * 1000:8.1f} ms   report done {total * 1000:8.1f} ms")
+    cpu = parser_cpu(parts, args.repeat)
+    print(f"parser cpu       : {cpu / len(parts) * 1e6:8.2f} us/token   {cpu / (len(text.encode()) / 2**20) * 1000:8.1f} ms/MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--words", type=int, default=120, help="words per section summary")
+    parser.add_argument("--token-interval", type=float, default=0.002)
+    parser.add_argument("--write-latency", type=float, default=3.0, help="seconds per section content call")
+    parser.add_argument("--repeat", type=int, default=20, help="runs of the parser cpu measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -8,6 +8,8 @@ from sqlmodel import SQLModel
 from alembic import context
 from app.config import get_settings
 from app.database.agent import *
+# columns / indexes added by the agent stack migrations
+from app.ai import tables
 
 # import models
 
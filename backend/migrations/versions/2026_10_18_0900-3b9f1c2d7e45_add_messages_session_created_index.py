@@ -0,0 +1,27 @@
+"""add messages session created index
+
+Revision ID: 3b9f1c2d7e45
+Revises: 7353787c3786
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9f1c2d7e45'
+down_revision: Union[str, None] = '7353787c3786'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_messages_session_id_created_at'), 'messages', ['session_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_messages_session_id_created_at'), table_name='messages')
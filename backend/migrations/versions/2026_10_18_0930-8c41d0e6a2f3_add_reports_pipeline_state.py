@@ -0,0 +1,27 @@
+"""add reports pipeline state
+
+Revision ID: 8c41d0e6a2f3
+Revises: 3b9f1c2d7e45
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d0e6a2f3'
+down_revision: Union[str, None] = '3b9f1c2d7e45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reports', sa.Column('pipeline_state', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('reports', 'pipeline_state')
@@ -0,0 +1,29 @@
+"""add chunks report and session indexes
+
+Revision ID: 5e7a92b4c1d8
+Revises: 8c41d0e6a2f3
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a92b4c1d8'
+down_revision: Union[str, None] = '8c41d0e6a2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_chunks_report_id'), 'chunks', ['report_id'], unique=False)
+    op.create_index(op.f('ix_chunks_session_id'), 'chunks', ['session_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_chunks_session_id'), table_name='chunks')
+    op.drop_index(op.f('ix_chunks_report_id'), table_name='chunks')
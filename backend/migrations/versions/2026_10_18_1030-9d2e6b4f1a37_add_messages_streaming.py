@@ -0,0 +1,27 @@
+"""add messages streaming
+
+Revision ID: 9d2e6b4f1a37
+Revises: 5e7a92b4c1d8
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2e6b4f1a37'
+down_revision: Union[str, None] = '5e7a92b4c1d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('streaming', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('messages', 'streaming')
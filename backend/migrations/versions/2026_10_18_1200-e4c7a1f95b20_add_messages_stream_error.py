@@ -0,0 +1,27 @@
+"""add messages stream error
+
+Revision ID: e4c7a1f95b20
+Revises: b6e3a8d1c2f4
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c7a1f95b20'
+down_revision: Union[str, None] = 'b6e3a8d1c2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('stream_error', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('messages', 'stream_error')
@@ -1,3 +1,8 @@
-#!/bin/bash
-alembic upgrade head
-poetry run gunicorn -w 4 -k uvicorn.workers.UvicornWorker -b 0.0.0.0:8000 -t 600 app.server:app --log-config ./config.ini --log-level debug
\ No newline at end of file
+#!/bin/bash
+alembic upgrade head
+# AGENT_METRICS_RESET=1 drops the metric snapshots of earlier runs
+if [ -n "${AGENT_METRICS_RESET}" ]; then
+    rm -rf "${AGENT_METRICS_DIR:-/tmp/agent_metrics}"
+fi
+# LOG_CONFIG=./config.async.ini for queued, batched logging
+poetry run gunicorn -w 4 -k app.utils.workers.StreamingUvicornWorker -b 0.0.0.0:8000 -t 600 app.server:app --log-config "${LOG_CONFIG:-./config.ini}" --log-level debug
\ No newline at end of file
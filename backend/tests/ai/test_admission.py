@@ -0,0 +1,155 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.ai.limits import AdmissionController, AdmissionTransport, SharedRateBudget, llm_request_context, INTERACTIVE, BACKGROUND
+
+
+class Body(httpx.AsyncByteStream):
+    """
+    Unread response body, like the one of a real connection.
+    """
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.fixture
+def controller(monkeypatch, tmp_path):
+    monkeypatch.setattr(AdmissionController, "state_dir", str(tmp_path))
+
+    def build(**kwargs):
+        return AdmissionController(**{"deployment": "gpt-4o", "rpm": 60_000, "tpm": 10_000_000, **kwargs})
+
+    return build
+
+
+@pytest.mark.anyio
+async def test_waiters_are_served_by_priority_then_round_robin_across_tenants(controller):
+    limits = controller(initial_concurrency=1, max_concurrency=1)
+    first = await limits.acquire("a", INTERACTIVE, tokens=10)
+    order = []
+
+    async def call(tenant, priority):
+        permit = await limits.acquire(tenant, priority, tokens=10)
+        order.append(tenant)
+        limits.release(permit, status_code=200, latency=0.1)
+
+    tasks = []
+    for tenant, priority in [("report", BACKGROUND), ("a", INTERACTIVE), ("a", INTERACTIVE), ("a", INTERACTIVE), ("b", INTERACTIVE)]:
+        tasks.append(asyncio.create_task(call(tenant, priority)))
+        await asyncio.sleep(0)
+    limits.release(first, status_code=200, latency=0.1)
+    await asyncio.gather(*tasks)
+
+    assert order == ["a", "b", "a", "a", "report"]
+    assert limits.stats()["active"] == 0
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiters_do_not_keep_a_slot(controller):
+    limits = controller(initial_concurrency=1, max_concurrency=1)
+    permit = await limits.acquire("a", INTERACTIVE, tokens=10)
+    cancelled = asyncio.create_task(limits.acquire("b", INTERACTIVE, tokens=10))
+    waiting = asyncio.create_task(limits.acquire("c", INTERACTIVE, tokens=10))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+
+    limits.release(permit, status_code=200, latency=0.1)
+
+    assert (await asyncio.wait_for(waiting, timeout=1)).tenant == "c"
+    assert limits.stats()["active"] == 1 and limits.stats()["waiting"] == 0
+
+
+def test_limit_grows_on_success_and_is_cut_once_per_congestion_signal(controller):
+    limits = controller(initial_concurrency=8, max_concurrency=64, latency_target=5)
+    permit = None
+
+    for _ in range(8):
+        limits.active += 1
+        limits.release(permit, status_code=200, latency=0.1)
+    assert 8.9 < limits.limit < 9.1
+
+    limits.active += 2
+    limits.release(permit, status_code=429, latency=0.1)
+    limits.release(permit, status_code=429, latency=0.1)
+    assert 4.4 < limits.limit < 4.6
+
+    limits._last_decrease = 0
+    limits.active += 1
+    limits.release(permit, status_code=200, latency=10)
+    assert 3.5 < limits.limit < 3.7
+
+
+def test_shared_budget_and_backoff_across_workers(tmp_path):
+    path = str(tmp_path / "gpt-4o")
+    worker = SharedRateBudget(path=path, rpm=60, tpm=60_000, burst_seconds=1)
+    other_worker = SharedRateBudget(path=path, rpm=60, tpm=60_000, burst_seconds=1)
+
+    assert worker.try_take(10) == 0
+    assert 0 < other_worker.try_take(10) <= 1
+
+    worker.backoff(30)
+    assert other_worker.try_take(10) > 29
+
+
+@pytest.mark.anyio
+async def test_transport_holds_the_slot_until_the_stream_closes(controller):
+    limits = controller()
+
+    def handler(request):
+        return httpx.Response(200, stream=Body(b"data: token\n\n"))
+
+    async with httpx.AsyncClient(transport=AdmissionTransport(limits, transport=httpx.MockTransport(handler))) as client:
+        with llm_request_context(tenant="tenant-1"):
+            async with client.stream("POST", "https://example.openai.azure.com/chat", json={"max_tokens": 10}) as response:
+                # headers are in, the body is not read yet
+                assert limits.stats()["active"] == 1
+                assert [chunk async for chunk in response.aiter_raw()] == [b"data: token\n\n"]
+        assert limits.stats()["active"] == 0
+        assert limits.stats()["admitted"] == 1
+
+
+@pytest.mark.anyio
+async def test_transport_backs_off_on_429(controller):
+    limits = controller(initial_concurrency=8)
+
+    def handler(request):
+        return httpx.Response(429, headers={"retry-after": "30"}, stream=Body(b"{}"))
+
+    async with httpx.AsyncClient(transport=AdmissionTransport(limits, transport=httpx.MockTransport(handler))) as client:
+        response = await client.post("https://example.openai.azure.com/chat", json={})
+
+    assert response.status_code == 429
+    assert limits.limit == 4
+    assert limits.budget.try_take(10) > 29
+
+
+@pytest.mark.anyio
+async def test_transport_backoff_does_not_block_the_event_loop(controller, monkeypatch):
+    limits = controller(initial_concurrency=8)
+    # another worker holding the budget file lock
+    monkeypatch.setattr(limits.budget, "backoff", lambda seconds: time.sleep(0.1))
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    def handler(request):
+        return httpx.Response(429, headers={"retry-after": "30"}, stream=Body(b"{}"))
+
+    ticker = asyncio.create_task(tick())
+    async with httpx.AsyncClient(transport=AdmissionTransport(limits, transport=httpx.MockTransport(handler))) as client:
+        response = await client.post("https://example.openai.azure.com/chat", json={})
+    ticker.cancel()
+
+    assert response.status_code == 429
+    assert ticks > 3
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+import pytest
+from app.ai.agents import registry
+from app.ai.agents.registry import AgentRegistry
+
+
+@pytest.fixture
+def azure_settings(monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "test")
+    monkeypatch.setattr(registry, "get_settings", lambda: SimpleNamespace(
+        AZURE_OPENAI_ENDPOINT="https://example.openai.azure.com",
+        AZURE_OPENAI_API_VERSION="2024-02-01",
+    ))
+    AgentRegistry.clear()
+    yield
+    AgentRegistry.clear()
+
+
+def test_named_models_share_the_deployment_connection_pool(azure_settings):
+    qa_model = AgentRegistry.get_model(model="gpt-4o", deployment="smart", name="qa-agent")
+    report_model = AgentRegistry.get_model(model="gpt-4o", deployment="smart", name="report-agent")
+
+    assert qa_model.name == "qa-agent"
+    assert report_model.name == "report-agent"
+    assert AgentRegistry.get_model(model="gpt-4o", deployment="smart", name="qa-agent") is qa_model
+    assert qa_model.http_async_client is report_model.http_async_client is AgentRegistry._http_clients["smart"]
+
+
+def test_tools_are_built_once_per_key(azure_settings):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return ["search"]
+
+    first = AgentRegistry.get_tools(key=("qa-agent", "tenant"), builder=build)
+    second = AgentRegistry.get_tools(key=("qa-agent", "tenant"), builder=build)
+
+    assert first is second
+    assert len(builds) == 1
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import pytest
+from app.ai.charts import ChartRenderer, normalize_chart_options
+
+OPTIONS = {"title": {"text": "Revenue"}, "series": [{"data": [1.0000001, 2.5]}]}
+
+
+@pytest.fixture
+def renderer(monkeypatch, tmp_path):
+    renders = []
+
+    async def render(cls, key, options, format, path):
+        renders.append(key)
+        await asyncio.sleep(0.05)
+        if options.get("fail"):
+            raise RuntimeError("export failed")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"image")
+
+    monkeypatch.setattr(ChartRenderer, "root_dir", str(tmp_path))
+    monkeypatch.setattr(ChartRenderer, "_inflight", {})
+    monkeypatch.setattr(ChartRenderer, "hits", 0)
+    monkeypatch.setattr(ChartRenderer, "misses", 0)
+    monkeypatch.setattr(ChartRenderer, "__render__", classmethod(render))
+    return renders
+
+
+def test_chart_key_ignores_key_order_and_float_noise():
+    reordered = {"series": [{"data": [1.0000002, 2.5]}], "title": {"text": "Revenue"}}
+
+    assert normalize_chart_options(OPTIONS) == normalize_chart_options(reordered)
+    assert ChartRenderer.chart_key(OPTIONS) == ChartRenderer.chart_key(reordered)
+    assert ChartRenderer.chart_key(OPTIONS, format="svg") != ChartRenderer.chart_key(OPTIONS)
+
+
+@pytest.mark.anyio
+async def test_duplicate_requests_share_one_render_and_then_hit_the_cache(renderer):
+    first, second = await asyncio.gather(ChartRenderer.render(OPTIONS), ChartRenderer.render(OPTIONS))
+
+    assert first == second and first.startswith(ChartRenderer.url_prefix)
+    assert await ChartRenderer.render(OPTIONS) == first
+    assert len(renderer) == 1
+    assert ChartRenderer.stats() == {"hits": 2, "misses": 1, "inflight": 0}
+
+
+@pytest.mark.anyio
+async def test_cancelled_first_requester_does_not_strand_waiters(renderer):
+    first = asyncio.create_task(ChartRenderer.render(OPTIONS))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(ChartRenderer.render(OPTIONS))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    url = await asyncio.wait_for(second, timeout=1)
+
+    assert os.path.exists(os.path.join(ChartRenderer.root_dir, *url[len(ChartRenderer.url_prefix) + 1:].split("/")))
+    assert len(renderer) == 1
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+@pytest.mark.anyio
+async def test_failed_render_raises_for_every_requester_and_is_retried(renderer):
+    options = {**OPTIONS, "fail": True}
+
+    results = await asyncio.gather(ChartRenderer.render(options), ChartRenderer.render(options), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    await asyncio.sleep(0)
+    assert ChartRenderer.stats()["inflight"] == 0
+    with pytest.raises(RuntimeError):
+        await ChartRenderer.render(options)
+    assert len(renderer) == 2
@@ -0,0 +1,144 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app.ai.agents.context import ConversationContextBuilder, MemorySummaryStore
+
+START = datetime(2026, 1, 1)
+
+
+def message(index: int, words: int = 20):
+    return SimpleNamespace(
+        uuid=uuid.uuid4(),
+        created_at=START + timedelta(minutes=index),
+        content=f"message {index} " + "word " * words
+    )
+
+
+class RecordingSummarizer:
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, summary, contents):
+        self.calls.append(contents)
+        return summary + "".join(content.split(" ")[1] + ";" for content in contents)
+
+
+def tokens_per_message() -> int:
+    return builder(token_budget=0).count_tokens(message(0))
+
+
+def builder(token_budget: int, summarizer=None, store=None) -> ConversationContextBuilder:
+    return ConversationContextBuilder(
+        token_budget=token_budget,
+        model="gpt-4o",
+        content_fn=lambda message: message.content,
+        summarizer=summarizer,
+        summary_store=store
+    )
+
+
+class History:
+    """
+    Message loader over a list of chronological messages, counting queries.
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.queries = 0
+
+    async def __call__(self, before=None, after=None, limit=10, oldest_first=False):
+        self.queries += 1
+        messages = [
+            message for message in self.messages
+            if (before is None or message.created_at < before) and (after is None or message.created_at > after)
+        ]
+        return messages[:limit] if oldest_first else messages[-limit:]
+
+
+@pytest.mark.anyio
+async def test_budget_decides_how_much_history_is_loaded():
+    messages = [message(index) for index in range(30)]
+    history = History(messages)
+
+    budget = sum(builder(token_budget=0).count_tokens(message) for message in messages[5:])
+
+    _, kept = await builder(token_budget=budget).build("session", history, page_size=10)
+
+    # pages back past the page size until the budget is used up
+    assert kept == messages[5:]
+    assert history.queries == 3
+
+
+@pytest.mark.anyio
+async def test_build_keeps_last_message_over_budget():
+    messages = [message(0), message(1, words=500)]
+
+    _, kept = await builder(token_budget=10).build("session", History(messages))
+
+    assert kept == messages[1:]
+
+
+@pytest.mark.anyio
+async def test_build_without_summarizer():
+    messages = [message(index) for index in range(10)]
+
+    summary, kept = await builder(token_budget=tokens_per_message() * 3).build("session", History(messages))
+
+    assert summary is None
+    assert kept == messages[7:]
+
+
+@pytest.mark.anyio
+async def test_build_folds_each_message_once():
+    summarizer = RecordingSummarizer()
+    store = MemorySummaryStore()
+    messages = [message(index) for index in range(10)]
+    budget = tokens_per_message() * 3
+
+    summary, _ = await builder(token_budget=budget, summarizer=summarizer, store=store).build("session", History(messages[:6]))
+    assert summary == "0;1;2;"
+
+    summary, _ = await builder(token_budget=budget, summarizer=summarizer, store=store).build("session", History(messages))
+    assert summary == "0;1;2;3;4;5;6;"
+
+    # a bigger window keeps messages that were folded already, they are not summarized again
+    summary, kept = await builder(token_budget=budget * 3, summarizer=summarizer, store=store).build("session", History(messages))
+    assert summary == "0;1;2;3;4;5;6;"
+    assert len(summarizer.calls) == 2
+    assert kept == messages[1:]
+
+
+@pytest.mark.anyio
+async def test_build_folds_history_beyond_the_page_in_order():
+    summarizer = RecordingSummarizer()
+    store = MemorySummaryStore()
+    messages = [message(index) for index in range(25)]
+
+    budget = sum(builder(token_budget=0).count_tokens(message) for message in messages[22:])
+
+    summary, kept = await builder(token_budget=budget, summarizer=summarizer, store=store).build(
+        "session", History(messages), page_size=10
+    )
+
+    # nothing between the summary and the kept messages is left out, one summarizer call per page
+    assert summary == "".join(f"{index};" for index in range(22))
+    assert [len(contents) for contents in summarizer.calls] == [10, 10, 2]
+    assert kept == messages[22:]
+    assert (await store.load("session"))[1] == messages[21].created_at
+
+
+@pytest.mark.anyio
+async def test_build_keeps_previous_summary_when_summarizer_fails():
+    async def failing(summary, contents):
+        raise RuntimeError("model down")
+
+    store = MemorySummaryStore()
+    await store.save("session", "earlier;", START)
+    messages = [message(index) for index in range(10)]
+
+    summary, kept = await builder(token_budget=tokens_per_message() * 3, summarizer=failing, store=store).build("session", History(messages))
+
+    assert summary == "earlier;"
+    assert kept
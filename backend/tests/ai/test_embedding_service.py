@@ -0,0 +1,142 @@
+import asyncio
+import os
+from typing import List
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from app.ai.embeddings.service import EmbeddingService, EmbeddingVectorCache, KEYS_FILE, VECTORS_FILE, DEFAULT_CACHE_DIR
+
+
+class CountingEmbeddings(Embeddings):
+
+    def __init__(self, delay: float = 0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.batches: List[List[str]] = []
+
+    @staticmethod
+    def vector(text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)))]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(list(texts))
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(list(texts))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("embedding call failed")
+        return [self.vector(text) for text in texts]
+
+
+def service(embeddings: Embeddings, cache_dir=None) -> EmbeddingService:
+    return EmbeddingService(embeddings=embeddings, namespace="test", cache_dir=cache_dir, batch_window=0.01)
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_share_one_deduplicated_call():
+    embeddings = CountingEmbeddings()
+    embedder = service(embeddings)
+
+    first, second = await asyncio.gather(
+        embedder.aembed_documents(["alpha", "beta"]),
+        embedder.aembed_documents(["beta", "gamma", "gamma"]),
+    )
+
+    assert embeddings.batches == [["alpha", "beta", "gamma"]]
+    assert first == [CountingEmbeddings.vector("alpha"), CountingEmbeddings.vector("beta")]
+    assert second == [CountingEmbeddings.vector(text) for text in ["beta", "gamma", "gamma"]]
+    assert await embedder.aembed_query("alpha") == CountingEmbeddings.vector("alpha")
+    assert len(embeddings.batches) == 1
+
+
+@pytest.mark.anyio
+async def test_cancelled_caller_does_not_cancel_other_waiters():
+    embedder = service(CountingEmbeddings(delay=0.1))
+
+    cancelled = asyncio.create_task(embedder.aembed_query("shared"))
+    waiting = asyncio.create_task(embedder.aembed_query("shared"))
+    await asyncio.sleep(0.02)
+    cancelled.cancel()
+
+    assert await waiting == CountingEmbeddings.vector("shared")
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+
+@pytest.mark.anyio
+async def test_failed_call_raises_for_every_waiter_and_is_not_cached():
+    embeddings = CountingEmbeddings(fail=True)
+    embedder = service(embeddings)
+
+    results = await asyncio.gather(embedder.aembed_query("a"), embedder.aembed_query("a"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    embeddings.fail = False
+    assert await embedder.aembed_query("a") == CountingEmbeddings.vector("a")
+    assert len(embeddings.batches) == 2
+
+
+def test_persisted_vectors_are_reused_after_a_restart(tmp_path):
+    embedder = service(CountingEmbeddings(), cache_dir=str(tmp_path))
+    vectors = embedder.embed_documents(["alpha", "beta"])
+    embedder.wait_persisted()
+
+    embeddings = CountingEmbeddings()
+    restarted = service(embeddings, cache_dir=str(tmp_path))
+
+    assert restarted.embed_documents(["beta", "alpha"]) == vectors[::-1]
+    assert embeddings.batches == []
+    assert restarted.stats()["hits"] == 2
+
+
+def test_own_appends_are_served_from_the_file_after_leaving_memory(tmp_path):
+    cache = EmbeddingVectorCache(cache_dir=str(tmp_path), max_memory_entries=1)
+    cache.persist({"a" * 64: np.array([1.0, 2.0], dtype=np.float32)})
+    cache.load()
+    # appended after the file was mapped
+    cache.persist({"b" * 64: np.array([3.0], dtype=np.float32), "c" * 64: np.array([4.0], dtype=np.float32)})
+    cache.put_many({"d" * 64: np.array([5.0], dtype=np.float32)})
+
+    assert cache.get("a" * 64).tolist() == [1.0, 2.0]
+    assert cache.get("b" * 64).tolist() == [3.0]
+    assert cache.get("c" * 64).tolist() == [4.0]
+
+
+def test_default_cache_dir_does_not_depend_on_the_working_directory():
+    assert os.path.isabs(DEFAULT_CACHE_DIR)
+
+
+def test_torn_writes_are_skipped_and_later_rows_stay_aligned(tmp_path):
+    cache = EmbeddingVectorCache(cache_dir=str(tmp_path))
+    cache.persist({"a" * 64: np.array([1.0, 2.0], dtype=np.float32)})
+    # a worker crashed halfway through a row and its key line
+    with open(os.path.join(tmp_path, VECTORS_FILE), "ab") as f:
+        f.write(b"\x01\x02")
+    with open(os.path.join(tmp_path, KEYS_FILE), "a") as f:
+        f.write("b" * 64 + " 2")
+    cache.persist({"c" * 64: np.array([3.0, 4.0, 5.0], dtype=np.float32)})
+
+    reloaded = EmbeddingVectorCache(cache_dir=str(tmp_path))
+    reloaded.load()
+
+    assert reloaded.get("a" * 64).tolist() == [1.0, 2.0]
+    assert reloaded.get("b" * 64) is None
+    assert reloaded.get("c" * 64).tolist() == [3.0, 4.0, 5.0]
+
+
+def test_key_lines_past_the_vectors_file_are_ignored(tmp_path):
+    cache = EmbeddingVectorCache(cache_dir=str(tmp_path))
+    cache.persist({"a" * 64: np.array([1.0], dtype=np.float32)})
+    with open(os.path.join(tmp_path, KEYS_FILE), "a") as f:
+        f.write("d" * 64 + " 4 4\n")
+
+    reloaded = EmbeddingVectorCache(cache_dir=str(tmp_path))
+    reloaded.load()
+
+    assert reloaded.get("a" * 64).tolist() == [1.0]
+    assert reloaded.get("d" * 64) is None
@@ -0,0 +1,101 @@
+import os
+import time
+from typing import List
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.embeddings import Embeddings
+from app.ai.cache import FaissIndexStore
+
+
+class LengthEmbeddings(Embeddings):
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), float(text.count("a")) + 1.0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(FaissIndexStore, "root_dir", str(tmp_path))
+    monkeypatch.setattr(FaissIndexStore, "_open", type(FaissIndexStore._open)())
+    monkeypatch.setattr(FaissIndexStore, "_locks", {})
+    monkeypatch.setattr(FaissIndexStore, "_last_cleanup", time.monotonic())
+    return FaissIndexStore
+
+
+def build(embeddings: Embeddings, calls: list):
+    async def _build() -> FAISS:
+        calls.append(1)
+        return FAISS.from_texts(
+            ["alpha", "banana", "cherry"],
+            embeddings,
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+            normalize_L2=True
+        )
+    return _build
+
+
+@pytest.mark.anyio
+async def test_index_is_built_once_and_reopened_with_its_settings(store):
+    embeddings = LengthEmbeddings()
+    calls = []
+
+    await store.get_or_build("session", "hash", embeddings, build(embeddings, calls))
+    store.evict("session")
+    vector_store = await store.get_or_build("session", "hash", embeddings, build(embeddings, calls))
+
+    assert calls == [1]
+    assert vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+    assert vector_store._normalize_L2 is True
+    assert vector_store.similarity_search("banana", k=1)[0].page_content == "banana"
+    assert os.listdir(os.path.join(store.root_dir, "session")) == ["hash"]
+
+
+@pytest.mark.anyio
+async def test_save_keeps_the_first_complete_index(store):
+    embeddings = LengthEmbeddings()
+    vector_store = await build(embeddings, [])()
+    path = os.path.join(store.root_dir, "session", "hash")
+
+    store.__save__(path, vector_store)
+    store.__save__(path, vector_store)
+
+    assert sorted(os.listdir(path)) == ["index.faiss", "index.json", "index.pkl"]
+    assert os.listdir(os.path.dirname(path)) == ["hash"]
+
+
+@pytest.mark.anyio
+async def test_cleanup_deletes_unused_indexes(store):
+    embeddings = LengthEmbeddings()
+    await store.get_or_build("old", "hash", embeddings, build(embeddings, []))
+    await store.get_or_build("new", "hash", embeddings, build(embeddings, []))
+    old_path = os.path.join(store.root_dir, "old", "hash")
+    os.utime(old_path, (time.time() - 100, time.time() - 100))
+    os.makedirs(os.path.join(store.root_dir, "new", "hash.tmp-abc"))
+    os.utime(os.path.join(store.root_dir, "new", "hash.tmp-abc"), (time.time() - 100, time.time() - 100))
+
+    assert store.cleanup(max_age=50) == 1
+
+    assert sorted(os.listdir(store.root_dir)) == ["new"]
+    assert os.listdir(os.path.join(store.root_dir, "new")) == ["hash"]
+
+
+@pytest.mark.anyio
+async def test_failed_build_releases_its_lock(store):
+    embeddings = LengthEmbeddings()
+    calls = []
+
+    async def failing():
+        raise RuntimeError("embeddings down")
+
+    with pytest.raises(RuntimeError):
+        await store.get_or_build("session", "hash", embeddings, failing)
+    assert store._locks == {}
+
+    # the next request builds again
+    await store.get_or_build("session", "hash", embeddings, build(embeddings, calls))
+    assert calls == [1]
+    assert store._locks == {}
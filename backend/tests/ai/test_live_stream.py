@@ -0,0 +1,220 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app.ai.agents import base
+from app.ai.agents.base import BaseAgent
+from app.ai.enums import AgentStreamingEventTypeEnum
+from app.ai.streaming import LiveStream, LiveStreams, ResponseBuffer, StreamingEvent, follow_persisted
+
+MESSAGE = AgentStreamingEventTypeEnum.MESSAGE
+CHAIN_START = AgentStreamingEventTypeEnum.CHAIN_START
+CHAIN_END = AgentStreamingEventTypeEnum.CAHIN_END
+ERROR = AgentStreamingEventTypeEnum.ERROR
+
+
+def message(content: str) -> StreamingEvent:
+    return StreamingEvent(type=MESSAGE, content=content)
+
+
+async def contents(events):
+    return [event.content async for event in events]
+
+
+@pytest.mark.anyio
+async def test_late_subscriber_gets_history_then_live_events():
+    stream = LiveStream(message_id="m1")
+    stream.publish(message("a"))
+
+    early = asyncio.create_task(contents(stream.subscribe()))
+    await asyncio.sleep(0)
+    stream.publish(message("b"))
+    late = asyncio.create_task(contents(stream.subscribe()))
+    await asyncio.sleep(0)
+    stream.publish(message("c"))
+    stream.close()
+
+    assert await early == ["a", "b", "c"]
+    assert await late == ["a", "b", "c"]
+    assert await contents(stream.subscribe()) == ["a", "b", "c"]
+
+
+@pytest.mark.anyio
+async def test_closed_streams_are_dropped_after_a_while(monkeypatch):
+    monkeypatch.setattr(LiveStreams, "keep_after_close", 0.01)
+    stream = LiveStreams.open("m2")
+
+    LiveStreams.close(stream)
+    assert LiveStreams.get("m2") is stream
+    await asyncio.sleep(0.05)
+
+    assert LiveStreams.get("m2") is None
+
+
+class FakeEngine:
+    """
+    Engine whose message row changes on every poll.
+    """
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def connect(self):
+        engine = self
+
+        class Connection:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def execute(self, statement, params):
+                row = engine.rows.pop(0) if len(engine.rows) > 1 else engine.rows[0]
+                return SimpleNamespace(first=lambda: row)
+
+        return Connection()
+
+
+def row(content, streaming, age=0, error=None):
+    return SimpleNamespace(
+        content=content,
+        streaming=streaming,
+        stream_error=error,
+        updated_at=datetime.utcnow() - timedelta(seconds=age)
+    )
+
+
+@pytest.mark.anyio
+async def test_follow_persisted_sends_appended_content_until_complete():
+    engine = FakeEngine([row("The", True), row("The", True), row("The answer", True), row("The answer.", False)])
+
+    events = [event async for event in follow_persisted(engine=engine, message_id="m3", poll_interval=0)]
+
+    assert [(event.type, event.content) for event in events[:-1]] == [(MESSAGE, "The"), (MESSAGE, " answer"), (MESSAGE, ".")]
+    assert events[-1].type is CHAIN_END and events[-1].output == "The answer."
+
+
+@pytest.mark.anyio
+async def test_follow_persisted_ends_failed_messages_with_an_error():
+    engine = FakeEngine([row("The", True), row("The ans", False, error="Agent run failed: model call failed")])
+
+    events = [event async for event in follow_persisted(engine=engine, message_id="m3", poll_interval=0)]
+
+    assert [(event.type, event.content) for event in events] == [
+        (MESSAGE, "The"), (MESSAGE, " ans"), (ERROR, "Agent run failed: model call failed")
+    ]
+
+
+@pytest.mark.anyio
+async def test_follow_persisted_fails_for_abandoned_messages():
+    engine = FakeEngine([row("The", True, age=60)])
+
+    with pytest.raises(RuntimeError):
+        await contents(follow_persisted(engine=engine, message_id="m4", poll_interval=0, stale_after=30))
+
+
+class FakeWriter:
+    finished = []
+
+    def __init__(self, engine, flush_interval):
+        self.appended = []
+
+    async def start(self, session_id, type):
+        return "m5"
+
+    def append(self, content):
+        self.appended.append(content)
+
+    async def finish(self, content, error=None):
+        FakeWriter.finished.append((content, error))
+
+
+class LiveAgent(BaseAgent):
+    """
+    Agent without model or database, streams a fixed answer.
+    """
+
+    def __init__(self, fail: bool = False, hang: bool = False):
+        self.db_session = SimpleNamespace(bind=None)
+        self.response = ResponseBuffer()
+        self.persist_interval = 1.0
+        self.fail = fail
+        self.hang = hang
+        self.released = asyncio.Event()
+
+    async def __get_last_messages__(self, session_id, number_of_messages):
+        return []
+
+    async def __stream_agent_events__(self, agent_name, agent_executor, messages, save_to_session_id=None):
+        yield StreamingEvent(type=CHAIN_START, name=agent_name)
+        await self.released.wait()
+        for content in ["The ", "answer"]:
+            self.response.append(content)
+            yield message(content)
+        if self.fail:
+            raise RuntimeError("model call failed")
+        if self.hang:
+            await asyncio.Event().wait()
+        yield StreamingEvent(type=CHAIN_END, name=agent_name, output=self.response.text)
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    FakeWriter.finished = []
+    monkeypatch.setattr(base, "StreamingMessageWriter", FakeWriter)
+    return FakeWriter
+
+
+@pytest.mark.anyio
+async def test_live_run_continues_after_the_client_disconnects(writer):
+    agent = LiveAgent()
+    events = agent.__stream_live_agent_events__(agent_name="qa-agent", agent_executor=None, messages=[], session_id="s1")
+
+    first = await events.__anext__()
+    assert first.type is CHAIN_START and first.message_id == "m5"
+    await events.aclose()
+    agent.released.set()
+    await asyncio.gather(*BaseAgent._live_tasks)
+
+    # saved once, as complete
+    assert writer.finished == [("The answer", None)]
+    resumed = [event async for event in agent.__resume_stream__("m5")]
+    assert [event.type for event in resumed] == [CHAIN_START, MESSAGE, MESSAGE, CHAIN_END]
+    assert resumed[-1].message_id == "m5"
+
+
+@pytest.mark.anyio
+async def test_live_run_failure_reaches_the_subscriber_and_keeps_partial_answer(writer):
+    agent = LiveAgent(fail=True)
+    agent.released.set()
+
+    received = []
+    with pytest.raises(RuntimeError):
+        async for event in agent.__stream_live_agent_events__(agent_name="qa-agent", agent_executor=None, messages=[], session_id="s1"):
+            received.append(event)
+
+    assert writer.finished == [("The answer", "Agent run failed: model call failed")]
+    assert received[-1].type is ERROR and received[-1].content == "Agent run failed: model call failed"
+    # followers in this worker get the error event too
+    resumed = [event async for event in agent.__resume_stream__("m5")]
+    assert [event.type for event in resumed] == [CHAIN_START, MESSAGE, MESSAGE, ERROR]
+    # done callbacks run on the next loop iteration
+    await asyncio.sleep(0)
+    assert not BaseAgent._live_tasks
+
+
+@pytest.mark.anyio
+async def test_cancelled_live_run_is_saved_as_failed(writer):
+    agent = LiveAgent(hang=True)
+    agent.released.set()
+    events = agent.__stream_live_agent_events__(agent_name="qa-agent", agent_executor=None, messages=[], session_id="s1")
+    await events.__anext__()
+    await asyncio.sleep(0.01)
+
+    for task in list(BaseAgent._live_tasks):
+        task.cancel()
+    await asyncio.sleep(0.01)
+
+    assert writer.finished == [("The answer", "Agent run was cancelled")]
+    await events.aclose()
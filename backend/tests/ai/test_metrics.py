@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from langchain_core.messages import AIMessage, AIMessageChunk
+import pytest
+from app.ai.metrics import MetricsStore, AgentRunMetrics, RUN_DURATION, LLM_TOKENS
+from app.ai.metrics.store import worker_key
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(MetricsStore, "directory", str(tmp_path))
+    MetricsStore.clear()
+    yield MetricsStore
+    MetricsStore.clear()
+
+
+def histogram_series(name: str) -> list:
+    return list(MetricsStore._histograms[name])
+
+
+def counter_values(name: str) -> dict:
+    return dict(MetricsStore._counters[name])
+
+
+def write_snapshot(store, key: str, tokens: int, age: float = 0.0):
+    path = os.path.join(store.directory, f"{key}.json")
+    with open(path, "w") as f:
+        f.write('{"histograms": {}, "counters": {"%s": [[[["agent", "qa-agent"], ["direction", "in"], ["tenant", "t"]], %d]]}}' % (LLM_TOKENS, tokens))
+    os.utime(path, (time.time() - age, time.time() - age))
+
+
+def test_render_sums_worker_snapshots(store):
+    store.inc(LLM_TOKENS, 5, tenant="t", agent="qa-agent", direction="in")
+    store.observe(RUN_DURATION, 0.3, agent="qa-agent", status="ok")
+    store.write()
+    write_snapshot(store, "999999-1", 7)
+
+    text = store.render()
+
+    assert f'{LLM_TOKENS}{{agent="qa-agent",direction="in",tenant="t"}} 12.0' in text
+    assert f'{RUN_DURATION}_bucket{{agent="qa-agent",status="ok",le="0.5"}} 1.0' in text
+    assert f'{RUN_DURATION}_count{{agent="qa-agent",status="ok"}} 1.0' in text
+
+
+def test_concurrent_writes_leave_a_complete_snapshot(store):
+    errors = []
+
+    def write():
+        try:
+            for index in range(50):
+                store.inc(LLM_TOKENS, 1, tenant="t", agent="qa-agent", direction="out")
+                store.write()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store._dirty = True
+    store.write()
+
+    assert errors == []
+    assert os.listdir(store.directory) == [f"{worker_key(os.getpid())}.json"]
+    assert f'{LLM_TOKENS}{{agent="qa-agent",direction="out",tenant="t"}} 200.0' in store.render()
+
+
+def test_snapshots_of_exited_workers_are_dropped_after_retention(store, monkeypatch):
+    monkeypatch.setattr(MetricsStore, "dead_worker_retention", 60)
+    pid, start = worker_key(os.getpid()).split("-")
+    store.inc(LLM_TOKENS, 1, tenant="t", agent="qa-agent", direction="in")
+    # an exited worker that had this pid, a recently exited worker and a long gone one
+    write_snapshot(store, f"{pid}-{int(start) - 1}", 10, age=120)
+    write_snapshot(store, "999999-1", 100)
+    write_snapshot(store, "999998-1", 1000, age=120)
+    write_snapshot(store, "999997", 10000, age=120)
+
+    text = store.render()
+
+    assert f'{LLM_TOKENS}{{agent="qa-agent",direction="in",tenant="t"}} 101.0' in text
+    assert sorted(os.listdir(store.directory)) == sorted([f"{pid}-{start}.json", "999999-1.json"])
+
+
+def test_run_metrics_without_tenant_labels(store, monkeypatch):
+    monkeypatch.setattr(AgentRunMetrics, "tenant_labels", False)
+    metrics = AgentRunMetrics(tenant="t", agent="qa-agent")
+
+    metrics.on_event({"event": "on_chat_model_start", "run_id": "llm", "data": {"input": {"messages": []}}})
+    metrics.on_event({"event": "on_chat_model_stream", "run_id": "llm", "data": {"chunk": AIMessageChunk(content="a")}})
+    metrics.on_event({"event": "on_chat_model_end", "run_id": "llm", "data": {"output": {
+        "generations": [[{"message": AIMessage(content="a", usage_metadata={"input_tokens": 9, "output_tokens": 3, "total_tokens": 12})}]]
+    }}})
+    metrics.finish()
+    metrics.finish(status="error")
+
+    assert histogram_series(RUN_DURATION) == [(("agent", "qa-agent"), ("status", "ok"))]
+    assert counter_values(LLM_TOKENS) == {
+        (("agent", "qa-agent"), ("direction", "in")): 9,
+        (("agent", "qa-agent"), ("direction", "out")): 3,
+    }
+
+
+def test_run_metrics_tenant_labels_opt_in(store, monkeypatch):
+    monkeypatch.setattr(AgentRunMetrics, "tenant_labels", True)
+    metrics = AgentRunMetrics(tenant="t", agent="qa-agent")
+
+    metrics.on_event({"event": "on_chat_model_start", "run_id": "llm", "data": {"input": {"messages": []}}})
+    metrics.on_event({"event": "on_chat_model_end", "run_id": "llm", "data": {"output": {
+        "generations": [[{"message": AIMessage(content="a", usage_metadata={"input_tokens": 9, "output_tokens": 3, "total_tokens": 12})}]]
+    }}})
+    metrics.finish(status="cancelled")
+
+    assert histogram_series(RUN_DURATION) == [(("agent", "qa-agent"), ("status", "cancelled"), ("tenant", "t"))]
+    assert counter_values(LLM_TOKENS)[(("agent", "qa-agent"), ("direction", "in"), ("tenant", "t"))] == 9
+
+
+def test_run_metrics_count_streamed_tokens_without_usage(store, monkeypatch):
+    monkeypatch.setattr(AgentRunMetrics, "tenant_labels", True)
+    metrics = AgentRunMetrics(tenant="t", agent="qa-agent")
+
+    metrics.on_event({"event": "on_chat_model_start", "run_id": "llm", "data": {"input": {"messages": []}}})
+    for _ in range(4):
+        metrics.on_event({"event": "on_chat_model_stream", "run_id": "llm", "data": {"chunk": AIMessageChunk(content="a")}})
+    metrics.on_event({"event": "on_chat_model_end", "run_id": "llm", "data": {"output": {"generations": [[{"message": AIMessage(content="aaaa")}]]}}})
+
+    assert counter_values(LLM_TOKENS)[(("agent", "qa-agent"), ("direction", "out"), ("tenant", "t"))] == 4
@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+import pytest
+from langchain_core.messages import AIMessage
+from app.ai.agents import router
+from app.ai.agents import ModelRouter
+from app.ai.agents.registry import AgentRegistry
+from app.ai.agents.router import valid_json
+from app.ai.enums import ModelTierEnum, ModelRoutingPolicyEnum
+from app.ai.metrics import MetricsStore
+
+
+class ScriptedModel:
+    """
+    Chat model stand-in answering `answer`, or raising `error`, and keeping its inputs.
+    """
+
+    def __init__(self, answer: str, error: Exception = None):
+        self.answer = answer
+        self.error = error
+        self.inputs = []
+
+    async def ainvoke(self, input, config=None):
+        self.inputs.append(input)
+        if self.error is not None:
+            raise self.error
+        return AIMessage(content=self.answer)
+
+
+@pytest.fixture
+def models(monkeypatch, tmp_path):
+    monkeypatch.setattr(router, "get_settings", lambda: SimpleNamespace(
+        SMART_LLM_MODEL="gpt-4o",
+        FAST_LLM_MODEL="gpt-4o-mini",
+        AZURE_OPENAI_DEPLOYMENT_NAME="smart",
+    ))
+    monkeypatch.setenv("AZURE_OPENAI_FAST_DEPLOYMENT_NAME", "fast")
+    monkeypatch.delenv("LLM_ROUTING_POLICY", raising=False)
+    monkeypatch.setattr(MetricsStore, "directory", str(tmp_path))
+    monkeypatch.setattr(ModelRouter, "policy", None)
+    monkeypatch.setattr(ModelRouter, "calls", {tier: 0 for tier in ModelTierEnum})
+    monkeypatch.setattr(ModelRouter, "escalations", 0)
+    AgentRegistry.clear()
+    models = {ModelTierEnum.FAST: ScriptedModel('["fast query"]'), ModelTierEnum.SMART: ScriptedModel('["smart query"]')}
+    for tier, model in models.items():
+        AgentRegistry.register_model(model=ModelRouter.model_name(tier), deployment=ModelRouter.deployment(tier), client=model)
+    yield models
+    AgentRegistry.clear()
+
+
+def test_policy_picks_the_tier_of_a_prompt(models, monkeypatch):
+    routes = {}
+    for policy in ModelRoutingPolicyEnum:
+        monkeypatch.setattr(ModelRouter, "policy", policy)
+        routes[policy] = (ModelRouter.route("get-rag-queries"), ModelRouter.route("generate-section-content"))
+
+    assert routes == {
+        ModelRoutingPolicyEnum.SMART: (ModelTierEnum.SMART, ModelTierEnum.SMART),
+        ModelRoutingPolicyEnum.TIERED: (ModelTierEnum.FAST, ModelTierEnum.SMART),
+        ModelRoutingPolicyEnum.CASCADE: (ModelTierEnum.FAST, ModelTierEnum.SMART),
+    }
+
+
+def test_policy_comes_from_the_settings_and_needs_a_fast_deployment(models, monkeypatch):
+    assert ModelRouter.current_policy() == ModelRoutingPolicyEnum.SMART
+
+    monkeypatch.setenv("LLM_ROUTING_POLICY", "tiered")
+    assert ModelRouter.route("get-rag-queries") == ModelTierEnum.FAST
+
+    monkeypatch.delenv("AZURE_OPENAI_FAST_DEPLOYMENT_NAME")
+    assert ModelRouter.route("get-rag-queries") == ModelTierEnum.SMART
+    assert ModelRouter.get_model(ModelTierEnum.FAST) is models[ModelTierEnum.SMART]
+
+
+@pytest.mark.anyio
+async def test_cascade_retries_invalid_fast_answers_on_the_smart_model(models, monkeypatch):
+    monkeypatch.setattr(ModelRouter, "policy", ModelRoutingPolicyEnum.CASCADE)
+
+    valid = await ModelRouter.ainvoke("get-rag-queries", "topic", validate=valid_json())
+    models[ModelTierEnum.FAST].answer = "no queries"
+    escalated = await ModelRouter.ainvoke("get-rag-queries", "topic", validate=valid_json())
+
+    assert valid.content == '["fast query"]'
+    assert escalated.content == '["smart query"]'
+    assert models[ModelTierEnum.SMART].inputs == ["topic"]
+    assert ModelRouter.stats() == {"fast_calls": 2, "smart_calls": 1, "escalations": 1}
+
+
+@pytest.mark.anyio
+async def test_tiered_keeps_invalid_fast_answers(models, monkeypatch):
+    monkeypatch.setattr(ModelRouter, "policy", ModelRoutingPolicyEnum.TIERED)
+    models[ModelTierEnum.FAST].answer = "no queries"
+
+    response = await ModelRouter.ainvoke("get-rag-queries", "topic", validate=valid_json())
+
+    assert response.content == "no queries"
+    assert ModelRouter.stats() == {"fast_calls": 1, "smart_calls": 0, "escalations": 0}
+
+
+@pytest.mark.anyio
+async def test_fast_model_errors_are_retried_on_the_smart_model(models, monkeypatch):
+    monkeypatch.setattr(ModelRouter, "policy", ModelRoutingPolicyEnum.TIERED)
+    models[ModelTierEnum.FAST].error = TimeoutError("fast deployment timed out")
+
+    response = await ModelRouter.ainvoke("get-rag-queries", "topic")
+
+    assert response.content == '["smart query"]'
+    assert ModelRouter.stats() == {"fast_calls": 1, "smart_calls": 1, "escalations": 1}
+
+
+@pytest.mark.anyio
+async def test_smart_model_errors_are_raised(models, monkeypatch):
+    monkeypatch.setattr(ModelRouter, "policy", ModelRoutingPolicyEnum.CASCADE)
+    models[ModelTierEnum.SMART].error = TimeoutError("smart deployment timed out")
+
+    with pytest.raises(TimeoutError):
+        await ModelRouter.ainvoke("generate-section-content", "section")
+
+    assert ModelRouter.stats()["escalations"] == 0
+    ModelRouter.reset_stats()
+    assert ModelRouter.stats() == {"fast_calls": 0, "smart_calls": 0, "escalations": 0}
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from app.ai.pipeline import CheckpointStore, MemoryCheckpointStore
+from app.ai.pipeline.checkpoint import encode_checkpoint
+from app.ai.pipeline.dag import PipelineRun, Stage
+
+
+def test_checkpoint_store_requires_load_and_save():
+    with pytest.raises(TypeError):
+        CheckpointStore()
+
+
+@pytest.mark.parametrize("output", [(1, 2), {1: "a"}, float("nan"), object(), {"sections": [{"id": (1,)}]}])
+def test_encode_rejects_outputs_that_change_on_resume(output):
+    with pytest.raises(TypeError, match="outline"):
+        encode_checkpoint("outline", output)
+
+
+def test_encode_keeps_json_values():
+    output = {"title": "Report", "sections": [{"id": 1, "score": 0.5, "chunks": ["a", None], "done": True}]}
+
+    assert encode_checkpoint("outline", output) == '{"title": "Report", "sections": [{"id": 1, "score": 0.5, "chunks": ["a", null], "done": true}]}'
+
+
+def pipeline(calls: list, checkpoint: CheckpointStore, fail_section: int = -1) -> PipelineRun:
+    async def outline(inputs):
+        calls.append("outline")
+        return ["intro", "market", "risks"]
+
+    async def sections(inputs):
+        async def write(title):
+            calls.append(title)
+            if title == inputs["outline"][fail_section]:
+                raise RuntimeError("model down")
+            return f"{title} text"
+        return await run.map("section", write, inputs["outline"])
+
+    run = PipelineRun(
+        stages=[
+            Stage("outline", outline, llm=True),
+            Stage("sections", sections, deps=["outline"]),
+        ],
+        checkpoint=checkpoint
+    )
+    return run
+
+
+@pytest.mark.anyio
+async def test_resumed_run_restores_finished_stages_and_items():
+    checkpoint = MemoryCheckpointStore()
+    calls = []
+
+    with pytest.raises(RuntimeError):
+        await pipeline(calls, checkpoint, fail_section=1).run()
+    assert sorted(checkpoint.outputs) == ["outline", "section[0]", "section[2]"]
+
+    calls.clear()
+    run = pipeline(calls, checkpoint)
+    outputs = await run.run()
+
+    assert calls == ["market"]
+    assert outputs["sections"] == ["intro text", "market text", "risks text"]
+    assert run.timings["outline"].restored and not run.timings["section[1]"].restored
+
+
+@pytest.mark.anyio
+async def test_stage_with_unserializable_output_fails():
+    async def outline(inputs):
+        return ("intro", "market")
+
+    run = PipelineRun(stages=[Stage("outline", outline)], checkpoint=MemoryCheckpointStore())
+
+    with pytest.raises(TypeError, match="outline"):
+        await run.run()
+
+
+def test_pipeline_rejects_cycles_and_unknown_stages():
+    async def noop(inputs):
+        return None
+
+    with pytest.raises(ValueError, match="cycle"):
+        PipelineRun(stages=[Stage("a", noop, deps=["b"]), Stage("b", noop, deps=["a"])])
+    with pytest.raises(ValueError, match="Unknown"):
+        PipelineRun(stages=[Stage("a", noop, deps=["missing"])])
+
+
+@pytest.mark.anyio
+async def test_map_is_rejected_in_llm_stages():
+    async def sections(inputs):
+        return await run.map("section", noop_item, ["intro"])
+
+    async def noop_item(item):
+        return item
+
+    run = PipelineRun(stages=[Stage("sections", sections, llm=True)])
+
+    with pytest.raises(RuntimeError, match="llm=False"):
+        await run.run()
+
+
+def test_llm_semaphore_is_kept_per_live_loop(monkeypatch):
+    monkeypatch.setattr(PipelineRun, "llm_concurrency", 1)
+
+    async def contended():
+        semaphore = PipelineRun.llm_semaphore()
+        async with semaphore:
+            waiter = asyncio.ensure_future(semaphore.acquire())
+            await asyncio.sleep(0)
+        await waiter
+        semaphore.release()
+        return semaphore
+
+    loops = [asyncio.new_event_loop() for _ in range(2)]
+    first = loops[0].run_until_complete(contended())
+    assert loops[0].run_until_complete(contended()) is first
+    loops[0].close()
+
+    loops[1].run_until_complete(contended())
+    loops[1].close()
+
+    assert loops[0] not in PipelineRun._llm_semaphores
@@ -0,0 +1,46 @@
+import numpy as np
+from app.ai.pipeline import PrefilterConfig, rank_chunks
+
+QUERY = np.array([[1.0, 0.0, 0.0]])
+
+
+def chunk(similarity: float, side: int = 1) -> list:
+    vector = [0.0, 0.0, 0.0]
+    vector[0] = similarity
+    vector[side] = float(np.sqrt(1 - similarity ** 2))
+    return vector
+
+
+def test_ranks_by_similarity_and_drops_unrelated_chunks():
+    chunks = np.array([chunk(0.5), chunk(0.9), chunk(0.1), chunk(0.7, side=2)])
+
+    assert rank_chunks(chunks, QUERY, PrefilterConfig(min_similarity=0.2)) == [1, 3, 0]
+
+
+def test_drops_near_duplicates_and_keeps_top_k():
+    chunks = np.array([chunk(0.9), chunk(0.9), chunk(0.8, side=2), chunk(0.5)])
+
+    assert rank_chunks(chunks, QUERY, PrefilterConfig(top_k=2)) == [0, 2]
+
+
+def test_retriever_scores_on_another_scale_do_not_dominate():
+    # hybrid search scores can exceed 1, the raw max would put chunk 1 first
+    chunks = np.array([chunk(0.9), chunk(0.3), chunk(0.6, side=2)])
+    vector_scores = np.array([2.5, 3.0, np.nan], dtype=np.float32)
+
+    assert rank_chunks(chunks, QUERY, PrefilterConfig(), vector_scores)[0] == 0
+
+
+def test_retriever_scores_break_embedding_ties():
+    chunks = np.array([chunk(0.8), chunk(0.8, side=2), chunk(0.5)])
+    vector_scores = np.array([0.1, 0.9, 0.5], dtype=np.float32)
+
+    assert rank_chunks(chunks, QUERY, PrefilterConfig(), vector_scores) == [1, 0, 2]
+
+
+def test_unknown_retriever_scores_rank_by_similarity():
+    chunks = np.array([chunk(0.5), chunk(0.9)])
+    vector_scores = np.array([np.nan, np.nan], dtype=np.float32)
+
+    assert rank_chunks(chunks, QUERY, PrefilterConfig(), vector_scores) == [1, 0]
+    assert rank_chunks(np.zeros((0, 3)), QUERY, PrefilterConfig()) == []
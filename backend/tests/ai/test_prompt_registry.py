@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.ai.prompts import registry
+from app.ai.prompts import PromptRegistry
+
+
+class FakeLangFuse:
+    """
+    Langfuse prompts: `versions[name]` is the current text, `down` makes every fetch fail.
+    """
+    versions = {}
+    fetches = []
+    down = False
+    delay = 0.0
+
+    def get_prompt_str(self, name):
+        FakeLangFuse.fetches.append(name)
+        time.sleep(FakeLangFuse.delay)
+        if FakeLangFuse.down:
+            raise ConnectionError("langfuse is down")
+        return FakeLangFuse.versions[name]
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    FakeLangFuse.versions = {"qa-agent-prompt": "v1", "order-chunks": "order"}
+    FakeLangFuse.fetches = []
+    FakeLangFuse.down = False
+    FakeLangFuse.delay = 0.0
+    monkeypatch.setattr(registry, "LangFuseClient", FakeLangFuse)
+    monkeypatch.setattr(PromptRegistry, "_prompts", {})
+    monkeypatch.setattr(PromptRegistry, "_refreshing", set())
+    monkeypatch.setattr(PromptRegistry, "_inflight", {})
+    # no warmup thread unless a test starts it
+    monkeypatch.setattr(PromptRegistry, "_warmed_up", True)
+    for counter in ("hits", "misses", "stale_hits", "refreshes", "refresh_errors"):
+        monkeypatch.setattr(PromptRegistry, counter, 0)
+    return PromptRegistry
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_prompts_are_fetched_once_and_served_from_memory(prompts):
+    assert prompts.get_prompt_str("qa-agent-prompt") == "v1"
+    assert prompts.get_prompt_str("qa-agent-prompt") == "v1"
+
+    assert FakeLangFuse.fetches == ["qa-agent-prompt"]
+    assert prompts.stats() == {"size": 1, "hits": 1, "misses": 1, "stale_hits": 0, "refreshes": 1, "refresh_errors": 0}
+
+
+def test_stale_prompt_is_served_while_it_refreshes(prompts, monkeypatch):
+    prompts.get_prompt_str("qa-agent-prompt")
+    monkeypatch.setattr(PromptRegistry, "ttl", 0)
+    FakeLangFuse.versions["qa-agent-prompt"] = "v2"
+
+    assert prompts.get_prompt_str("qa-agent-prompt") == "v1"
+    wait_for(lambda: prompts.stats()["refreshes"] == 2)
+
+    assert prompts.get_prompt_str("qa-agent-prompt") == "v2"
+    assert prompts.stats()["stale_hits"] >= 1
+
+
+def test_last_good_copy_is_served_while_langfuse_is_down(prompts, monkeypatch):
+    prompts.get_prompt_str("qa-agent-prompt")
+    monkeypatch.setattr(PromptRegistry, "ttl", 10)
+    monkeypatch.setattr(PromptRegistry, "retry_after", 5)
+    prompts._prompts["qa-agent-prompt"].fetched_at -= 11
+    FakeLangFuse.down = True
+
+    assert prompts.get_prompt_str("qa-agent-prompt") == "v1"
+    wait_for(lambda: prompts.stats()["refresh_errors"] == 1)
+
+    # retried after `retry_after`, not on every access
+    assert prompts.get_prompt_str("qa-agent-prompt") == "v1"
+    assert FakeLangFuse.fetches == ["qa-agent-prompt"] * 2
+    with pytest.raises(ConnectionError):
+        prompts.get_prompt_str("order-chunks")
+
+
+def test_concurrent_misses_share_one_fetch(prompts):
+    FakeLangFuse.delay = 0.1
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(prompts.get_prompt_str("order-chunks"))) for _ in range(5)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["order"] * 5
+    assert FakeLangFuse.fetches == ["order-chunks"]
+
+
+def test_warmup_skips_loaded_prompts(prompts, monkeypatch):
+    monkeypatch.setattr(PromptRegistry, "prompt_names", ["qa-agent-prompt", "order-chunks"])
+    prompts.get_prompt_str("qa-agent-prompt")
+
+    prompts.warmup()
+
+    assert FakeLangFuse.fetches == ["qa-agent-prompt", "order-chunks"]
+
+
+@pytest.mark.anyio
+async def test_async_miss_does_not_block_the_event_loop(prompts):
+    FakeLangFuse.delay = 0.1
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    text = await prompts.aget_prompt_str("order-chunks")
+    ticker.cancel()
+
+    assert text == "order"
+    assert ticks > 3
+    assert await prompts.aget_prompt_str("order-chunks") == "order"
+    assert prompts.stats()["hits"] == 1
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from langchain_core.tools import StructuredTool
+from app.ai.search import pool
+from app.ai.search import SearchClientPool
+from app.ai.agents.tools import with_search_slot
+
+
+class FakeRetriever:
+
+    def __init__(self, service_name, index_name):
+        self.service_name = service_name
+        self.index_name = index_name
+
+
+@pytest.fixture
+def search_pool(monkeypatch):
+    monkeypatch.setattr(pool, "AzureAISearchVectorRetriever", FakeRetriever)
+    monkeypatch.setattr(SearchClientPool, "_entries", {})
+    monkeypatch.setattr(SearchClientPool, "_tenant_semaphores", {})
+    monkeypatch.setattr(SearchClientPool, "max_concurrency_per_tenant", 2)
+    for counter in ("acquires", "reuses", "created", "evicted"):
+        monkeypatch.setattr(SearchClientPool, counter, 0)
+    for timer in ("wait_time", "max_wait_time"):
+        monkeypatch.setattr(SearchClientPool, timer, 0.0)
+    return SearchClientPool
+
+
+@pytest.mark.anyio
+async def test_tenants_share_one_retriever_per_index(search_pool):
+    retriever = search_pool.get_retriever("service", "index")
+
+    async with search_pool.acquire("service", "index", "tenant-a") as first:
+        async with search_pool.acquire("service", "index", "tenant-b") as second:
+            assert first is second is retriever
+            assert search_pool.stats()["active"] == 2
+
+    assert search_pool.get_retriever("service", "other") is not retriever
+    stats = search_pool.stats()
+    assert stats["retrievers"] == 2 and stats["created"] == 2
+    assert stats["acquires"] == 2 and stats["reuse_rate"] == 1.0
+
+
+@pytest.mark.anyio
+async def test_concurrency_is_bounded_per_tenant(search_pool):
+    running = {"tenant-a": 0, "tenant-b": 0}
+    peak = {"tenant-a": 0, "tenant-b": 0}
+
+    async def search(tenant_id):
+        async with search_pool.acquire("service", "index", tenant_id):
+            running[tenant_id] += 1
+            peak[tenant_id] = max(peak[tenant_id], running[tenant_id])
+            await asyncio.sleep(0.02)
+            running[tenant_id] -= 1
+
+    await asyncio.gather(*[search("tenant-a") for _ in range(6)], search("tenant-b"))
+
+    assert peak == {"tenant-a": 2, "tenant-b": 1}
+    assert search_pool.stats()["max_wait_time"] >= 0.03
+
+
+@pytest.mark.anyio
+async def test_idle_retrievers_are_evicted_but_not_while_in_use(search_pool, monkeypatch):
+    monkeypatch.setattr(SearchClientPool, "idle_timeout", 0.005)
+
+    async with search_pool.acquire("service", "index", "tenant") as borrowed:
+        await asyncio.sleep(0.01)
+        search_pool.get_retriever("service", "other")
+        assert search_pool.get_retriever("service", "index") is borrowed
+    await asyncio.sleep(0.01)
+
+    assert search_pool.get_retriever("service", "index") is not borrowed
+    assert search_pool.stats()["evicted"] == 2
+
+
+@pytest.mark.anyio
+async def test_search_tool_calls_hold_a_tenant_slot(search_pool):
+    running = 0
+    peak = 0
+
+    async def search(query: str) -> str:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return f"results for {query}"
+
+    tool = with_search_slot(
+        StructuredTool.from_function(coroutine=search, name="azure_ai_search_tool", description="search"),
+        service_name="service",
+        index_name="index",
+        tenant_id="tenant"
+    )
+
+    outputs = await asyncio.gather(*[tool.ainvoke({"query": str(index)}) for index in range(5)])
+
+    assert outputs == [f"results for {index}" for index in range(5)]
+    assert peak == 2
+    assert search_pool.stats()["acquires"] == 5
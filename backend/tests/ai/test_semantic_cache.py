@@ -0,0 +1,137 @@
+from typing import List
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.tools import StructuredTool
+from app.ai.cache import SemanticCache
+from app.ai.agents.tools import with_semantic_cache, semantic_cache_key
+
+
+class WordEmbeddings(Embeddings):
+    """
+    Bag of words over a small vocabulary, numbers are ignored like real embeddings barely tell them apart.
+    """
+
+    vocabulary = ["revenue", "growth", "europe", "asia", "report", "market"]
+
+    def embed_query(self, text: str) -> List[float]:
+        words = text.lower().split()
+        return [float(words.count(word)) + 0.01 for word in self.vocabulary]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def search_tool(calls: list, cfg: dict = None) -> StructuredTool:
+    def search(query: str) -> str:
+        calls.append(query)
+        return f"results for {query}"
+
+    tool = StructuredTool.from_function(func=search, name="search", description="search")
+    if cfg is not None:
+        object.__setattr__(tool, "cfg", cfg)
+    return tool
+
+
+def test_exact_query_hit_ignores_case_and_spacing():
+    cache = SemanticCache()
+    cache.add("search", [1.0, 0.0], "output", query="Revenue growth  Europe")
+
+    assert cache.lookup_exact("search", "revenue growth europe") == "output"
+    assert cache.lookup("search", [0.0, 1.0], "REVENUE GROWTH EUROPE") == "output"
+
+
+def test_similar_query_hit_requires_same_numbers():
+    cache = SemanticCache(threshold=0.9)
+    cache.add("search", [1.0, 0.0], "2023 output", query="revenue growth 2023")
+
+    assert cache.lookup("search", [1.0, 0.01], "growth of revenue 2023") == "2023 output"
+    assert cache.lookup("search", [1.0, 0.0], "revenue growth 2024") is None
+    assert cache.lookup("search", [0.0, 1.0], "market report 2023") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_similar_query_hit_skips_candidates_with_other_numbers():
+    cache = SemanticCache(threshold=0.9)
+    cache.add("search", [1.0, 0.0], "2023 output", query="revenue growth 2023")
+    cache.add("search", [1.0, 0.05], "2024 output", query="revenue growth 2024")
+
+    assert cache.lookup("search", [1.0, 0.0], "growth of revenue 2024") == "2024 output"
+
+
+def test_partitions_are_separate():
+    cache = SemanticCache()
+    cache.add("search", [1.0, 0.0], "top 5", query="revenue", partition="top=5")
+
+    assert cache.lookup("search", [1.0, 0.0], "revenue", partition="top=10") is None
+    assert cache.lookup("other", [1.0, 0.0], "revenue", partition="top=5") is None
+    assert cache.lookup("search", [1.0, 0.0], "revenue", partition="top=5") == "top 5"
+
+
+def test_eviction_and_invalidation():
+    cache = SemanticCache(max_entries=2)
+    for index, query in enumerate(["revenue", "growth", "europe"]):
+        cache.add("search", [1.0, float(index)], query, query=query)
+
+    assert len(cache) == 2
+    assert cache.lookup_exact("search", "revenue") is None
+    assert cache.lookup_exact("search", "europe") == "europe"
+
+    cache.invalidate("search")
+    assert len(cache) == 0
+    assert cache.lookup_exact("search", "europe") is None
+
+
+def test_expired_entries_miss():
+    cache = SemanticCache(ttl=-1)
+    cache.add("search", [1.0, 0.0], "output", query="revenue")
+
+    assert cache.lookup("search", [1.0, 0.0], "revenue") is None
+    assert len(cache) == 0
+
+
+def test_cache_key_separates_tool_config_and_arguments():
+    calls = []
+    top_5, top_10 = search_tool(calls, cfg={"top": 5}), search_tool(calls, cfg={"top": 10})
+
+    assert semantic_cache_key(top_5, {"query": "revenue"})[0] != semantic_cache_key(top_10, {"query": "revenue"})[0]
+    assert semantic_cache_key(top_5, {"query": "revenue", "year": 2023})[0] != semantic_cache_key(top_5, {"query": "revenue"})[0]
+    assert semantic_cache_key(top_5, {"query": "revenue"})[1] == "revenue"
+
+
+@pytest.mark.anyio
+async def test_cached_tool_calls_the_tool_on_misses_only():
+    calls = []
+    cache = SemanticCache(threshold=0.9)
+    tool = with_semantic_cache(search_tool(calls, cfg={"top": 5}), cache=cache, embeddings=WordEmbeddings())
+
+    assert await tool.ainvoke({"query": "revenue growth europe 2023"}) == "results for revenue growth europe 2023"
+    assert await tool.ainvoke({"query": "Revenue growth Europe 2023"}) == "results for revenue growth europe 2023"
+    assert await tool.ainvoke({"query": "europe revenue growth 2023"}) == "results for revenue growth europe 2023"
+    assert await tool.ainvoke({"query": "revenue growth europe 2024"}) == "results for revenue growth europe 2024"
+    assert await tool.ainvoke({"query": "asia market report 2023"}) == "results for asia market report 2023"
+
+    assert calls == ["revenue growth europe 2023", "revenue growth europe 2024", "asia market report 2023"]
+
+
+@pytest.mark.anyio
+async def test_cached_tool_config_does_not_share_entries():
+    calls = []
+    cache = SemanticCache()
+    embeddings = WordEmbeddings()
+    top_5 = with_semantic_cache(search_tool(calls, cfg={"top": 5}), cache=cache, embeddings=embeddings)
+    top_10 = with_semantic_cache(search_tool(calls, cfg={"top": 10}), cache=cache, embeddings=embeddings)
+
+    await top_5.ainvoke({"query": "revenue"})
+    await top_10.ainvoke({"query": "revenue"})
+
+    assert calls == ["revenue", "revenue"]
+
+
+def test_cached_tool_sync():
+    calls = []
+    tool = with_semantic_cache(search_tool(calls), cache=SemanticCache(), embeddings=WordEmbeddings())
+
+    tool.invoke({"query": "revenue"})
+    tool.invoke({"query": "revenue"})
+
+    assert calls == ["revenue"]
@@ -0,0 +1,186 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from app.ai.agents import QAAgent
+from app.ai.enums import AgentStreamingEventTypeEnum
+from app.ai.streaming import FlightChannel, SingleFlight, StreamingEvent, flight_lock_id
+from app.ai.streaming.singleflight import Flight
+
+MESSAGE = AgentStreamingEventTypeEnum.MESSAGE
+
+
+def events():
+    return [
+        StreamingEvent(type=AgentStreamingEventTypeEnum.CHAIN_START, name="qa-agent"),
+        StreamingEvent(type=MESSAGE, content="Umsatz: 42 € "),
+        StreamingEvent(type=AgentStreamingEventTypeEnum.TOOL_END, name="azure_ai_search_tool", output="ü" * 5000),
+        StreamingEvent(type=MESSAGE, content="done"),
+    ]
+
+
+def producer_of(runs):
+    async def produce():
+        runs.append(1)
+        for event in events():
+            await asyncio.sleep(0.01)
+            yield event
+    return produce
+
+
+@pytest.fixture
+def flights(monkeypatch):
+    monkeypatch.setattr(SingleFlight, "keep_after_close", 0)
+    monkeypatch.setattr(SingleFlight, "_flights", {})
+    monkeypatch.setattr(FlightChannel, "_handlers", {})
+
+
+def test_flight_lock_id_is_a_stable_signed_bigint():
+    assert flight_lock_id("qa-agent:t:s") == flight_lock_id("qa-agent:t:s")
+    assert flight_lock_id("qa-agent:t:s") != flight_lock_id("qa-agent:t:s2")
+    assert all(-2**63 <= flight_lock_id(str(key)) < 2**63 for key in range(100))
+
+
+@pytest.mark.anyio
+async def test_forwarded_events_round_trip_in_notify_sized_messages(flights, monkeypatch):
+    sent = []
+
+    async def notify(message):
+        sent.append(json.dumps(message, default=str, ensure_ascii=False))
+
+    monkeypatch.setattr(FlightChannel, "notify", notify)
+    leader = Flight("key")
+    for event in events():
+        leader.stream.publish(event)
+    leader.stream.close()
+    # two joins replay the stream twice
+    await SingleFlight.__forward__(leader)
+    await SingleFlight.__forward__(leader)
+
+    follower = Flight("key")
+    follower.follower = True
+    for payload in sent:
+        assert len(payload.encode()) < 8000
+        SingleFlight.__on_message__(follower, json.loads(payload))
+    follower.stream.close()
+
+    relayed = [event async for event in follower.stream.subscribe()]
+    assert [event.to_dict() for event in relayed] == [event.to_dict() for event in events()]
+    assert follower.ended and follower.error is None
+
+
+@pytest.mark.anyio
+async def test_requests_run_once_in_this_worker_without_coordination(flights):
+    runs = []
+
+    async def request():
+        return [event.to_dict() async for event in SingleFlight.run(engine=None, key="key", producer=producer_of(runs))]
+
+    first, second = await asyncio.gather(request(), request())
+
+    assert runs == [1]
+    assert first == second == [event.to_dict() for event in events()]
+
+
+@pytest.mark.anyio
+async def test_follower_runs_the_request_when_the_leader_sent_nothing(flights, monkeypatch):
+    locks = iter([False, True])
+
+    async def start(engine):
+        pass
+
+    async def try_lock(key):
+        return next(locks)
+
+    async def notify(message):
+        pass
+
+    monkeypatch.setattr(FlightChannel, "start", start)
+    monkeypatch.setattr(FlightChannel, "try_lock", try_lock)
+    monkeypatch.setattr(FlightChannel, "unlock", notify)
+    monkeypatch.setattr(FlightChannel, "notify", notify)
+    monkeypatch.setattr(SingleFlight, "join_timeout", 0.05)
+    runs = []
+
+    relayed = [event.to_dict() async for event in SingleFlight.run(engine=None, key="key", producer=producer_of(runs))]
+
+    assert runs == [1]
+    assert relayed == [event.to_dict() for event in events()]
+
+
+def endless_producer(state):
+    async def produce():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                state["events"] += 1
+                yield StreamingEvent(type=MESSAGE, content="token")
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+    return produce
+
+
+async def read_one(stream):
+    await stream.__anext__()
+    await stream.aclose()
+
+
+@pytest.mark.anyio
+async def test_unsaved_flight_is_cancelled_when_its_last_subscriber_leaves(flights):
+    state = {"events": 0, "cancelled": False}
+    first = SingleFlight.run(engine=None, key="key", producer=endless_producer(state), cancel_when_unwatched=True)
+    second = SingleFlight.run(engine=None, key="key", producer=endless_producer(state), cancel_when_unwatched=True)
+
+    await first.__anext__()
+    await second.__anext__()
+    await first.aclose()
+    await asyncio.sleep(0.03)
+    # the other request still listens
+    assert not state["cancelled"]
+
+    await second.aclose()
+    await asyncio.sleep(0.01)
+
+    assert state["cancelled"]
+    assert "key" not in SingleFlight._flights
+
+
+@pytest.mark.anyio
+async def test_saved_flight_keeps_running_without_subscribers(flights):
+    state = {"events": 0, "cancelled": False}
+
+    await read_one(SingleFlight.run(engine=None, key="key", producer=endless_producer(state)))
+    events = state["events"]
+    await asyncio.sleep(0.05)
+
+    assert state["events"] > events and not state["cancelled"]
+    SingleFlight._flights["key"].task.cancel()
+
+
+@pytest.mark.anyio
+async def test_flight_with_followers_in_other_workers_is_not_cancelled(flights):
+    state = {"events": 0, "cancelled": False}
+    stream = SingleFlight.run(engine=None, key="key", producer=endless_producer(state), cancel_when_unwatched=True)
+    await stream.__anext__()
+    SingleFlight._flights["key"].forwards = 1
+
+    await stream.aclose()
+    await asyncio.sleep(0.03)
+
+    assert not state["cancelled"]
+    SingleFlight._flights["key"].task.cancel()
+
+
+def fingerprint(tool_cfg, faiss_vector_store=None) -> str:
+    return QAAgent.__flight_fingerprint__(SimpleNamespace(tool_cfg=tool_cfg, faiss_vector_store=faiss_vector_store))
+
+
+def test_flight_fingerprint_covers_tool_config_and_file_store():
+    store = object()
+
+    assert fingerprint({"internal_top": 5}) == fingerprint({"internal_top": 5})
+    assert fingerprint({"internal_top": 5}) != fingerprint({"internal_top": 10})
+    assert fingerprint({"internal_top": 5}, store) == fingerprint({"internal_top": 5}, store)
+    assert fingerprint({"internal_top": 5}, store) != fingerprint({"internal_top": 5}, object())
+    assert fingerprint({"internal_top": 5}, store) != fingerprint({"internal_top": 5})
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import pytest
+from app.ai.enums import AgentStreamingEventTypeEnum
+from app.ai.streaming import StreamingEvent, StreamingEventEncoder, coalesce_messages, with_heartbeats, SSE, NDJSON
+
+
+def message(content: str) -> StreamingEvent:
+    return StreamingEvent(type=AgentStreamingEventTypeEnum.MESSAGE, content=content)
+
+
+def tool_start(name: str) -> StreamingEvent:
+    return StreamingEvent(type=AgentStreamingEventTypeEnum.TOOL_START, name=name, input={"query": "revenue"})
+
+
+async def timed(events, delays):
+    for event, delay in zip(events, delays):
+        await asyncio.sleep(delay)
+        yield event
+
+
+async def collect(events):
+    return [(event.type, event.content if event.type is AgentStreamingEventTypeEnum.MESSAGE else event.name) async for event in events]
+
+
+def test_sse_message_frame_is_valid_json():
+    frame = StreamingEventEncoder(SSE).encode(message('say "hi"\n'))
+
+    assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+    assert json.loads(frame[len(b"data: "):]) == {"type": "message", "content": 'say "hi"\n'}
+
+
+def test_ndjson_frames_carry_all_fields_of_other_events():
+    frame = StreamingEventEncoder(NDJSON).encode(tool_start("azure_ai_search_tool"))
+
+    assert frame.endswith(b"\n") and frame.count(b"\n") == 1
+    assert json.loads(frame) == {
+        "type": "tool_start",
+        "name": "azure_ai_search_tool",
+        "content": None,
+        "input": {"query": "revenue"},
+        "output": None,
+        "started_at": None,
+        "duration": None,
+        "message_id": None,
+    }
+
+
+def test_encoder_formats():
+    assert StreamingEventEncoder(SSE).media_type == "text/event-stream"
+    assert StreamingEventEncoder(NDJSON).media_type == "application/x-ndjson"
+    assert json.loads(StreamingEventEncoder(NDJSON).heartbeat) == {"type": "heartbeat"}
+    with pytest.raises(ValueError):
+        StreamingEventEncoder("xml")
+
+
+def test_to_model_keeps_fields():
+    model = tool_start("highchart_tool").to_model()
+
+    assert model.type is AgentStreamingEventTypeEnum.TOOL_START
+    assert model.name == "highchart_tool"
+    assert model.input == {"query": "revenue"}
+
+
+@pytest.mark.anyio
+async def test_coalesce_merges_tokens_and_flushes_before_other_events():
+    events = [message("The "), message("answer"), tool_start("search"), message(" is "), message("42")]
+
+    coalesced = await collect(coalesce_messages(timed(events, [0] * len(events)), flush_interval=1))
+
+    assert coalesced == [
+        (AgentStreamingEventTypeEnum.MESSAGE, "The answer"),
+        (AgentStreamingEventTypeEnum.TOOL_START, "search"),
+        (AgentStreamingEventTypeEnum.MESSAGE, " is 42"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_coalesce_flushes_on_size():
+    events = [message("abc")] * 4
+
+    coalesced = await collect(coalesce_messages(timed(events, [0] * 4), flush_interval=1, flush_bytes=6))
+
+    assert [content for _, content in coalesced] == ["abcabc", "abcabc"]
+
+
+@pytest.mark.anyio
+async def test_coalesce_measures_size_in_encoded_bytes():
+    # 3 characters, 6 bytes of UTF-8
+    events = [message("äöü")] * 2
+
+    coalesced = await collect(coalesce_messages(timed(events, [0] * 2), flush_interval=1, flush_bytes=6))
+
+    assert [content for _, content in coalesced] == ["äöü", "äöü"]
+
+
+@pytest.mark.anyio
+async def test_coalesce_flushes_held_tokens_after_the_interval():
+    events = [message("first"), message("second")]
+
+    coalesced = await collect(coalesce_messages(timed(events, [0, 0.2]), flush_interval=0.02))
+
+    assert [content for _, content in coalesced] == ["first", "second"]
+
+
+@pytest.mark.anyio
+async def test_heartbeats_close_the_source_when_the_client_leaves():
+    closed = asyncio.Event()
+
+    async def frames():
+        try:
+            yield b"first\n"
+            await asyncio.sleep(10)
+            yield b"never\n"
+        finally:
+            closed.set()
+
+    for reads in (1, 2):
+        closed.clear()
+        stream = with_heartbeats(frames(), heartbeat=b"ping\n", interval=0.01)
+        received = [await stream.__anext__() for _ in range(reads)]
+        await stream.aclose()
+
+        assert received == [b"first\n", b"ping\n"][:reads]
+        assert closed.is_set()
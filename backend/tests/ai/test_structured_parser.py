@@ -0,0 +1,124 @@
+import json
+import random
+import pytest
+from app.ai.streaming import IncrementalJSONParser, IncrementalMarkdownParser, parse_stream
+
+REPORT = {
+    "sections": [
+        {"title": "Market", "content": "Revenue grew 12% [1] {\"quoted\": true}", "citations": [1, 2]},
+        {"title": "Risks", "content": "Escaped \\\\ and unicode é", "citations": []},
+    ],
+    "chunk_ids": ["a1", "b2"],
+}
+PATHS = ["sections[]", "sections[].citations[]", "chunk_ids[]"]
+
+
+def chunked(text: str, seed: int):
+    generator = random.Random(seed)
+    position = 0
+    while position < len(text):
+        size = generator.randint(1, 7)
+        yield text[position:position + size]
+        position += size
+
+
+def parse(text: str, chunks=None, paths=PATHS):
+    parser = IncrementalJSONParser(paths)
+    streamed = []
+    for chunk in chunks if chunks is not None else chunked(text, seed=0):
+        streamed.extend(parser.feed(chunk))
+    return parser, streamed, parser.finish()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_values_are_emitted_as_they_close_in_any_chunking(seed):
+    text = json.dumps(REPORT, indent=2)
+
+    parser, streamed, finished = parse(text, chunks=chunked(text, seed))
+
+    assert finished == []
+    assert [(item.path, item.value) for item in streamed] == [
+        ("sections[0].citations[0]", 1),
+        ("sections[0].citations[1]", 2),
+        ("sections[0]", REPORT["sections"][0]),
+        ("sections[1]", REPORT["sections"][1]),
+        ("chunk_ids[0]", "a1"),
+        ("chunk_ids[1]", "b2"),
+    ]
+    assert {item.kind for item in streamed} == set(PATHS)
+    assert parser.result() == REPORT
+
+
+def test_inline_brackets_in_prose_before_the_document_are_ignored():
+    text = "Based on the sources [1], here is the report:\n" + json.dumps(REPORT) + "\nHope this helps [2]."
+
+    parser, streamed, finished = parse(text)
+
+    assert [item.path for item in streamed if item.kind == "sections[]"] == ["sections[0]", "sections[1]"]
+    assert finished == []
+    assert parser.result() == REPORT
+
+
+def test_line_leading_brackets_that_are_not_the_document_are_skipped():
+    text = "[1] Annual report 2023\n[2] {broken\n```json\n" + json.dumps(REPORT) + "\n```\n"
+
+    parser, streamed, _ = parse(text)
+
+    assert len([item for item in streamed if item.kind == "sections[]"]) == 2
+    assert parser.result() == REPORT
+
+
+def test_array_document_after_prose():
+    text = "Queries for the sources [1] and [2]:\n" + json.dumps([{"query": "revenue"}, {"query": "margin"}])
+
+    parser, streamed, _ = parse(text, paths=["[]"])
+
+    assert [item.value for item in streamed] == [{"query": "revenue"}, {"query": "margin"}]
+    assert parser.result() == [{"query": "revenue"}, {"query": "margin"}]
+
+
+def test_document_without_matches_is_the_result_when_no_better_one_follows():
+    parser, streamed, finished = parse('Summary:\n{"note": "no sections"}\nThanks [1].')
+
+    assert streamed == [] and finished == []
+    assert parser.result() == {"note": "no sections"}
+
+
+def test_truncated_answer_is_repaired_on_finish():
+    text = '{"sections": [{"title": "Market", "citations": [1]}, {"title": "Risks", "content": "cut of'
+
+    parser, streamed, finished = parse(text)
+
+    assert [item.path for item in streamed] == ["sections[0].citations[0]", "sections[0]"]
+    assert [item.path for item in finished] == ["sections[1]"]
+    assert parser.result()["sections"][1]["title"] == "Risks"
+
+
+@pytest.mark.anyio
+async def test_markdown_sections_citations_and_chunk_refs():
+    chunk_id = "0f8fad5b-d9cb-469f-a165-70867728950e"
+    text = (
+        "Intro line\n"
+        "## Market\n"
+        f"Revenue grew [1] (chunk {chunk_id.upper()}).\n"
+        "```\n## not a heading\n```\n"
+        "### Detail\n"
+        "More [^2] and again [1].\n"
+        "## Risks\n"
+        "None"
+    )
+
+    async def chunks():
+        for chunk in chunked(text, seed=1):
+            yield chunk
+
+    items = [item async for item in parse_stream(chunks(), IncrementalMarkdownParser(section_level=2))]
+
+    assert [item.value for item in items if item.kind == "citation"] == ["1", "2"]
+    assert [item.value for item in items if item.kind == "chunk_ref"] == [chunk_id]
+    sections = [item.value for item in items if item.kind == "section"]
+    assert [section["title"] for section in sections] == [None, "Market", "Risks"]
+    assert sections[1]["citations"] == ["1", "2"]
+    assert sections[1]["chunk_ids"] == [chunk_id]
+    assert "## not a heading" in sections[1]["content"] and "### Detail" in sections[1]["content"]
+    assert sections[2]["content"] == "None"
@@ -0,0 +1,72 @@
+import asyncio
+import time
+import pytest
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.tools import StructuredTool
+from app.ai.agents.tools import with_timeout, WRAPPED_TOOL_TAG
+
+
+def sleeping_tool(name: str, seconds: float) -> StructuredTool:
+    async def search(query: str) -> str:
+        await asyncio.sleep(seconds)
+        return f"{name}: {query}"
+
+    return StructuredTool.from_function(coroutine=search, name=name, description="search")
+
+
+class ToolRuns(AsyncCallbackHandler):
+
+    def __init__(self):
+        self.runs = []
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, tags=None, **kwargs):
+        self.runs.append((serialized["name"], parent_run_id is not None, tags or []))
+
+
+@pytest.mark.anyio
+async def test_timed_out_tool_returns_a_message():
+    tool = with_timeout(sleeping_tool("slow_search", 1), timeout=0.05)
+
+    assert await tool.ainvoke({"query": "revenue"}) == "slow_search timed out after 0.05 seconds, no results."
+
+
+@pytest.mark.anyio
+async def test_tool_calls_run_concurrently():
+    tools = [with_timeout(sleeping_tool(f"search_{index}", 0.2), timeout=1) for index in range(3)]
+
+    start = time.perf_counter()
+    outputs = await asyncio.gather(*[tool.ainvoke({"query": "revenue"}) for tool in tools])
+
+    assert outputs == ["search_0: revenue", "search_1: revenue", "search_2: revenue"]
+    assert time.perf_counter() - start < 0.5
+
+
+@pytest.mark.anyio
+async def test_inner_tool_run_is_a_tagged_child_of_the_wrapper():
+    handler = ToolRuns()
+    tool = with_timeout(sleeping_tool("search", 0), timeout=1)
+
+    await tool.ainvoke({"query": "revenue"}, config={"callbacks": [handler]})
+
+    assert handler.runs == [("search", False, []), ("search", True, [WRAPPED_TOOL_TAG])]
+
+
+def test_sync_tool_call():
+    def search(query: str) -> str:
+        return f"search: {query}"
+
+    tool = with_timeout(StructuredTool.from_function(func=search, name="search", description="search"), timeout=1)
+
+    assert tool.invoke({"query": "revenue"}) == "search: revenue"
+
+
+def test_timed_out_sync_tool_returns_a_message():
+    def search(query: str) -> str:
+        time.sleep(1)
+        return f"search: {query}"
+
+    tool = with_timeout(StructuredTool.from_function(func=search, name="slow_search", description="search"), timeout=0.05)
+
+    start = time.perf_counter()
+    assert tool.invoke({"query": "revenue"}) == "slow_search timed out after 0.05 seconds, no results."
+    assert time.perf_counter() - start < 0.5
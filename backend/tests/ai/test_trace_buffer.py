@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage
+from app.ai.tracing import (
+    TraceBuffer, TraceRecord, TraceSink, LangfuseSink, StubSink, generation_details,
+    SPAN_START, SPAN_END, GENERATION_START, GENERATION_END
+)
+
+
+class FakeObservation:
+
+    def __init__(self, kind: str, **kwargs):
+        self.kind = kind
+        self.start = kwargs
+        self.updates = []
+
+    def update(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+class FakeTrace:
+
+    def __init__(self):
+        self.observations = []
+
+    def span(self, **kwargs):
+        self.observations.append(FakeObservation("span", **kwargs))
+        return self.observations[-1]
+
+    def generation(self, **kwargs):
+        self.observations.append(FakeObservation("generation", **kwargs))
+        return self.observations[-1]
+
+
+def test_sink_requires_write():
+    with pytest.raises(TypeError):
+        TraceSink()
+
+
+@pytest.mark.anyio
+async def test_buffer_flushes_in_batches():
+    sink = StubSink()
+    buffer = TraceBuffer(sink=sink, batch_size=3, flush_interval=0.01)
+    for index in range(10):
+        buffer.emit(TraceRecord(kind=SPAN_START, trace=None, run_id=str(index)))
+
+    await asyncio.sleep(0.1)
+
+    assert [record.run_id for record in sink.records] == [str(index) for index in range(10)]
+    assert buffer.stats() == {"buffered": 0, "flushed": 10, "dropped": 0}
+
+
+@pytest.mark.anyio
+async def test_buffer_drops_records_when_full():
+    sink = StubSink()
+    buffer = TraceBuffer(sink=sink, capacity=4, flush_interval=10)
+    for index in range(6):
+        buffer.emit(TraceRecord(kind=SPAN_START, trace=None, run_id=str(index)))
+
+    await buffer.flush()
+
+    assert [record.run_id for record in sink.records] == ["0", "1", "2", "3"]
+    assert buffer.stats() == {"buffered": 0, "flushed": 4, "dropped": 2}
+
+
+@pytest.mark.anyio
+async def test_buffer_survives_failing_sink():
+    class FailingSink(TraceSink):
+        def write(self, records):
+            raise RuntimeError("langfuse down")
+
+    buffer = TraceBuffer(sink=FailingSink(), flush_interval=10)
+    buffer.emit(TraceRecord(kind=SPAN_START, trace=None, run_id="1"))
+
+    await buffer.flush()
+
+    assert buffer.stats() == {"buffered": 0, "flushed": 0, "dropped": 0}
+
+
+def test_langfuse_sink_records_model_and_usage():
+    trace = FakeTrace()
+    sink = LangfuseSink()
+    sink.write([
+        TraceRecord(kind=SPAN_START, trace=trace, run_id="agent", name="LangGraph", input="question"),
+        TraceRecord(kind=GENERATION_START, trace=trace, run_id="llm", name="AzureChatOpenAI", input="prompt"),
+        TraceRecord(
+            kind=GENERATION_END, trace=trace, run_id="llm", output="answer", model="gpt-4o",
+            usage={"input_tokens": 12, "output_tokens": 5, "total_tokens": 17}
+        ),
+        TraceRecord(kind=SPAN_END, trace=trace, run_id="agent", output="answer"),
+    ])
+
+    span, generation = trace.observations
+    assert (span.kind, span.start["name"]) == ("span", "LangGraph")
+    assert span.updates[0]["output"] == "answer"
+    assert generation.kind == "generation"
+    assert generation.updates[0]["model"] == "gpt-4o"
+    assert generation.updates[0]["usage"] == {"input": 12, "output": 5, "total": 17, "unit": "TOKENS"}
+    assert sink.stats() == {"open": 0, "expired": 0}
+
+
+def test_langfuse_sink_ignores_unknown_ends():
+    sink = LangfuseSink()
+    sink.write([TraceRecord(kind=SPAN_END, trace=FakeTrace(), run_id="missing")])
+
+    assert sink.stats() == {"open": 0, "expired": 0}
+
+
+def test_langfuse_sink_caps_open_observations():
+    trace = FakeTrace()
+    sink = LangfuseSink(max_open=2)
+    sink.write([TraceRecord(kind=SPAN_START, trace=trace, run_id=str(index)) for index in range(5)])
+
+    assert sink.stats() == {"open": 2, "expired": 3}
+    sink.write([TraceRecord(kind=SPAN_END, trace=trace, run_id="0"), TraceRecord(kind=SPAN_END, trace=trace, run_id="4")])
+    assert [len(observation.updates) for observation in trace.observations] == [0, 0, 0, 0, 1]
+
+
+def test_langfuse_sink_expires_old_observations():
+    trace = FakeTrace()
+    sink = LangfuseSink(max_age=0)
+    sink.write([TraceRecord(kind=SPAN_START, trace=trace, run_id="old")])
+    sink.write([TraceRecord(kind=SPAN_START, trace=trace, run_id="new")])
+
+    assert sink.stats()["expired"] >= 1
+    assert "old" not in sink._observations
+
+
+def test_generation_details_of_v1_llm_result():
+    message = AIMessage(
+        content="answer",
+        response_metadata={"model_name": "gpt-4o-2024-05-13"},
+        usage_metadata={"input_tokens": 3, "output_tokens": 2, "total_tokens": 5}
+    )
+    event = {"data": {"output": {"generations": [[{"message": message, "text": "answer"}]], "llm_output": None}}}
+
+    assert generation_details(event) == ("gpt-4o-2024-05-13", {"input_tokens": 3, "output_tokens": 2, "total_tokens": 5})
+
+
+def test_generation_details_from_token_usage_and_metadata():
+    message = AIMessage(content="answer", response_metadata={
+        "token_usage": {"prompt_tokens": 7, "completion_tokens": 1, "total_tokens": 8}
+    })
+    event = {"data": {"output": message}, "metadata": {"ls_model_name": "gpt-4o"}}
+
+    assert generation_details(event) == ("gpt-4o", {"input_tokens": 7, "output_tokens": 1, "total_tokens": 8})
+
+
+def test_generation_details_without_usage():
+    assert generation_details({"data": {}}) == (None, None)
@@ -0,0 +1,117 @@
+import logging
+import threading
+import pytest
+from app.utils.log_queue import LogPayload, QueueListenerHandler
+
+
+class RecordingHandler(logging.Handler):
+    """
+    Target handler that keeps its records, `gate` holds up writes until it is set.
+    """
+    gate: threading.Event = None
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.flushes = 0
+
+    def emit(self, record):
+        if RecordingHandler.gate is not None:
+            RecordingHandler.gate.wait(timeout=2)
+        self.records.append(self.format(record))
+
+    def flush(self):
+        self.flushes += 1
+
+
+HANDLER = f"{__name__}.RecordingHandler"
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger("app.ai.events.test")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handlers = []
+
+    def add(**kwargs) -> QueueListenerHandler:
+        handler = QueueListenerHandler(HANDLER, flush_interval=0.01, **kwargs)
+        logger.addHandler(handler)
+        handlers.append(handler)
+        return handler
+
+    yield logger, add
+    RecordingHandler.gate = None
+    for handler in handlers:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def test_records_are_written_in_batches_on_close(logger):
+    logger, add = logger
+    handler = add(batch_size=100)
+
+    for index in range(10):
+        logger.info("record %s", index)
+    handler.close()
+
+    assert handler.target.records == [f"record {index}" for index in range(10)]
+    assert handler.target.flushes < 10
+
+
+def test_long_messages_are_truncated(logger):
+    logger, add = logger
+    handler = add(max_message_length=5)
+
+    logger.info("abcdefgh")
+    handler.close()
+
+    assert handler.target.records == ["abcde... (3 chars truncated)"]
+
+
+def test_handlers_sample_the_same_records(logger):
+    logger, add = logger
+    handlers = [add(sample_rate=0.5, sampled_loggers=["app.ai.events"]) for _ in range(2)]
+
+    for index in range(200):
+        logger.info("record %s", index)
+    logger.warning("kept")
+    for handler in handlers:
+        handler.close()
+
+    first, second = (handler.target.records for handler in handlers)
+    assert first == second
+    assert 0 < len(first) < 201
+    assert first[-1] == "kept"
+
+
+def test_full_queue_drops_records(logger):
+    logger, add = logger
+    RecordingHandler.gate = threading.Event()
+    handler = add(queue_size=2, batch_size=1)
+
+    for index in range(20):
+        logger.info("record %s", index)
+    RecordingHandler.gate.set()
+    handler.close()
+
+    assert handler.dropped > 0
+    assert len(handler.target.records) + handler.dropped == 20
+
+
+def test_log_payload_is_formatted_lazily_and_truncated():
+    class Payload:
+        formatted = 0
+
+        def __str__(self):
+            Payload.formatted += 1
+            return "x" * 10
+
+    silent = logging.getLogger("app.ai.events.silent")
+    silent.setLevel(logging.INFO)
+    silent.propagate = False
+    payload = LogPayload(Payload(), max_length=4)
+    silent.debug("%s", payload)
+
+    assert Payload.formatted == 0
+    assert str(payload) == "xxxx... (6 chars truncated)"